@@ -33,6 +33,9 @@ ALLOWED_HOSTS = []
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# Override to use a local mock (python manage.py run_mock_gemini)
+if os.getenv("GEMINI_WS_URL"):
+    GEMINI_WS_URL = os.getenv("GEMINI_WS_URL")
 
 # Application definition
 
@@ -80,13 +83,91 @@ TEMPLATES = [
 WSGI_APPLICATION = 'ai_hospital.wsgi.application'
 ASGI_APPLICATION = 'ai_hospital.asgi.application'
 
-# Channels (in-memory for dev)
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+REST_FRAMEWORK = {
+    # JSON goes through voice_flow.jsoncodec (orjson when installed)
+    'DEFAULT_RENDERER_CLASSES': [
+        'voice_flow.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'voice_flow.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
+# Logging
+# voice_flow logs go through a bounded queue to a background writer thread,
+# are sampled per logger category and have PHI-looking values redacted.
+VOICE_LOG_LEVEL = os.getenv('VOICE_LOG_LEVEL', 'INFO')
+VOICE_LOG_SAMPLE_RATES = {
+    # Keep-probability for DEBUG/INFO records per logger; WARNING+ always kept
+    'voice_flow.ws.tools': float(os.getenv('VOICE_LOG_TOOLS_SAMPLE_RATE', '0.1')),
+    'voice_flow.upstream': float(os.getenv('VOICE_LOG_UPSTREAM_SAMPLE_RATE', '0.1')),
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'voice_sampling': {
+            '()': 'voice_flow.log.SamplingFilter',
+            'rates': VOICE_LOG_SAMPLE_RATES,
+        },
+    },
+    'formatters': {
+        'structured': {
+            '()': 'voice_flow.log.StructuredFormatter',
+        },
+    },
+    'handlers': {
+        'voice_queue': {
+            'class': 'voice_flow.log.BackgroundQueueHandler',
+            'stream': 'ext://sys.stdout',
+            'queue_size': 10000,
+            'filters': ['voice_sampling'],
+            'formatter': 'structured',
+        },
+    },
+    'loggers': {
+        'voice_flow': {
+            'handlers': ['voice_queue'],
+            'level': VOICE_LOG_LEVEL,
+            'propagate': False,
+        },
     },
 }
 
+# Channels: in-memory for a single dev process. Set REDIS_URL to share the
+# layer (and the voice session registry) between Daphne workers and hosts.
+# The pub/sub layer suits voice sessions, whose messages are only useful
+# while the call is live; CHANNEL_LAYER_BACKEND can pick another backend.
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': os.getenv('CHANNEL_LAYER_BACKEND', 'channels_redis.pubsub.RedisPubSubChannelLayer'),
+            'CONFIG': {
+                'hosts': [REDIS_URL],
+                'prefix': os.getenv('CHANNEL_LAYER_PREFIX', 'asgi'),
+            },
+        },
+    }
+    VOICE_SESSION_REGISTRY = {
+        'BACKEND': 'voice_flow.sessions.RedisSessionRegistry',
+        'OPTIONS': {'url': REDIS_URL},
+    }
+    GEMINI_ADMISSION_CLUSTER = {
+        'url': REDIS_URL,
+        'max_sessions': int(os.getenv('GEMINI_CLUSTER_MAX_SESSIONS', '200')),
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': os.getenv('CHANNEL_LAYER_BACKEND', 'channels.layers.InMemoryChannelLayer'),
+        },
+    }
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -0,0 +1,430 @@
+"""Admission control for upstream Gemini sessions.
+
+Before a voice consumer opens its Gemini session it must be admitted:
+
+- a per-process semaphore caps concurrent sessions on this worker;
+- a token bucket caps how fast new sessions start, smoothing bursts;
+- with a cluster store configured, a Redis-backed slot semaphore caps
+  concurrent sessions across every worker sharing it;
+- a circuit breaker opens on structured quota errors from Gemini. While it
+  is open nothing is admitted; afterwards capacity ramps back up linearly,
+  and a quota error during the ramp re-opens it for twice as long.
+
+Callers that cannot be admitted right away wait in a FIFO queue and are
+told their position and an estimated wait; they are rejected when the
+queue is full or the wait runs past its limit.
+"""
+
+import asyncio
+import collections
+import logging
+import math
+import random
+import time
+import uuid
+import weakref
+
+from django.conf import settings
+
+from voice_flow.constants import (
+    GEMINI_ADMISSION_MAX_SESSIONS,
+    GEMINI_ADMISSION_RATE,
+    GEMINI_ADMISSION_BURST,
+    GEMINI_ADMISSION_QUEUE_SIZE,
+    GEMINI_ADMISSION_MAX_WAIT_SECONDS,
+    GEMINI_ADMISSION_SESSION_SECONDS,
+    GEMINI_ADMISSION_CLUSTER,
+    GEMINI_BREAKER_COOLDOWN_SECONDS,
+    GEMINI_BREAKER_MAX_COOLDOWN_SECONDS,
+    GEMINI_BREAKER_RAMP_SECONDS,
+    VOICE_SESSION_TTL_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Queued callers re-check conditions that change without a local event
+# (token refill, breaker ramp, slots freed on other workers) this often
+POLL_SECONDS = 0.5
+
+# Weight of the newest session duration in the running average
+_DURATION_SMOOTHING = 0.1
+
+# One controller per event loop: its queue is made of loop-bound futures.
+_controllers = weakref.WeakKeyDictionary()
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a caller cannot be admitted; `retry_after` is a hint in seconds.
+    """
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Classic token bucket: `rate` tokens per second, holding at most `burst`.
+    A rate of 0 disables the limit.
+    """
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.clock = clock
+        self.tokens = self.burst
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, count=1):
+        """
+        Seconds until `count` tokens are available (0 if they are now).
+        """
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        return max(0.0, (count - self.tokens) / self.rate)
+
+    def take(self):
+        if self.rate > 0:
+            self._refill()
+            self.tokens -= 1
+
+
+class CircuitBreaker:
+    """
+    Closed -> open on a quota error -> ramping back to full capacity.
+
+    capacity() is the fraction of normal capacity currently allowed: 0
+    while open, rising linearly to 1 over `ramp_seconds`. Times are wall
+    clock so that state can be shared between workers.
+    """
+
+    def __init__(self, cooldown_seconds=GEMINI_BREAKER_COOLDOWN_SECONDS,
+                 max_cooldown_seconds=GEMINI_BREAKER_MAX_COOLDOWN_SECONDS,
+                 ramp_seconds=GEMINI_BREAKER_RAMP_SECONDS, clock=time.time):
+        self.cooldown_seconds = cooldown_seconds
+        self.max_cooldown_seconds = max_cooldown_seconds
+        self.ramp_seconds = ramp_seconds
+        self.clock = clock
+        self.cooldown = cooldown_seconds
+        self.opened_until = 0.0
+        self.ramp_until = 0.0
+
+    @property
+    def state(self):
+        now = self.clock()
+        if now < self.opened_until:
+            return 'open'
+        if now < self.ramp_until:
+            return 'ramping'
+        return 'closed'
+
+    def trip(self):
+        """
+        Open the breaker; returns (opened_until, ramp_until).
+        """
+        now = self.clock()
+        if now < self.opened_until:
+            return self.opened_until, self.ramp_until
+        # Quota still exhausted while recovering: back off harder
+        self.cooldown = min(self.max_cooldown_seconds, self.cooldown * 2) if now < self.ramp_until \
+            else self.cooldown_seconds
+        self.opened_until = now + self.cooldown
+        self.ramp_until = self.opened_until + self.ramp_seconds
+        logger.warning("Gemini quota breaker opened", extra={'cooldown': self.cooldown})
+        return self.opened_until, self.ramp_until
+
+    def sync(self, opened_until, ramp_until):
+        """
+        Adopt breaker state tripped by another worker if it is more recent.
+        """
+        if opened_until > self.opened_until:
+            self.opened_until, self.ramp_until = opened_until, ramp_until
+
+    def capacity(self):
+        now = self.clock()
+        if now < self.opened_until:
+            return 0.0
+        if now < self.ramp_until and self.ramp_seconds > 0:
+            return (now - self.opened_until) / self.ramp_seconds
+        return 1.0
+
+    def retry_after(self):
+        return max(0.0, self.opened_until - self.clock())
+
+
+def scaled_limit(limit, fraction):
+    """
+    `limit` scaled by a breaker capacity fraction; at least 1 unless fully open.
+    """
+    if fraction <= 0:
+        return 0
+    return max(1, math.floor(limit * fraction))
+
+
+class RedisAdmissionStore:
+    """
+    Cluster-wide session slots and breaker state in a Redis-protocol server.
+
+    Slot i is the key `<prefix>slot:<i>`, claimed with SET NX and a TTL that
+    the holder keeps refreshing, so slots of a crashed worker free
+    themselves. The breaker is a single key holding "opened_until ramp_until".
+    """
+
+    def __init__(self, url='redis://localhost:6379/0', max_sessions=GEMINI_ADMISSION_MAX_SESSIONS,
+                 prefix='voice:admission:', lease_seconds=VOICE_SESSION_TTL_SECONDS):
+        import redis.asyncio as redis
+
+        self.client = redis.from_url(url, decode_responses=True)
+        self.max_sessions = int(max_sessions)
+        self.prefix = prefix
+        self.lease_seconds = int(lease_seconds)
+        self.breaker_key = f'{prefix}breaker'
+
+    def _slot_key(self, slot):
+        return f'{self.prefix}slot:{slot}'
+
+    async def state(self):
+        """
+        Return (free slot numbers, breaker state or None) in one round trip.
+        """
+        values = await self.client.mget([self._slot_key(slot) for slot in range(self.max_sessions)]
+                                        + [self.breaker_key])
+        free = [slot for slot, holder in enumerate(values[:-1]) if holder is None]
+        breaker = tuple(float(part) for part in values[-1].split()) if values[-1] else None
+        return free, breaker
+
+    async def claim(self, slot, lease):
+        return bool(await self.client.set(self._slot_key(slot), lease, nx=True, ex=self.lease_seconds))
+
+    async def refresh(self, slot):
+        await self.client.expire(self._slot_key(slot), self.lease_seconds)
+
+    async def release(self, slot, lease):
+        key = self._slot_key(slot)
+        # Only free the slot if it has not expired and been claimed by someone else
+        if await self.client.get(key) == lease:
+            await self.client.delete(key)
+
+    async def trip(self, opened_until, ramp_until):
+        ttl = max(1, math.ceil(ramp_until - time.time()))
+        await self.client.set(self.breaker_key, f'{opened_until:.3f} {ramp_until:.3f}', ex=ttl)
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class Admission:
+    """
+    A granted upstream session; release() it exactly once when the call ends.
+    """
+
+    def __init__(self, controller, slot=None, lease=None):
+        self.controller = controller
+        self.slot = slot
+        self.lease = lease
+        self.started_at = time.monotonic()
+        self.released = False
+
+    async def refresh(self):
+        if self.slot is not None:
+            await self.controller.store.refresh(self.slot)
+
+    async def release(self):
+        if not self.released:
+            self.released = True
+            await self.controller._release(self)
+
+
+class AdmissionController:
+    """
+    Admits upstream sessions in FIFO order under the process, rate, cluster and breaker limits.
+    """
+
+    def __init__(self, max_sessions=GEMINI_ADMISSION_MAX_SESSIONS, rate=GEMINI_ADMISSION_RATE,
+                 burst=GEMINI_ADMISSION_BURST, queue_size=GEMINI_ADMISSION_QUEUE_SIZE,
+                 max_wait_seconds=GEMINI_ADMISSION_MAX_WAIT_SECONDS,
+                 session_seconds=GEMINI_ADMISSION_SESSION_SECONDS, breaker=None, store=None,
+                 clock=time.monotonic):
+        self.max_sessions = max_sessions
+        self.bucket = TokenBucket(rate, burst, clock=clock)
+        self.queue_size = queue_size
+        self.max_wait_seconds = max_wait_seconds
+        # Running average of how long an admitted session is held
+        self.session_seconds = float(session_seconds)
+        self.breaker = breaker or CircuitBreaker()
+        self.store = store
+        self.clock = clock
+        self.active = 0
+        self._queue = collections.deque()
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def local_limit(self):
+        return scaled_limit(self.max_sessions, self.breaker.capacity())
+
+    def estimate_wait(self, position):
+        """
+        Rough seconds until the caller at `position` (1-based) is admitted.
+        """
+        # While the breaker is open, estimate as if capacity were back to normal
+        limit = self.local_limit() or self.max_sessions
+        wait = max(self.breaker.retry_after(), self.bucket.time_until(position))
+        if self.active + position > limit:
+            # Sessions free up at about limit / session_seconds per second
+            wait = max(wait, (self.active + position - limit) * self.session_seconds / limit)
+        return wait
+
+    async def acquire(self, on_queued=None):
+        """
+        Wait for admission and return an Admission; raises AdmissionRejected.
+
+        `on_queued(position, estimated_wait)` is awaited when the caller has
+        to queue and again whenever its position changes.
+        """
+        if len(self._queue) >= self.queue_size:
+            raise AdmissionRejected('queue_full', self.estimate_wait(len(self._queue) + 1))
+        ticket = object()
+        self._queue.append(ticket)
+        deadline = self.clock() + self.max_wait_seconds
+        reported = None
+        try:
+            while True:
+                changed = self._changed
+                hint = None
+                if self._queue[0] is ticket:
+                    admission, hint = await self._try_admit()
+                    if admission is not None:
+                        return admission
+                position = self._queue.index(ticket) + 1
+                if position != reported:
+                    reported = position
+                    if on_queued is not None:
+                        await on_queued(position, self.estimate_wait(position))
+                remaining = deadline - self.clock()
+                if remaining <= 0:
+                    raise AdmissionRejected('timeout', self.estimate_wait(position))
+                try:
+                    await asyncio.wait_for(changed.wait(), min(hint or POLL_SECONDS, remaining))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._queue.remove(ticket)
+            self._notify()
+
+    async def _try_admit(self):
+        """
+        Admit the caller at the head of the queue if every limit allows it.
+        Returns (Admission or None, seconds worth waiting before retrying).
+        """
+        if self.active >= self.local_limit():
+            return None, self.breaker.retry_after() or None
+        token_wait = self.bucket.time_until(1)
+        if token_wait:
+            return None, token_wait
+        slot = lease = None
+        if self.store is not None:
+            try:
+                slot, lease = await self._claim_cluster_slot()
+            except Exception as e:
+                # Fail open: the per-process limits still apply without the shared store
+                logger.warning("Cluster admission store unavailable: %s", e)
+            else:
+                if slot is None:
+                    return None, self.breaker.retry_after() or None
+            if self.active >= self.local_limit():
+                if slot is not None:
+                    await self.store.release(slot, lease)
+                return None, self.breaker.retry_after() or None
+        self.bucket.take()
+        self.active += 1
+        return Admission(self, slot, lease), None
+
+    async def _claim_cluster_slot(self):
+        free, breaker = await self.store.state()
+        if breaker is not None:
+            self.breaker.sync(*breaker)
+        limit = scaled_limit(self.store.max_sessions, self.breaker.capacity())
+        candidates = [slot for slot in free if slot < limit]
+        # Random order keeps workers from all racing for the same free slot
+        random.shuffle(candidates)
+        lease = uuid.uuid4().hex
+        for slot in candidates:
+            if await self.store.claim(slot, lease):
+                return slot, lease
+        return None, None
+
+    async def _release(self, admission):
+        self.active -= 1
+        held = time.monotonic() - admission.started_at
+        self.session_seconds += _DURATION_SMOOTHING * (held - self.session_seconds)
+        if admission.slot is not None:
+            try:
+                await self.store.release(admission.slot, admission.lease)
+            except Exception as e:
+                logger.warning("Could not release cluster admission slot: %s", e)
+        self._notify()
+
+    async def record_quota_error(self):
+        """
+        Open the breaker after a structured quota error, here and on every worker sharing the store.
+        """
+        opened_until, ramp_until = self.breaker.trip()
+        if self.store is not None:
+            try:
+                await self.store.trip(opened_until, ramp_until)
+            except Exception as e:
+                logger.warning("Could not share quota breaker state: %s", e)
+        self._notify()
+
+    def snapshot(self):
+        return {
+            'active': self.active,
+            'queued': len(self._queue),
+            'limit': self.local_limit(),
+            'breaker': self.breaker.state,
+            'session_seconds': round(self.session_seconds, 1),
+        }
+
+
+def get_admission_controller():
+    """
+    Return the admission controller for the running event loop, creating it on first use.
+    """
+    loop = asyncio.get_running_loop()
+    controller = _controllers.get(loop)
+    if controller is None:
+        cluster = getattr(settings, 'GEMINI_ADMISSION_CLUSTER', GEMINI_ADMISSION_CLUSTER)
+        store = None
+        if cluster:
+            store = RedisAdmissionStore(
+                lease_seconds=getattr(settings, 'VOICE_SESSION_TTL_SECONDS', VOICE_SESSION_TTL_SECONDS), **cluster
+            )
+        controller = AdmissionController(
+            max_sessions=getattr(settings, 'GEMINI_ADMISSION_MAX_SESSIONS', GEMINI_ADMISSION_MAX_SESSIONS),
+            rate=getattr(settings, 'GEMINI_ADMISSION_RATE', GEMINI_ADMISSION_RATE),
+            burst=getattr(settings, 'GEMINI_ADMISSION_BURST', GEMINI_ADMISSION_BURST),
+            queue_size=getattr(settings, 'GEMINI_ADMISSION_QUEUE_SIZE', GEMINI_ADMISSION_QUEUE_SIZE),
+            max_wait_seconds=getattr(settings, 'GEMINI_ADMISSION_MAX_WAIT_SECONDS', GEMINI_ADMISSION_MAX_WAIT_SECONDS),
+            session_seconds=getattr(settings, 'GEMINI_ADMISSION_SESSION_SECONDS', GEMINI_ADMISSION_SESSION_SECONDS),
+            breaker=CircuitBreaker(
+                cooldown_seconds=getattr(settings, 'GEMINI_BREAKER_COOLDOWN_SECONDS', GEMINI_BREAKER_COOLDOWN_SECONDS),
+                max_cooldown_seconds=getattr(
+                    settings, 'GEMINI_BREAKER_MAX_COOLDOWN_SECONDS', GEMINI_BREAKER_MAX_COOLDOWN_SECONDS
+                ),
+                ramp_seconds=getattr(settings, 'GEMINI_BREAKER_RAMP_SECONDS', GEMINI_BREAKER_RAMP_SECONDS),
+            ),
+            store=store,
+        )
+        _controllers[loop] = controller
+    return controller
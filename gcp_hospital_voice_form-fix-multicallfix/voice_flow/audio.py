@@ -0,0 +1,67 @@
+"""Wire-format helpers for audio exchanged between the browser and GeminiVoiceConsumer."""
+
+import base64
+import re
+import struct
+
+from voice_flow import jsoncodec
+from voice_flow.constants import GEMINI_AUDIO_CONFIG
+
+
+# Optional header on binary audio frames (little-endian):
+#   uint32 sequence number, uint32 sample rate in Hz
+# 8 bytes keeps the PCM16 payload that follows 2-byte aligned.
+AUDIO_FRAME_HEADER = struct.Struct('<II')
+
+_MIME_RATE_RE = re.compile(r'rate=(\d+)')
+
+
+def pcm_mime_type(sample_rate=None, channels=None):
+    """
+    Build the mime type Gemini expects for raw PCM16 input.
+    """
+    rate = int(sample_rate or GEMINI_AUDIO_CONFIG["sample_rate"])
+    channels = int(channels or GEMINI_AUDIO_CONFIG["channels"])
+    return f'audio/pcm;rate={rate};channels={channels}'
+
+
+def sample_rate_from_mime(mime_type, default=None):
+    """
+    Read the `rate=` parameter from a PCM mime type such as 'audio/pcm;rate=24000'.
+    """
+    match = _MIME_RATE_RE.search(mime_type or '')
+    if match:
+        return int(match.group(1))
+    return default or GEMINI_AUDIO_CONFIG["sample_rate"]
+
+
+def parse_audio_frame(frame, with_header, pcm16=True):
+    """
+    Split a binary audio frame into (sequence, sample_rate, payload).
+
+    Headerless frames return None for sequence and sample_rate. Frames that
+    are too short for the header, or carry an odd number of PCM16 bytes,
+    raise ValueError. Pass pcm16=False for compressed payloads.
+    """
+    if with_header:
+        if len(frame) < AUDIO_FRAME_HEADER.size:
+            raise ValueError('Audio frame shorter than header')
+        sequence, sample_rate = AUDIO_FRAME_HEADER.unpack_from(frame)
+        pcm = memoryview(frame)[AUDIO_FRAME_HEADER.size:]
+    else:
+        sequence, sample_rate = None, None
+        pcm = memoryview(frame)
+    if pcm16 and len(pcm) % 2:
+        raise ValueError('PCM16 payload must have an even number of bytes')
+    return sequence, sample_rate or None, pcm
+
+
+def build_realtime_audio_payload(pcm, mime_type):
+    """
+    Serialize a realtimeInput audio message for Gemini from raw PCM bytes.
+
+    The base64 alphabet never needs JSON escaping, so the document is
+    assembled directly instead of building and dumping a nested dict.
+    """
+    data = base64.b64encode(pcm).decode('ascii')
+    return '{"realtimeInput":{"mediaChunks":[{"data":"%s","mimeType":%s}]}}' % (data, jsoncodec.dumps(mime_type))
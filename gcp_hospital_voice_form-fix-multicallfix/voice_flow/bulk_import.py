@@ -0,0 +1,91 @@
+"""Bulk appointment import.
+
+Rows come from a JSON array or from an NDJSON body that is read line by
+line, so a large import never has to fit in memory. They are processed in
+fixed-size batches. Every row of a batch is validated with the same
+AppointmentSerializer the single-row API uses, and the valid rows are then
+inserted with one bulk_create inside a transaction. An invalid row is
+reported by its position and does not stop the rest of its batch.
+"""
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from rest_framework import serializers
+
+from voice_flow import jsoncodec
+from voice_flow.constants import APPOINTMENT_IMPORT_BATCH_SIZE
+from voice_flow.models import Appointment
+from voice_flow.serializers import AppointmentSerializer
+from voice_flow.utils import format_serializer_errors
+
+
+class _UnparseableRow:
+    def __init__(self, message):
+        self.message = message
+
+
+def iter_ndjson(stream):
+    """
+    Yield one parsed value per non-blank line of a binary stream; bad lines yield a marker.
+    """
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield jsoncodec.loads(line)
+        except jsoncodec.JSONDecodeError as e:
+            yield _UnparseableRow(f'Invalid JSON: {e}')
+
+
+def import_appointments(rows, batch_size=None):
+    """
+    Validate and insert `rows`; returns counts, the created ids and per-row errors (0-based row numbers).
+    """
+    batch_size = batch_size or getattr(settings, 'APPOINTMENT_IMPORT_BATCH_SIZE', APPOINTMENT_IMPORT_BATCH_SIZE)
+    # One serializer validates every row, as ListSerializer does, instead of rebuilding fields per row
+    validator = AppointmentSerializer()
+    result = {'total': 0, 'created': 0, 'ids': [], 'errors': []}
+    batch = []
+    for row in rows:
+        batch.append((result['total'], row))
+        result['total'] += 1
+        if len(batch) >= batch_size:
+            _import_batch(validator, batch, result)
+            batch = []
+    if batch:
+        _import_batch(validator, batch, result)
+    return result
+
+
+def _import_batch(validator, batch, result):
+    valid = []
+    for index, row in batch:
+        if isinstance(row, _UnparseableRow):
+            result['errors'].append({'row': index, 'errors': row.message})
+            continue
+        if not isinstance(row, dict):
+            result['errors'].append({'row': index, 'errors': 'Expected a JSON object'})
+            continue
+        try:
+            valid.append((index, Appointment(**validator.run_validation(row))))
+        except serializers.ValidationError as e:
+            result['errors'].append({'row': index, 'errors': format_serializer_errors(e.detail)})
+    if not valid:
+        return
+    try:
+        with transaction.atomic():
+            created = Appointment.objects.bulk_create([appointment for _, appointment in valid])
+        result['ids'].extend(appointment.pk for appointment in created)
+        result['created'] += len(created)
+    except DatabaseError:
+        # A row the serializer accepted but the database did not; insert one by one to find it
+        for index, appointment in valid:
+            try:
+                with transaction.atomic():
+                    appointment.save(force_insert=True)
+            except DatabaseError as e:
+                result['errors'].append({'row': index, 'errors': f'Database error: {e}'})
+                continue
+            result['ids'].append(appointment.pk)
+            result['created'] += 1
@@ -26,3 +26,149 @@ GEMINI_AUDIO_CONFIG = {
     "enable_automatic_punctuation": True
 }
 
+
+# Upstream audio batching for each voice session. Capture chunks are merged
+# into frames of roughly GEMINI_UPSTREAM_FRAME_MS before being sent to Gemini.
+# When the per-session queue is full the policy decides what happens:
+#   'block'       - wait for the sender (backpressure on the browser socket)
+#   'drop_oldest' - discard the oldest queued audio chunk
+#   'drop_newest' - discard the incoming audio chunk
+GEMINI_UPSTREAM_FRAME_MS = 100
+GEMINI_UPSTREAM_QUEUE_SIZE = 64
+GEMINI_UPSTREAM_QUEUE_POLICY = 'drop_oldest'
+
+# Warm pool of pre-opened Gemini websockets (per process, keyed by model).
+# Set GEMINI_POOL_SIZE to 0 to open a fresh connection for every session.
+GEMINI_POOL_SIZE = 2
+GEMINI_POOL_MAX_IDLE_SECONDS = 30
+GEMINI_POOL_CHECK_INTERVAL_SECONDS = 10
+# Start connecting upstream as soon as the browser socket is accepted
+# instead of waiting for its setup message.
+GEMINI_SPECULATIVE_CONNECT = False
+
+# Setup profile used when the browser's setup message does not name one
+# (see voice_flow.setup_profiles).
+GEMINI_SETUP_PROFILE = 'patient-intake'
+
+# Server-side voice activity detection on upstream audio (voice_flow.vad).
+# Silent frames are dropped, keeping GEMINI_VAD_PREROLL_MS before speech and
+# GEMINI_VAD_HANGOVER_MS after it. With GEMINI_VAD_END_OF_TURN_MS > 0 an
+# inputComplete is sent after that much trailing silence. The browser can
+# override GEMINI_VAD_ENABLED per session with `vad` in its setup message.
+GEMINI_VAD_ENABLED = False
+GEMINI_VAD_FRAME_MS = 20
+GEMINI_VAD_THRESHOLD_DBFS = -45.0
+GEMINI_VAD_MAX_ZCR = 0.35
+GEMINI_VAD_HANGOVER_MS = 300
+GEMINI_VAD_PREROLL_MS = 200
+GEMINI_VAD_END_OF_TURN_MS = 800
+# Forward one silent frame this often while the gate is closed (0 = drop all)
+GEMINI_VAD_SILENCE_KEEPALIVE_MS = 0
+
+# Capture audio declared in setup at another rate (e.g. the browser's native
+# 48 kHz) is resampled to GEMINI_AUDIO_CONFIG["sample_rate"] on the server.
+# More taps per polyphase branch give a sharper anti-aliasing filter.
+GEMINI_RESAMPLER_TAPS_PER_PHASE = 32
+# Capture rates accepted from setup, frame headers and mime types; audio at
+# any other rate is dropped and reported to the browser.
+GEMINI_INPUT_SAMPLE_RATES = (8000, 16000, 22050, 24000, 44100, 48000)
+
+# Codecs the browser may negotiate for binary audio frames in either
+# direction (see voice_flow.audio_codecs). 'pcm16' is always the fallback.
+GEMINI_AUDIO_CODECS = ('pcm16', 'mulaw', 'ima-adpcm')
+
+# Transparent upstream reconnect. When the Gemini socket drops mid-call the
+# consumer retries with exponential backoff (base doubling up to the max,
+# with jitter) and buffers up to GEMINI_RECONNECT_BUFFER_MS of capture
+# audio, then replays setup plus a summary of the fields already saved.
+# GEMINI_RECONNECT_ATTEMPTS caps consecutive reconnects; the count resets
+# only once a reconnected upstream sends a message. Closes that reject the
+# session itself (e.g. 1007 invalid argument, 1008 policy) are not retried.
+# Set GEMINI_RECONNECT_ATTEMPTS to 0 to end the session on the first drop.
+GEMINI_RECONNECT_ATTEMPTS = 4
+GEMINI_RECONNECT_BACKOFF_SECONDS = 0.25
+GEMINI_RECONNECT_BACKOFF_MAX_SECONDS = 4.0
+GEMINI_RECONNECT_BUFFER_MS = 5000
+
+# Session registry recording which worker owns each live voice session
+# (see voice_flow.sessions). The in-memory backend only sees this process;
+# with several Daphne workers use 'voice_flow.sessions.RedisSessionRegistry'
+# with OPTIONS {'url': ...} next to a Redis channel layer. Consumers refresh
+# their entry every third of the TTL, so a crashed worker's sessions expire.
+VOICE_SESSION_REGISTRY = {
+    'BACKEND': 'voice_flow.sessions.InMemorySessionRegistry',
+}
+VOICE_SESSION_TTL_SECONDS = 60
+
+# Admission control for upstream Gemini sessions (see voice_flow.admission).
+# At most GEMINI_ADMISSION_MAX_SESSIONS concurrent sessions per process, and
+# new sessions start at GEMINI_ADMISSION_RATE per second with bursts of up
+# to GEMINI_ADMISSION_BURST (0 disables the rate limit). Callers over the
+# limit are queued and told their estimated wait; they are turned away when
+# GEMINI_ADMISSION_QUEUE_SIZE callers are already waiting or after
+# GEMINI_ADMISSION_MAX_WAIT_SECONDS. GEMINI_ADMISSION_SESSION_SECONDS seeds
+# the running average of call length used for the estimate.
+# GEMINI_ADMISSION_CLUSTER, e.g. {'url': 'redis://...', 'max_sessions': 200},
+# adds a limit shared by every worker using that server.
+GEMINI_ADMISSION_MAX_SESSIONS = 50
+GEMINI_ADMISSION_RATE = 5.0
+GEMINI_ADMISSION_BURST = 10
+GEMINI_ADMISSION_QUEUE_SIZE = 100
+GEMINI_ADMISSION_MAX_WAIT_SECONDS = 120
+GEMINI_ADMISSION_SESSION_SECONDS = 180
+GEMINI_ADMISSION_CLUSTER = None
+
+# Quota circuit breaker: a structured quota error from Gemini stops new
+# sessions for the cooldown, then capacity ramps back linearly over
+# GEMINI_BREAKER_RAMP_SECONDS. Another quota error while ramping doubles
+# the cooldown, up to the max.
+GEMINI_BREAKER_COOLDOWN_SECONDS = 30
+GEMINI_BREAKER_MAX_COOLDOWN_SECONDS = 300
+GEMINI_BREAKER_RAMP_SECONDS = 60
+
+# In-progress intakes are saved as AppointmentDraft rows by a write-behind
+# queue (voice_flow.drafts): field updates are coalesced and written at most
+# once per interval in one batch, and flushed when a call ends.
+# VOICE_DRAFTS_ENABLED = False stops calls writing drafts (load tests use it).
+VOICE_DRAFTS_ENABLED = True
+VOICE_DRAFT_FLUSH_INTERVAL_SECONDS = 2.0
+
+# Conversation transcripts (voice_flow.transcripts): messages are inserted in
+# batches of TRANSCRIPT_BULK_BATCH_SIZE, and message content of at least
+# TRANSCRIPT_COMPRESS_MIN_BYTES is stored zlib-compressed (None disables it).
+# Reads are paged by sequence or streamed in chunks.
+TRANSCRIPT_BULK_BATCH_SIZE = 500
+TRANSCRIPT_COMPRESS_MIN_BYTES = 2048
+TRANSCRIPT_PAGE_SIZE = 200
+TRANSCRIPT_MAX_PAGE_SIZE = 1000
+TRANSCRIPT_STREAM_CHUNK_SIZE = 500
+
+# Optional call audio archival (voice_flow.recording). The consumer copies
+# caller and model PCM into a fixed ring buffer per track, sized for
+# VOICE_RECORDING_BUFFER_SECONDS of 24 kHz audio. A background thread drains
+# the buffers every flush interval into WAV segments under
+# MEDIA_ROOT/VOICE_RECORDING_DIR.
+VOICE_RECORDING_ENABLED = False
+VOICE_RECORDING_BUFFER_SECONDS = 5
+VOICE_RECORDING_FLUSH_INTERVAL_SECONDS = 1.0
+VOICE_RECORDING_SEGMENT_SECONDS = 60
+VOICE_RECORDING_DIR = 'recordings'
+
+# Appointment list pagination (voice_flow.pagination): keyset pages on
+# (-created_at, id). `?page_size=` is capped at APPOINTMENT_MAX_PAGE_SIZE.
+APPOINTMENT_PAGE_SIZE = 50
+APPOINTMENT_MAX_PAGE_SIZE = 200
+
+# Columns returned by `?view=summary` on the appointment API: what the
+# clinic dashboard and the appointments page table show
+APPOINTMENT_SUMMARY_FIELDS = ('id', 'full_name', 'dob', 'reason_for_visit', 'visit_type', 'created_at')
+
+# Appointment search (voice_flow.search): at most this many ranked matches per request
+APPOINTMENT_SEARCH_LIMIT = 50
+
+# Bulk appointment import (voice_flow.bulk_import): rows are validated and
+# inserted with one bulk_create per batch of this many
+APPOINTMENT_IMPORT_BATCH_SIZE = 500
+
+# Appointment export (voice_flow.export): rows fetched per database round trip
+APPOINTMENT_EXPORT_CHUNK_SIZE = 1000
@@ -0,0 +1,136 @@
+"""Write-behind persistence of in-progress intakes as AppointmentDraft rows.
+
+Field updates are never written one by one from the event loop. The
+consumer hands the latest field snapshot of its session to the
+DraftWriter. The writer keeps only the newest snapshot per session and,
+at most once per interval, upserts every pending draft in a single ORM
+call off the loop. A session's draft is flushed straight away when the
+call ends and before it is committed.
+"""
+
+import asyncio
+import logging
+import weakref
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+
+from voice_flow.constants import VOICE_DRAFTS_ENABLED, VOICE_DRAFT_FLUSH_INTERVAL_SECONDS
+from voice_flow.intake import IntakeState
+from voice_flow.models import AppointmentDraft
+
+logger = logging.getLogger(__name__)
+
+# One writer per event loop: its flush task belongs to the loop.
+_writers = weakref.WeakKeyDictionary()
+
+
+def save_drafts(snapshots):
+    """
+    Upsert {session_id: fields} in one statement; status and appointment are left alone.
+    """
+    AppointmentDraft.objects.bulk_create(
+        [AppointmentDraft(session_id=session_id, fields=fields) for session_id, fields in snapshots.items()],
+        update_conflicts=True,
+        unique_fields=['session_id'],
+        update_fields=['fields', 'updated_at'],
+    )
+
+
+def load_draft(session_id):
+    """
+    Return the in-progress draft for `session_id`, or None.
+    """
+    return AppointmentDraft.objects.filter(session_id=session_id, status=AppointmentDraft.STATUS_IN_PROGRESS).first()
+
+
+def promote_draft(draft, fields=None):
+    """
+    Create the Appointment for a draft, e.g. when a supervisor finishes an interrupted call.
+    `fields` are corrections applied on top of the saved values.
+    """
+    intake = IntakeState(session_id=draft.session_id)
+    intake.update(draft.fields)
+    intake.update(fields)
+    return intake.create_appointment()
+
+
+class DraftWriter:
+    """
+    Coalesces draft updates and writes them in batches every `interval` seconds.
+    """
+
+    def __init__(self, interval=VOICE_DRAFT_FLUSH_INTERVAL_SECONDS):
+        self.interval = interval
+        self.writes = 0
+        self._pending = {}
+        self._task = None
+
+    def update(self, session_id, fields):
+        """
+        Queue the current fields of a session; returns without touching the database.
+        """
+        self._pending[session_id] = dict(fields)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.interval)
+        await self.flush()
+
+    async def flush(self, session_id=None):
+        """
+        Write pending drafts now: all of them, or only `session_id`'s.
+        """
+        if session_id is None:
+            batch, self._pending = self._pending, {}
+        elif session_id in self._pending:
+            batch = {session_id: self._pending.pop(session_id)}
+        else:
+            return
+        if not self._pending and self._task is not None and self._task is not asyncio.current_task():
+            # Nothing left for the timer to write
+            self._task.cancel()
+            self._task = None
+        if not batch:
+            return
+        try:
+            await database_sync_to_async(save_drafts)(batch)
+            self.writes += 1
+        except Exception:
+            logger.exception("Failed to write %d intake draft(s)", len(batch))
+            # Keep them for the next flush unless newer snapshots arrived meanwhile
+            for key, fields in batch.items():
+                self._pending.setdefault(key, fields)
+            if self._task is None or self._task.done():
+                self._task = asyncio.create_task(self._flush_later())
+
+
+class NullDraftWriter:
+    """
+    Stands in for DraftWriter when VOICE_DRAFTS_ENABLED is off; nothing is written.
+    """
+
+    writes = 0
+
+    def update(self, session_id, fields):
+        pass
+
+    async def flush(self, session_id=None):
+        pass
+
+
+def get_draft_writer():
+    """
+    Return the draft writer for the running event loop, creating it on first use.
+    """
+    if not getattr(settings, 'VOICE_DRAFTS_ENABLED', VOICE_DRAFTS_ENABLED):
+        return NullDraftWriter()
+    loop = asyncio.get_running_loop()
+    writer = _writers.get(loop)
+    if writer is None:
+        writer = DraftWriter(
+            interval=getattr(settings, 'VOICE_DRAFT_FLUSH_INTERVAL_SECONDS', VOICE_DRAFT_FLUSH_INTERVAL_SECONDS)
+        )
+        _writers[loop] = writer
+    return writer
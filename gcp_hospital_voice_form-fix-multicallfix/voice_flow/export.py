@@ -0,0 +1,118 @@
+"""Constant-memory export of appointments as NDJSON or CSV.
+
+Rows are read with QuerySet.values().iterator(chunk_size=...), so no model
+instances are built and only one chunk is held at a time. Each row is
+encoded as soon as it is read, and the generators here feed a
+StreamingHttpResponse directly. Attachment metadata, when requested, is
+fetched with one query per chunk of appointments instead of one per row.
+"""
+
+import csv
+import datetime
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+from voice_flow import jsoncodec
+from voice_flow.constants import APPOINTMENT_EXPORT_CHUNK_SIZE
+from voice_flow.models import Appointment, AppointmentAttachment
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+ATTACHMENT_COLUMNS = ('id', 'original_name', 'content_type', 'size_bytes', 'uploaded_at')
+# Spreadsheets run cells starting with these as formulas; such values get a leading quote
+CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+_encoder = JSONEncoder()
+
+
+def export_queryset(created_from=None, created_to=None):
+    """
+    Appointments created on or after `created_from` and on or before `created_to` (dates, inclusive).
+    """
+    queryset = Appointment.objects.order_by('created_at', 'id')
+    # Datetime bounds rather than created_at__date, so the range can use an index
+    if created_from is not None:
+        queryset = queryset.filter(created_at__gte=_start_of_day(created_from))
+    if created_to is not None:
+        queryset = queryset.filter(created_at__lt=_start_of_day(created_to + datetime.timedelta(days=1)))
+    return queryset
+
+
+def _start_of_day(day):
+    start = datetime.datetime.combine(day, datetime.time.min)
+    return timezone.make_aware(start) if settings.USE_TZ else start
+
+
+def export_columns(fields=None):
+    """
+    Concrete Appointment columns to export, in model order; `fields` limits them.
+    """
+    columns = [field.name for field in Appointment._meta.concrete_fields]
+    if fields is not None:
+        columns = [column for column in columns if column in fields or column == 'id']
+    return columns
+
+
+def iter_appointments(queryset, columns, include_attachments=False, chunk_size=None):
+    """
+    Yield appointment dicts, with an `attachments` list per row when requested.
+    """
+    chunk_size = chunk_size or getattr(settings, 'APPOINTMENT_EXPORT_CHUNK_SIZE', APPOINTMENT_EXPORT_CHUNK_SIZE)
+    rows = queryset.values(*columns).iterator(chunk_size=chunk_size)
+    if not include_attachments:
+        yield from rows
+        return
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield from _with_attachments(chunk)
+            chunk = []
+    if chunk:
+        yield from _with_attachments(chunk)
+
+
+def _with_attachments(chunk):
+    by_appointment = {row['id']: [] for row in chunk}
+    attachments = AppointmentAttachment.objects.filter(appointment_id__in=by_appointment).order_by('id')
+    for attachment in attachments.values('appointment_id', *ATTACHMENT_COLUMNS):
+        by_appointment[attachment.pop('appointment_id')].append(attachment)
+    for row in chunk:
+        row['attachments'] = by_appointment[row['id']]
+        yield row
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield jsoncodec.dumps_bytes(row, default=_encoder.default) + b'\n'
+
+
+class _LineBuffer:
+    """File-like object whose write() hands back the line csv.writer produced."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, list):
+        return jsoncodec.dumps(value, default=_encoder.default)
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_lines(rows, columns):
+    """
+    Yield a header line and then one CSV line per row; attachments are a JSON column.
+    """
+    writer = csv.writer(_LineBuffer())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([_csv_value(row.get(column)) for column in columns])
@@ -0,0 +1,184 @@
+"""Per-process pool of pre-opened Gemini Live websocket connections."""
+
+import asyncio
+import collections
+import logging
+import weakref
+
+import websockets
+from django.conf import settings
+
+from voice_flow.constants import (
+    GEMINI_WS_URL,
+    GEMINI_POOL_SIZE,
+    GEMINI_POOL_MAX_IDLE_SECONDS,
+    GEMINI_POOL_CHECK_INTERVAL_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+PING_TIMEOUT_SECONDS = 5
+
+# One pool per event loop: pooled sockets cannot be shared across loops.
+_pools = weakref.WeakKeyDictionary()
+
+
+async def open_gemini_connection(api_key):
+    """
+    Open a websocket to the Gemini Live BidiGenerateContent endpoint.
+    """
+    url = f"{getattr(settings, 'GEMINI_WS_URL', GEMINI_WS_URL)}?key={api_key}"
+    # Create connection without extra_headers for compatibility
+    return await websockets.connect(
+        url,
+        max_size=32 * 1024 * 1024,  # Increased buffer for audio
+        ping_interval=30,  # Keep connection alive
+        ping_timeout=10,
+        close_timeout=10
+    )
+
+
+def is_connection_open(ws):
+    """
+    Best-effort check that a websocket is still usable.
+    """
+    if ws is None:
+        return False
+    try:
+        if hasattr(ws, 'closed'):
+            return not ws.closed
+        if hasattr(ws, 'open'):
+            return bool(ws.open)
+    except Exception:
+        return False
+    # If no state attributes, assume connection is good if object exists
+    return True
+
+
+class GeminiConnectionPool:
+    """
+    Keeps up to `size` idle upstream connections per model ready for new sessions.
+
+    Connections are refilled in the background after each acquire and a
+    maintenance task pings idle sockets, discarding any that fail or that
+    have been idle longer than `max_idle_seconds` (Gemini closes sockets
+    that never receive a setup message).
+    """
+
+    def __init__(self, size=GEMINI_POOL_SIZE, max_idle_seconds=GEMINI_POOL_MAX_IDLE_SECONDS,
+                 check_interval=GEMINI_POOL_CHECK_INTERVAL_SECONDS, connect=open_gemini_connection):
+        self.size = max(0, int(size))
+        self.max_idle_seconds = max_idle_seconds
+        self.check_interval = check_interval
+        self._connect = connect
+        self._idle = collections.defaultdict(collections.deque)
+        self._api_keys = {}
+        self._maintainers = {}
+        self._refills = {}
+
+    async def acquire(self, model, api_key):
+        """
+        Return a healthy pooled connection for `model`, or open a new one.
+        """
+        self._api_keys[model] = api_key
+        idle = self._idle[model]
+        ws = None
+        while idle:
+            candidate, opened_at = idle.popleft()
+            if self._is_fresh(candidate, opened_at):
+                ws = candidate
+                break
+            await self._discard(candidate)
+        if self.size:
+            self._start_maintainer(model)
+            self._schedule_refill(model)
+        if ws is not None:
+            logger.debug("Reusing pooled Gemini connection for %s", model)
+            return ws
+        return await self._connect(api_key)
+
+    def idle_count(self, model):
+        return len(self._idle[model])
+
+    async def close(self):
+        """
+        Stop background work and close every idle connection.
+        """
+        for task in list(self._maintainers.values()) + list(self._refills.values()):
+            task.cancel()
+        self._maintainers.clear()
+        self._refills.clear()
+        for idle in self._idle.values():
+            while idle:
+                ws, _ = idle.popleft()
+                await self._discard(ws)
+
+    def _is_fresh(self, ws, opened_at):
+        loop = asyncio.get_running_loop()
+        return is_connection_open(ws) and loop.time() - opened_at < self.max_idle_seconds
+
+    def _schedule_refill(self, model):
+        task = self._refills.get(model)
+        if task is None or task.done():
+            self._refills[model] = asyncio.create_task(self._refill(model))
+
+    def _start_maintainer(self, model):
+        task = self._maintainers.get(model)
+        if task is None or task.done():
+            self._maintainers[model] = asyncio.create_task(self._maintain(model))
+
+    async def _refill(self, model):
+        loop = asyncio.get_running_loop()
+        idle = self._idle[model]
+        while len(idle) < self.size:
+            try:
+                ws = await self._connect(self._api_keys[model])
+            except Exception as e:
+                # Leave the pool short; the next acquire schedules another attempt
+                logger.warning("Gemini pool refill failed for %s: %s", model, e)
+                return
+            idle.append((ws, loop.time()))
+
+    async def _maintain(self, model):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            idle = self._idle[model]
+            # Check a snapshot so acquire() and refills can use the deque meanwhile
+            snapshot = list(idle)
+            idle.clear()
+            for ws, opened_at in snapshot:
+                if self._is_fresh(ws, opened_at) and await self._ping(ws):
+                    idle.append((ws, opened_at))
+                else:
+                    await self._discard(ws)
+            self._schedule_refill(model)
+
+    async def _ping(self, ws):
+        try:
+            pong = await ws.ping()
+            await asyncio.wait_for(pong, PING_TIMEOUT_SECONDS)
+            return True
+        except Exception:
+            return False
+
+    async def _discard(self, ws):
+        try:
+            await ws.close()
+        except Exception:
+            pass
+
+
+def get_gemini_pool():
+    """
+    Return the connection pool for the running event loop, creating it on first use.
+    """
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is None:
+        pool = GeminiConnectionPool(
+            size=getattr(settings, 'GEMINI_POOL_SIZE', GEMINI_POOL_SIZE),
+            max_idle_seconds=getattr(settings, 'GEMINI_POOL_MAX_IDLE_SECONDS', GEMINI_POOL_MAX_IDLE_SECONDS),
+            check_interval=getattr(settings, 'GEMINI_POOL_CHECK_INTERVAL_SECONDS', GEMINI_POOL_CHECK_INTERVAL_SECONDS),
+        )
+        _pools[loop] = pool
+    return pool
@@ -0,0 +1,141 @@
+"""Classification of messages received from the Gemini Live API.
+
+Messages are classified by their top-level keys only, so audio payloads
+are never stringified or scanned. Both camelCase and snake_case spellings
+are accepted through a single key lookup.
+"""
+
+MESSAGE_SERVER_CONTENT = 'server_content'
+MESSAGE_CONTENT_PARTS = 'content_parts'
+MESSAGE_TOOL_CALL = 'tool_call'
+MESSAGE_SETUP_COMPLETE = 'setup_complete'
+MESSAGE_GO_AWAY = 'go_away'
+MESSAGE_ERROR = 'error'
+MESSAGE_OTHER = 'other'
+
+PART_AUDIO = 'audio'
+PART_TEXT = 'text'
+PART_FUNCTION_CALL = 'function_call'
+PART_EXECUTABLE_CODE = 'executable_code'
+PART_OTHER = 'other'
+
+_MESSAGE_KEYS = {
+    'serverContent': MESSAGE_SERVER_CONTENT,
+    'server_content': MESSAGE_SERVER_CONTENT,
+    'toolCall': MESSAGE_TOOL_CALL,
+    'tool_call': MESSAGE_TOOL_CALL,
+    'setupComplete': MESSAGE_SETUP_COMPLETE,
+    'setup_complete': MESSAGE_SETUP_COMPLETE,
+    'goAway': MESSAGE_GO_AWAY,
+    'go_away': MESSAGE_GO_AWAY,
+    'error': MESSAGE_ERROR,
+    # Older response shapes carrying parts directly or inside candidates
+    'parts': MESSAGE_CONTENT_PARTS,
+    'candidates': MESSAGE_CONTENT_PARTS,
+}
+
+_PART_KEYS = {
+    'inlineData': PART_AUDIO,
+    'inline_data': PART_AUDIO,
+    'text': PART_TEXT,
+    'functionCall': PART_FUNCTION_CALL,
+    'function_call': PART_FUNCTION_CALL,
+    'executableCode': PART_EXECUTABLE_CODE,
+    'executable_code': PART_EXECUTABLE_CODE,
+}
+
+QUOTA_STATUSES = {'RESOURCE_EXHAUSTED'}
+QUOTA_CODES = {429}
+
+
+def first_of(mapping, camel, snake):
+    """
+    Read a key that Gemini may spell in camelCase or snake_case.
+    """
+    value = mapping.get(camel)
+    if value is None:
+        value = mapping.get(snake)
+    return value
+
+
+def classify_message(msg):
+    """
+    Return (kind, body) for a decoded Gemini message using its top-level keys.
+    """
+    if not isinstance(msg, dict):
+        return MESSAGE_OTHER, msg
+    for key, value in msg.items():
+        kind = _MESSAGE_KEYS.get(key)
+        if kind is None:
+            continue
+        if key == 'candidates':
+            value = ((value or [{}])[0].get('content') or {}).get('parts') or []
+        return kind, value
+    return MESSAGE_OTHER, msg
+
+
+def model_turn_parts(server_content):
+    """
+    Return the parts list of a serverContent body.
+    """
+    model_turn = first_of(server_content, 'modelTurn', 'model_turn') or {}
+    return model_turn.get('parts') or []
+
+
+def classify_part(part):
+    """
+    Return (kind, value) for a content part without touching its payload.
+
+    Audio parts yield the inlineData dict; text parts the text; function
+    calls and executable code their respective dicts.
+    """
+    if not isinstance(part, dict):
+        return PART_OTHER, part
+    for key, value in part.items():
+        kind = _PART_KEYS.get(key)
+        if kind is None:
+            continue
+        if kind == PART_AUDIO:
+            mime = (first_of(value, 'mimeType', 'mime_type') or '') if isinstance(value, dict) else ''
+            if not mime.startswith('audio/'):
+                return PART_OTHER, value
+        return kind, value
+    return PART_OTHER, part
+
+
+def is_turn_complete(server_content):
+    return bool(first_of(server_content, 'turnComplete', 'turn_complete'))
+
+
+def is_quota_error(error):
+    """
+    True when a structured error body reports exhausted quota.
+    """
+    if not isinstance(error, dict):
+        return False
+    return error.get('status') in QUOTA_STATUSES or error.get('code') in QUOTA_CODES
+
+
+def is_quota_close(exc):
+    """
+    True when a websocket close frame signals exhausted quota.
+
+    Gemini closes the socket (code 1011) with a short reason such as
+    'You exceeded your current quota...'; only that reason is inspected.
+    """
+    close = getattr(exc, 'rcvd', None)
+    reason = getattr(close, 'reason', '') or ''
+    return 'quota' in reason.lower() or 'RESOURCE_EXHAUSTED' in reason
+
+
+# Close codes for a session Gemini refused (protocol error, invalid argument,
+# policy violation, ...); replaying the same setup would be refused again
+PERMANENT_CLOSE_CODES = frozenset({1002, 1003, 1007, 1008, 1009, 1010})
+
+
+def is_permanent_close(exc):
+    """
+    True when a websocket close frame means a reconnect cannot help.
+    """
+    close = getattr(exc, 'rcvd', None)
+    return getattr(close, 'code', None) in PERMANENT_CLOSE_CODES
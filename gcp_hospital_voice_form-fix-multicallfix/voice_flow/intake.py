@@ -0,0 +1,144 @@
+"""Server-side patient intake state for a voice session.
+
+The consumer applies every save_patient_field call to an IntakeState as
+soon as it is parsed, so the server holds the authoritative field values.
+Repeated calls with the same value are recognised here once and are not
+relayed to the browser again. A `commit` message from the browser creates
+the Appointment from this state, via the same serializer the REST API
+uses, and marks the session's AppointmentDraft as completed.
+"""
+
+import datetime
+import logging
+import re
+
+from channels.db import database_sync_to_async
+from django.db import models, transaction
+
+from voice_flow.models import Appointment, AppointmentDraft
+from voice_flow.serializers import AppointmentSerializer
+from voice_flow.setup_profiles import EXTRA_INTAKE_FIELDS, get_intake_field_names
+from voice_flow.utils import format_serializer_errors
+
+logger = logging.getLogger(__name__)
+
+# Spoken answers that mean "leave this field empty"
+NOT_NEEDED_VALUES = frozenset({'not-needed', 'not needed'})
+BOOLEAN_VALUES = {'yes': True, 'true': True, 'no': False, 'false': False}
+BOOLEAN_FIELDS = frozenset(
+    field.name for field in Appointment._meta.concrete_fields if isinstance(field, models.BooleanField)
+)
+
+_US_DATE_RE = re.compile(r'^(\d{1,2})/(\d{1,2})/(\d{4})$')
+
+
+def normalize_date(value):
+    """
+    Accept MM/DD/YYYY as well as ISO dates; anything else is left for the serializer to reject.
+    """
+    match = _US_DATE_RE.match(value)
+    if match:
+        month, day, year = (int(part) for part in match.groups())
+        try:
+            return datetime.date(year, month, day).isoformat()
+        except ValueError:
+            return value
+    return value
+
+
+class IntakeState:
+    """
+    Field values saved during one call, in the order they were first saved.
+    `session_id` names the AppointmentDraft promoted on commit.
+    """
+
+    def __init__(self, session_id=None):
+        self.session_id = session_id
+        self.fields = {}
+        self.field_names = frozenset(get_intake_field_names())
+        self.appointment_id = None
+
+    def apply(self, field_name, value):
+        """
+        Record a save_patient_field call; returns False for unknown fields and repeats.
+        """
+        if field_name not in self.field_names:
+            logger.info("Ignoring save of unknown intake field", extra={'field_name': field_name})
+            return False
+        if isinstance(value, str):
+            value = value.strip()
+        if field_name in self.fields and self.fields[field_name] == value:
+            return False
+        self.fields[field_name] = value
+        return True
+
+    def update(self, fields):
+        """
+        Apply edits made in the browser (e.g. in the review dialog).
+        """
+        for field_name, value in (fields or {}).items():
+            self.apply(field_name, value)
+
+    def discard(self, field_name):
+        """
+        Forget a value the browser rejected, so the model's retry is not taken for a repeat.
+        """
+        self.fields.pop(field_name, None)
+
+    def appointment_data(self):
+        """
+        Field values converted to what AppointmentSerializer expects.
+        """
+        data = {}
+        for field_name, value in self.fields.items():
+            if field_name in EXTRA_INTAKE_FIELDS:
+                continue
+            if isinstance(value, str):
+                lowered = value.lower()
+                if lowered in NOT_NEEDED_VALUES:
+                    value = None
+                elif field_name in BOOLEAN_FIELDS and lowered in BOOLEAN_VALUES:
+                    value = BOOLEAN_VALUES[lowered]
+                elif field_name == 'dob':
+                    value = normalize_date(value)
+            data[field_name] = value
+        return data
+
+    async def commit(self):
+        """
+        Create the Appointment once; returns a dict shaped like the appointments API response.
+
+        Committing again after success returns the same appointment instead of creating another.
+        """
+        return await database_sync_to_async(self.create_appointment)()
+
+    def create_appointment(self):
+        """
+        Synchronous body of commit(); also used to promote drafts outside a call.
+        """
+        if self.appointment_id is not None:
+            appointment = Appointment.objects.get(pk=self.appointment_id)
+            return {
+                'success': True,
+                'message': 'Appointment already created',
+                'data': AppointmentSerializer(appointment).data,
+            }
+        serializer = AppointmentSerializer(data=self.appointment_data())
+        if not serializer.is_valid():
+            return {
+                'success': False,
+                'message': 'Validation failed',
+                'errors': format_serializer_errors(serializer.errors),
+            }
+        with transaction.atomic():
+            appointment = serializer.save()
+            if self.session_id is not None:
+                AppointmentDraft.objects.filter(session_id=self.session_id).update(
+                    status=AppointmentDraft.STATUS_COMPLETED, appointment=appointment
+                )
+        self.appointment_id = appointment.pk
+        return {
+            'success': True,
+            'message': 'Appointment created successfully',
+            'data': AppointmentSerializer(appointment).data,
+        }
@@ -0,0 +1,90 @@
+"""JSON encoding and decoding for voice_flow.
+
+Uses orjson when it is installed and falls back to the standard library
+otherwise. Callers always get `str` from dumps() (for websocket text
+frames) and `bytes` from dumps_bytes() (for HTTP bodies); loads() accepts
+either.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+JSONDecodeError = json.JSONDecodeError
+
+
+class StdlibBackend:
+    name = 'json'
+
+    def dumps(self, obj, default=None):
+        return json.dumps(obj, default=default, separators=(',', ':'), ensure_ascii=False)
+
+    def dumps_bytes(self, obj, default=None):
+        return self.dumps(obj, default=default).encode('utf-8')
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class OrjsonBackend:
+    name = 'orjson'
+
+    def __init__(self, passthrough_datetime=False):
+        self.option = orjson.OPT_NON_STR_KEYS
+        if passthrough_datetime:
+            self.option |= orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps(self, obj, default=None):
+        return self.dumps_bytes(obj, default=default).decode('utf-8')
+
+    def dumps_bytes(self, obj, default=None):
+        try:
+            return orjson.dumps(obj, default=default, option=self.option)
+        except TypeError:
+            # e.g. integers beyond 64 bits; the stdlib encoder handles these
+            return _stdlib.dumps_bytes(obj, default=default)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+_stdlib = StdlibBackend()
+
+
+def available_backends():
+    """
+    Return every usable backend, fastest first.
+    """
+    backends = []
+    if orjson is not None:
+        backends.append(OrjsonBackend())
+    backends.append(_stdlib)
+    return backends
+
+
+backend = available_backends()[0]
+
+
+def dumps(obj, default=None):
+    """
+    Serialize to a compact JSON str.
+    """
+    return backend.dumps(obj, default=default)
+
+
+def dumps_bytes(obj, default=None):
+    """
+    Serialize to compact UTF-8 JSON bytes.
+    """
+    return backend.dumps_bytes(obj, default=default)
+
+
+def loads(data):
+    """
+    Parse JSON from str or bytes. Raises ValueError (JSONDecodeError) on bad input.
+    """
+    return backend.loads(data)
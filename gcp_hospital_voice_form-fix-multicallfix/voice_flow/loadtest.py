@@ -0,0 +1,247 @@
+"""Offline load testing of the voice websocket against the mock Gemini server.
+
+run_worker() drives N simulated browser callers through the project's
+ASGI application in this process. Each caller sets up a binary PCM16
+session, speaks `speech_ms` of audio per turn at real-time pace, ends the
+turn, and waits for the model's reply. run_load_test() spreads the
+callers over one or more worker processes and merges their results.
+Each worker gets its own MockGeminiLiveServer unless a URL is given.
+Nothing leaves the machine and no quota is used.
+
+The callers run the real consumer against the configured database, so
+call recording and intake drafts are switched off for the run: a load test
+writes no CallRecording or AppointmentDraft rows and no audio files.
+"""
+
+import asyncio
+import math
+import multiprocessing
+import os
+import resource
+import time
+
+from channels.routing import get_default_application
+from channels.testing import WebsocketCommunicator
+from django.test import override_settings
+
+from voice_flow import jsoncodec
+from voice_flow.audio import AUDIO_FRAME_HEADER
+from voice_flow.mock_gemini import MockGeminiLiveServer, synthetic_pcm
+
+CALLER_SAMPLE_RATE = 16000
+VOICE_PATH = '/ws/voice/'
+
+# How long a caller waits for any single reply before giving up on the session
+REPLY_TIMEOUT_SECONDS = 120
+
+
+def current_rss_bytes():
+    """
+    Resident set size of this process; peak RSS where /proc is unavailable.
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentile(samples, fraction):
+    """
+    Nearest-rank percentile of a list of numbers (None when empty).
+    """
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class SimulatedCaller:
+    """
+    One browser session: setup, then `turns` rounds of speech and model reply.
+    """
+
+    def __init__(self, application, turns=3, speech_ms=2000, frame_ms=40, pace=1.0):
+        self.application = application
+        self.turns = turns
+        self.speech_ms = speech_ms
+        self.frame_ms = frame_ms
+        self.pace = pace
+        self.setup_latency = None
+        self.turn_latencies = []
+        self.messages_sent = 0
+        self.messages_received = 0
+        self.error = None
+        self._events = asyncio.Queue()
+
+    async def run(self):
+        communicator = WebsocketCommunicator(self.application, VOICE_PATH)
+        receiver = None
+        try:
+            connected, _ = await communicator.connect(timeout=REPLY_TIMEOUT_SECONDS)
+            if not connected:
+                self.error = 'rejected'
+                return self
+            receiver = asyncio.create_task(self._receive(communicator))
+            started = time.perf_counter()
+            await self._send(communicator, text_data=jsoncodec.dumps({
+                'type': 'setup',
+                'audio_transport': 'binary',
+                'audio_header': True,
+                'audio_output': 'binary',
+                'sample_rate': CALLER_SAMPLE_RATE,
+            }))
+            await self._wait_for('setup.ack')
+            self.setup_latency = time.perf_counter() - started
+            for _ in range(self.turns):
+                await self._speak(communicator)
+                ended = time.perf_counter()
+                await self._send(communicator, text_data=jsoncodec.dumps({'type': 'turn_complete'}))
+                first_audio = await self._wait_for('audio')
+                self.turn_latencies.append(first_audio - ended)
+                await self._wait_for('turn_complete')
+        except Exception as e:
+            self.error = f'{type(e).__name__}: {e}'
+        finally:
+            if receiver is not None:
+                receiver.cancel()
+            try:
+                await communicator.disconnect()
+            except Exception:
+                pass
+        return self
+
+    async def _speak(self, communicator):
+        frame_bytes = CALLER_SAMPLE_RATE * self.frame_ms // 1000 * 2
+        speech = synthetic_pcm(self.speech_ms, CALLER_SAMPLE_RATE, frequency=220.0)
+        for sequence, offset in enumerate(range(0, len(speech), frame_bytes)):
+            header = AUDIO_FRAME_HEADER.pack(sequence, CALLER_SAMPLE_RATE)
+            await self._send(communicator, bytes_data=header + speech[offset:offset + frame_bytes])
+            await asyncio.sleep(self.frame_ms / 1000 * self.pace)
+
+    async def _send(self, communicator, **data):
+        await communicator.send_to(**data)
+        self.messages_sent += 1
+
+    async def _receive(self, communicator):
+        while True:
+            output = await communicator.receive_output(timeout=REPLY_TIMEOUT_SECONDS)
+            if output['type'] == 'websocket.close':
+                await self._events.put(('closed', time.perf_counter(), output))
+                return
+            self.messages_received += 1
+            now = time.perf_counter()
+            if output.get('bytes') is not None:
+                await self._events.put(('audio', now, None))
+                continue
+            message = jsoncodec.loads(output['text'])
+            await self._events.put((message.get('type'), now, message))
+
+    async def _wait_for(self, kind):
+        """
+        Return the arrival time of the next event of `kind`, skipping others.
+        """
+        while True:
+            event, at, message = await asyncio.wait_for(self._events.get(), REPLY_TIMEOUT_SECONDS)
+            if event == kind:
+                return at
+            if event == 'closed' or (event == 'error' and kind == 'setup.ack'):
+                raise ConnectionError((message or {}).get('message') or f'session ended waiting for {kind}')
+
+
+async def run_worker(clients, turns=3, speech_ms=2000, pace=1.0, ramp_seconds=1.0, gemini_url=None,
+                     mock_options=None):
+    """
+    Run `clients` simulated callers in this process and return raw measurements.
+    """
+    mock = None
+    if gemini_url is None:
+        mock = await MockGeminiLiveServer(**(mock_options or {})).start()
+        gemini_url = mock.url
+    overrides = override_settings(
+        GEMINI_WS_URL=gemini_url,
+        GEMINI_API_KEY='mock-key',
+        # Keep load runs out of the real tables and the recordings directory
+        VOICE_RECORDING_ENABLED=False,
+        VOICE_DRAFTS_ENABLED=False,
+    )
+    overrides.enable()
+    try:
+        application = get_default_application()
+        baseline_rss = peak_rss = current_rss_bytes()
+        callers = [SimulatedCaller(application, turns=turns, speech_ms=speech_ms, pace=pace) for _ in range(clients)]
+
+        async def start(index, caller):
+            # Spread connects over the ramp so setup is not one thundering herd
+            await asyncio.sleep(ramp_seconds * index / max(1, clients))
+            return await caller.run()
+
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(start(index, caller)) for index, caller in enumerate(callers)]
+        pending = set(tasks)
+        while pending:
+            _, pending = await asyncio.wait(pending, timeout=0.25)
+            peak_rss = max(peak_rss, current_rss_bytes())
+        duration = time.perf_counter() - started
+    finally:
+        overrides.disable()
+        if mock is not None:
+            await mock.stop()
+
+    return {
+        'pid': os.getpid(),
+        'clients': clients,
+        'duration': duration,
+        'turn_latencies': [latency for caller in callers for latency in caller.turn_latencies],
+        'setup_latencies': [caller.setup_latency for caller in callers if caller.setup_latency is not None],
+        'messages': sum(caller.messages_sent + caller.messages_received for caller in callers),
+        'errors': [caller.error for caller in callers if caller.error],
+        'baseline_rss': baseline_rss,
+        'peak_rss': peak_rss,
+    }
+
+
+def _run_worker_process(kwargs):
+    return asyncio.run(run_worker(**kwargs))
+
+
+def summarize(results):
+    """
+    Merge per-worker measurements into the capacity report.
+    """
+    turn_latencies = [latency for result in results for latency in result['turn_latencies']]
+    setup_latencies = [latency for result in results for latency in result['setup_latencies']]
+    clients = sum(result['clients'] for result in results)
+    rss_per_session = [
+        (result['peak_rss'] - result['baseline_rss']) / result['clients'] for result in results if result['clients']
+    ]
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 1)
+
+    return {
+        'workers': len(results),
+        'clients': clients,
+        'turns': len(turn_latencies),
+        'errors': [error for result in results for error in result['errors']],
+        'turn_latency_ms': {'p50': ms(percentile(turn_latencies, 0.5)), 'p99': ms(percentile(turn_latencies, 0.99))},
+        'setup_latency_ms': {'p50': ms(percentile(setup_latencies, 0.5)), 'p99': ms(percentile(setup_latencies, 0.99))},
+        'messages_per_second_per_worker': [
+            round(result['messages'] / result['duration'], 1) if result['duration'] else 0.0 for result in results
+        ],
+        'rss_per_session_kib': round(sum(rss_per_session) / len(rss_per_session) / 1024, 1) if rss_per_session else None,
+    }
+
+
+def run_load_test(clients, workers=1, **options):
+    """
+    Run `clients` callers split across `workers` processes and return the summary.
+    """
+    shares = [clients // workers + (1 if index < clients % workers else 0) for index in range(workers)]
+    shares = [share for share in shares if share]
+    if len(shares) <= 1:
+        return summarize([asyncio.run(run_worker(clients, **options))])
+    # Forked workers inherit the configured Django settings
+    with multiprocessing.get_context('fork').Pool(len(shares)) as pool:
+        results = pool.map(_run_worker_process, [dict(options, clients=share) for share in shares])
+    return summarize(results)
@@ -0,0 +1,172 @@
+"""Non-blocking, sampled and PHI-redacting logging for the voice hot path.
+
+Records are handed to a bounded in-memory queue on the calling thread and
+written by a QueueListener on a background thread, so a slow stdout or log
+shipper never stalls the event loop. Formatting and redaction happen on the
+listener thread. Everything is wired up through settings.LOGGING.
+"""
+
+import atexit
+import copy
+import datetime
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+
+from voice_flow import jsoncodec
+
+
+# Attributes every LogRecord has; anything else was passed via `extra=`
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+# Extra keys whose values are patient data and are never written out
+PHI_EXTRA_KEYS = frozenset({'value', 'arguments', 'code', 'text', 'transcript'})
+
+REDACTED = '[REDACTED]'
+
+_PHI_PATTERNS = (
+    # e-mail addresses
+    re.compile(r'[\w.+-]+@[\w-]+\.[\w.-]+'),
+    # ISO and US-style dates (dates of birth)
+    re.compile(r'\b\d{4}-\d{2}-\d{2}\b|\b\d{1,2}/\d{1,2}/\d{2,4}\b'),
+    # phone numbers and other long digit runs (MRNs, SSNs)
+    re.compile(r'\+?\d[\d\s().-]{6,}\d'),
+    # value="..." arguments inside save_patient_field() code
+    re.compile(r'''(?<=value=)(["']).*?\1'''),
+)
+
+
+def redact(text):
+    """
+    Mask values that look like patient identifiers in a log message.
+    """
+    for pattern in _PHI_PATTERNS:
+        text = pattern.sub(REDACTED, text)
+    return text
+
+
+class RedactPHIFilter(logging.Filter):
+    """
+    Redacts PHI-looking values in the message and drops PHI extras.
+    """
+
+    def filter(self, record):
+        record.msg = redact(record.getMessage())
+        record.args = None
+        for key in PHI_EXTRA_KEYS & vars(record).keys():
+            setattr(record, key, REDACTED)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a fraction of records per logger category.
+
+    `rates` maps logger names to a keep probability between 0 and 1; the
+    longest matching prefix wins. WARNING and above are never sampled out.
+    """
+
+    def __init__(self, rates=None, name=''):
+        super().__init__(name)
+        self.rates = sorted((rates or {}).items(), key=lambda item: len(item[0]), reverse=True)
+        self._random = random.random
+
+    def rate_for(self, logger_name):
+        for prefix, rate in self.rates:
+            if logger_name == prefix or logger_name.startswith(prefix + '.'):
+                return rate
+        return 1.0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record.name)
+        return rate >= 1.0 or self._random() < rate
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    One JSON object per line: time, level, logger, message and any extras.
+    """
+
+    def format(self, record):
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return jsoncodec.dumps(entry, default=str)
+
+
+class BackgroundQueueHandler(logging.Handler):
+    """
+    Handler that puts records on a bounded queue drained by its own listener thread.
+
+    Configure it from settings.LOGGING; filters attached to this handler
+    (e.g. sampling) run on the logging thread, while `redact` and the
+    formatter are applied by the listener thread. When the queue is full
+    the record is dropped and counted rather than blocking the caller.
+
+    This is deliberately not a logging.handlers.QueueHandler: from Python
+    3.12 dictConfig expects those to name their handlers and listener in
+    the config instead of owning them.
+    """
+
+    def __init__(self, stream='ext://sys.stderr', queue_size=10000, redact=True):
+        super().__init__()
+        self.queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        if isinstance(stream, str) and stream.startswith('ext://sys.'):
+            stream = getattr(sys, stream[len('ext://sys.'):])
+        self.target = logging.StreamHandler(stream)
+        if redact:
+            self.target.addFilter(RedactPHIFilter())
+        self.dropped = 0
+        self.listener = logging.handlers.QueueListener(self.queue, self.target, respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self._stop_listener)
+
+    def setFormatter(self, fmt):
+        # The formatter runs on the listener thread, not on the caller's
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Freeze the message and traceback now; the listener formats later
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        # Wait until the listener has written every queued record (used by tests and shutdown)
+        if self.listener._thread is not None:
+            self.queue.join()
+        self.target.flush()
+
+    def close(self):
+        self._stop_listener()
+        self.target.close()
+        super().close()
+
+    def _stop_listener(self):
+        if self.listener._thread is not None:
+            self.listener.stop()
@@ -0,0 +1,62 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from voice_flow.audio_codecs import CODEC_IMA_ADPCM, CODEC_MULAW, get_decoder, get_encoder
+
+
+def speech_like_pcm(seconds, sample_rate):
+    """
+    A few harmonics with a slow amplitude envelope and some noise, as PCM16 bytes.
+    """
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 3 * t)
+    signal = sum(np.sin(2 * np.pi * f * t) / (i + 1) for i, f in enumerate((180, 360, 720, 1440)))
+    signal = envelope * signal * 9000 + rng.standard_normal(len(t)) * 200
+    return np.clip(signal, -32768, 32767).astype('<i2').tobytes()
+
+
+class Command(BaseCommand):
+    help = 'Measure encode/decode throughput of the browser audio codecs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=10.0, help='Audio duration to process per run')
+        parser.add_argument('--sample-rate', type=int, default=24000)
+        parser.add_argument('--frame-ms', type=int, default=40, help='Frame size, i.e. one websocket message')
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        sample_rate = options['sample_rate']
+        pcm = speech_like_pcm(options['seconds'], sample_rate)
+        frame_bytes = sample_rate * options['frame_ms'] // 1000 * 2
+        frames = [pcm[i:i + frame_bytes] for i in range(0, len(pcm), frame_bytes)]
+        samples = len(pcm) // 2
+
+        self.stdout.write(f"{len(frames)} frames of {options['frame_ms']} ms at {sample_rate} Hz "
+                          f"({options['seconds']:.1f} s of audio)")
+        self.stdout.write(f"{'codec':<12}{'ratio':>7}{'enc x realtime':>17}{'dec x realtime':>17}{'dec Msamples/s':>17}")
+        for codec in (CODEC_MULAW, CODEC_IMA_ADPCM):
+            encode = get_encoder(codec)
+            decode = get_decoder(codec)
+            encoded = [encode(frame) for frame in frames]
+            ratio = len(pcm) / sum(len(block) for block in encoded)
+
+            # A fresh encoder per run, as each session gets its own state
+            encode_time = self._best(lambda: list(map(get_encoder(codec), frames)), options['repeat'])
+            decode_time = self._best(lambda: [decode(block) for block in encoded], options['repeat'])
+            self.stdout.write(
+                f"{codec:<12}{ratio:>6.1f}:1"
+                f"{options['seconds'] / encode_time:>17,.0f}"
+                f"{options['seconds'] / decode_time:>17,.0f}"
+                f"{samples / decode_time / 1e6:>17,.1f}"
+            )
+
+    def _best(self, func, repeat):
+        best = float('inf')
+        for _ in range(max(1, repeat)):
+            start = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - start)
+        return best
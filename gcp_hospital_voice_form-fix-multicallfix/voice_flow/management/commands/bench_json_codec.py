@@ -0,0 +1,82 @@
+import base64
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from voice_flow import jsoncodec
+from voice_flow.audio import build_realtime_audio_payload, pcm_mime_type
+from voice_flow.setup_profiles import PATIENT_INTAKE_PROFILE
+
+
+def sample_messages():
+    """
+    Representative payloads from the voice consumer and the appointments API.
+    """
+    pcm_100ms = os.urandom(3200)  # 100 ms of 16 kHz mono PCM16
+    model_pcm = os.urandom(9600)  # 200 ms of 24 kHz model audio
+    appointment = {
+        'id': 1,
+        'full_name': 'Jane Example',
+        'dob': '1990-01-15',
+        'gender': 'Female',
+        'contact_number': '+15550100',
+        'email': 'jane@example.com',
+        'address': '1 Main St, Springfield, IL 62701',
+        'reason_for_visit': 'Follow-up for persistent cough',
+        'symptoms': 'Dry cough, mild fever',
+        'pain_level': 3,
+        'consent_share_records': True,
+        'attachments': [],
+        'created_at': '2025-01-01T09:30:00Z',
+    }
+    return {
+        'realtime_input_audio': jsoncodec.loads(build_realtime_audio_payload(pcm_100ms, pcm_mime_type())),
+        'server_content_audio': {
+            'serverContent': {'modelTurn': {'parts': [{'inlineData': {
+                'mimeType': 'audio/pcm;rate=24000',
+                'data': base64.b64encode(model_pcm).decode('ascii'),
+            }}]}}
+        },
+        'function_call': {
+            'toolCall': {'functionCalls': [{
+                'id': 'call-1',
+                'name': 'save_patient_field',
+                'args': {'field_name': 'full_name', 'value': 'Jane Example'},
+            }]}
+        },
+        'setup': PATIENT_INTAKE_PROFILE.build_setup(),
+        'appointment_list': {'success': True, 'count': 50, 'data': [appointment] * 50},
+    }
+
+
+class Command(BaseCommand):
+    help = 'Compare dumps/loads throughput of the available JSON backends on voice and API payloads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000, help='Operations per payload and backend')
+
+    def handle(self, *args, **options):
+        iterations = max(1, options['iterations'])
+        messages = sample_messages()
+        backends = jsoncodec.available_backends()
+
+        self.stdout.write(f"Active backend: {jsoncodec.backend.name}")
+        self.stdout.write(f"{'payload':<24}{'bytes':>9}  " + ''.join(
+            f"{b.name + ' dumps/s':>18}{b.name + ' loads/s':>18}" for b in backends
+        ))
+        for label, message in messages.items():
+            encoded = jsoncodec.dumps(message)
+            row = f"{label:<24}{len(encoded):>9}  "
+            for backend in backends:
+                text = backend.dumps(message)
+                row += f"{self._rate(backend.dumps, message, iterations):>18,.0f}"
+                row += f"{self._rate(backend.loads, text, iterations):>18,.0f}"
+            self.stdout.write(row)
+
+    def _rate(self, func, arg, iterations):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func(arg)
+        elapsed = time.perf_counter() - start
+        return iterations / elapsed if elapsed else float('inf')
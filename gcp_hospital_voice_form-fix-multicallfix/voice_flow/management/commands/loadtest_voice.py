@@ -0,0 +1,55 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from voice_flow.loadtest import run_load_test
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive simulated browser callers through the voice websocket against a mock Gemini Live server. '
+        'Call recording and intake drafts are disabled for the run, so nothing is written to the '
+        'configured database or the recordings directory.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=20, help='Concurrent simulated callers in total')
+        parser.add_argument('--workers', type=int, default=1, help='Worker processes to split the callers over')
+        parser.add_argument('--turns', type=int, default=3, help='User turns per call')
+        parser.add_argument('--speech-ms', type=int, default=2000, help='Caller audio per turn')
+        parser.add_argument('--pace', type=float, default=1.0,
+                            help='Speech pacing relative to real time (0 sends audio as fast as possible)')
+        parser.add_argument('--ramp-seconds', type=float, default=1.0, help='Spread call starts over this long')
+        parser.add_argument('--gemini-url', help='Use an already running mock server instead of one per worker')
+        parser.add_argument('--response-delay', type=float, default=0.3, help="Mock model's think time per turn")
+        parser.add_argument('--response-audio-ms', type=int, default=1200, help='Mock model audio per turn')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        report = run_load_test(
+            options['clients'],
+            workers=max(1, options['workers']),
+            turns=options['turns'],
+            speech_ms=options['speech_ms'],
+            pace=options['pace'],
+            ramp_seconds=options['ramp_seconds'],
+            gemini_url=options['gemini_url'],
+            mock_options={
+                'first_response_delay': options['response_delay'],
+                'response_audio_ms': options['response_audio_ms'],
+            },
+        )
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(f"{report['clients']} callers on {report['workers']} worker(s), {report['turns']} turns")
+        self.stdout.write(f"turn latency   p50 {report['turn_latency_ms']['p50']} ms"
+                          f"   p99 {report['turn_latency_ms']['p99']} ms")
+        self.stdout.write(f"setup latency  p50 {report['setup_latency_ms']['p50']} ms"
+                          f"   p99 {report['setup_latency_ms']['p99']} ms")
+        per_worker = ', '.join(f'{rate:,.0f}' for rate in report['messages_per_second_per_worker'])
+        self.stdout.write(f"messages/s per worker  {per_worker}")
+        self.stdout.write(f"RSS per session        {report['rss_per_session_kib']} KiB")
+        if report['errors']:
+            self.stdout.write(self.style.WARNING(f"{len(report['errors'])} session(s) failed, e.g. {report['errors'][0]}"))
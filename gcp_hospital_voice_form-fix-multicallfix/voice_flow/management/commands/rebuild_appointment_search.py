@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import NotSupportedError
+
+from voice_flow.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Recreate the appointment full-text index and its sync triggers, and reindex every appointment.'
+
+    def handle(self, *args, **options):
+        try:
+            indexed = rebuild_search_index()
+        except NotSupportedError as e:
+            raise CommandError(str(e))
+        self.stdout.write(f'Indexed {indexed} appointments')
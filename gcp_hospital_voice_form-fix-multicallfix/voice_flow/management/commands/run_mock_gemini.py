@@ -0,0 +1,33 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from voice_flow.mock_gemini import MockGeminiLiveServer
+
+
+class Command(BaseCommand):
+    help = 'Serve the mock Gemini Live websocket; point GEMINI_WS_URL at it to run the app without quota.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--setup-delay', type=float, default=0.05)
+        parser.add_argument('--response-delay', type=float, default=0.3, help="Model's think time per turn")
+        parser.add_argument('--response-audio-ms', type=int, default=1200, help='Model audio per turn')
+        parser.add_argument('--respond-after-audio-ms', type=int, default=0,
+                            help='End a user turn after this much input audio (0 waits for an explicit end)')
+
+    def handle(self, *args, **options):
+        asyncio.run(self._serve(MockGeminiLiveServer(
+            host=options['host'],
+            port=options['port'],
+            setup_delay=options['setup_delay'],
+            first_response_delay=options['response_delay'],
+            response_audio_ms=options['response_audio_ms'],
+            respond_after_audio_ms=options['respond_after_audio_ms'],
+        )))
+
+    async def _serve(self, server):
+        async with server:
+            self.stdout.write(f'Mock Gemini Live listening on {server.url}')
+            await asyncio.Future()
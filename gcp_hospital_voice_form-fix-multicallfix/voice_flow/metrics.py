@@ -0,0 +1,197 @@
+"""Per-worker latency histograms for voice sessions.
+
+Each GeminiVoiceConsumer owns a TurnTimer that stamps key events with
+time.monotonic() and records the resulting intervals into process-wide
+histograms. The histograms are read by the staff-only metrics endpoint.
+"""
+
+import bisect
+import os
+import socket
+import threading
+import time
+
+
+# Bucket upper bounds in milliseconds; anything slower lands in the overflow bucket
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 750, 1000, 1500, 2500, 5000, 10000, 30000)
+
+# Histogram names
+SETUP_TO_FIRST_MESSAGE = 'setup_to_first_message'
+TIME_TO_FIRST_AUDIO = 'time_to_first_audio'
+TURN_RESPONSE = 'turn_response'
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket histogram of durations with count, sum, min and max.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts = [0] * (len(self.buckets) + 1)
+            self.count = 0
+            self.total_ms = 0.0
+            self.min_ms = None
+            self.max_ms = None
+
+    def observe(self, seconds):
+        value = max(0.0, seconds * 1000.0)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total_ms += value
+            self.min_ms = value if self.min_ms is None else min(self.min_ms, value)
+            self.max_ms = value if self.max_ms is None else max(self.max_ms, value)
+
+    def percentile(self, fraction):
+        """
+        Estimate a percentile as the upper bound of the bucket that contains it.
+        """
+        with self._lock:
+            return self._percentile(fraction)
+
+    def _percentile(self, fraction):
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                if index < len(self.buckets):
+                    return min(float(self.buckets[index]), self.max_ms)
+                return self.max_ms
+        return self.max_ms
+
+    def snapshot(self):
+        with self._lock:
+            bounds = [str(b) for b in self.buckets] + ['+Inf']
+            return {
+                'count': self.count,
+                'sum_ms': round(self.total_ms, 3),
+                'mean_ms': round(self.total_ms / self.count, 3) if self.count else None,
+                'min_ms': None if self.min_ms is None else round(self.min_ms, 3),
+                'max_ms': None if self.max_ms is None else round(self.max_ms, 3),
+                'p50_ms': self._percentile(0.5),
+                'p90_ms': self._percentile(0.9),
+                'p99_ms': self._percentile(0.99),
+                'buckets': dict(zip(bounds, self.counts)),
+            }
+
+
+_histograms = {
+    SETUP_TO_FIRST_MESSAGE: LatencyHistogram(),
+    TIME_TO_FIRST_AUDIO: LatencyHistogram(),
+    TURN_RESPONSE: LatencyHistogram(),
+}
+_sessions_lock = threading.Lock()
+_active_sessions = 0
+_started_sessions = 0
+
+
+def observe(name, seconds):
+    _histograms[name].observe(seconds)
+
+
+def session_started():
+    global _active_sessions, _started_sessions
+    with _sessions_lock:
+        _active_sessions += 1
+        _started_sessions += 1
+
+
+def session_ended():
+    global _active_sessions
+    with _sessions_lock:
+        _active_sessions = max(0, _active_sessions - 1)
+
+
+def snapshot():
+    """
+    Return this worker's histograms and session counters as a JSON-ready dict.
+    """
+    with _sessions_lock:
+        sessions = {'active': _active_sessions, 'started': _started_sessions}
+    return {
+        'worker': {'host': socket.gethostname(), 'pid': os.getpid()},
+        'sessions': sessions,
+        'histograms': {name: histogram.snapshot() for name, histogram in _histograms.items()},
+    }
+
+
+def reset():
+    global _active_sessions, _started_sessions
+    for histogram in _histograms.values():
+        histogram.reset()
+    with _sessions_lock:
+        _active_sessions = 0
+        _started_sessions = 0
+
+
+class TurnTimer:
+    """
+    Monotonic timestamps for one voice session.
+
+    A turn is anchored on the last user audio chunk received before the
+    client's turn_complete (inputComplete). Without an explicit turn end,
+    e.g. when Gemini's own VAD ends the turn, the last chunk before the
+    first model audio is used instead.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.setup_sent_at = None
+        self.first_message_at = None
+        self.last_user_audio_at = None
+        self.user_turn_end_at = None
+        self.first_model_audio_at = None
+
+    def setup_sent(self):
+        self.setup_sent_at = self.clock()
+        self.first_message_at = None
+
+    def upstream_message(self):
+        if self.first_message_at is None and self.setup_sent_at is not None:
+            self.first_message_at = self.clock()
+            observe(SETUP_TO_FIRST_MESSAGE, self.first_message_at - self.setup_sent_at)
+
+    def user_audio(self):
+        # Audio keeps streaming while the model answers; only the pre-response chunk counts
+        if self.first_model_audio_at is None and self.user_turn_end_at is None:
+            self.last_user_audio_at = self.clock()
+
+    def user_input(self):
+        """
+        Non-audio input (typed text) that starts a turn on its own.
+        """
+        if self.first_model_audio_at is None:
+            self.user_turn_end_at = self.clock()
+
+    def user_turn_end(self):
+        if self.user_turn_end_at is None:
+            self.user_turn_end_at = self.last_user_audio_at or self.clock()
+
+    def model_audio(self):
+        if self.first_model_audio_at is not None:
+            return
+        self.first_model_audio_at = self.clock()
+        anchor = self._anchor()
+        if anchor is not None:
+            observe(TIME_TO_FIRST_AUDIO, self.first_model_audio_at - anchor)
+
+    def model_turn_complete(self):
+        anchor = self._anchor()
+        if anchor is not None:
+            observe(TURN_RESPONSE, self.clock() - anchor)
+        self.last_user_audio_at = None
+        self.user_turn_end_at = None
+        self.first_model_audio_at = None
+
+    def _anchor(self):
+        return self.user_turn_end_at or self.last_user_audio_at
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voice_flow', '0002_remove_appointment_guardian_contact_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentDraft',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_id', models.CharField(help_text='Voice session that owns the draft', max_length=64, unique=True)),
+                ('fields', models.JSONField(default=dict, help_text='Intake field values saved so far')),
+                ('status', models.CharField(choices=[('in_progress', 'In progress'), ('completed', 'Completed')], db_index=True, default='in_progress', help_text='Whether the draft has been promoted to an appointment', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('appointment', models.OneToOneField(blank=True, help_text='Appointment created from this draft', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='draft', to='voice_flow.appointment')),
+            ],
+            options={
+                'verbose_name': 'Appointment Draft',
+                'verbose_name_plural': 'Appointment Drafts',
+                'db_table': 'appointment_draft',
+                'ordering': ['-updated_at'],
+            },
+        ),
+    ]
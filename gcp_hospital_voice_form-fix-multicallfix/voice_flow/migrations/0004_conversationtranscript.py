@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voice_flow', '0003_appointmentdraft'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationTranscript',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(blank=True, max_length=255)),
+                ('started_at', models.DateTimeField(blank=True, help_text='When the conversation started', null=True)),
+                ('ended_at', models.DateTimeField(blank=True, help_text='When the conversation ended', null=True)),
+                ('message_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('appointment', models.ForeignKey(blank=True, help_text='Appointment the conversation produced', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transcripts', to='voice_flow.appointment')),
+            ],
+            options={
+                'verbose_name': 'Conversation Transcript',
+                'verbose_name_plural': 'Conversation Transcripts',
+                'db_table': 'conversation_transcript',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='TranscriptMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sequence', models.PositiveIntegerField(help_text='Position of the message in the conversation')),
+                ('role', models.CharField(max_length=20)),
+                ('content', models.TextField(blank=True)),
+                ('content_zlib', models.BinaryField(blank=True, null=True)),
+                ('timestamp', models.DateTimeField(blank=True, null=True)),
+                ('transcript', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='voice_flow.conversationtranscript')),
+            ],
+            options={
+                'verbose_name': 'Transcript Message',
+                'verbose_name_plural': 'Transcript Messages',
+                'db_table': 'transcript_message',
+                'ordering': ['transcript', 'sequence'],
+                'constraints': [models.UniqueConstraint(fields=('transcript', 'sequence'), name='transcript_message_sequence_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voice_flow', '0004_conversationtranscript'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CallRecording',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_id', models.CharField(help_text='Voice session that was recorded', max_length=64, unique=True)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('ended_at', models.DateTimeField(blank=True, null=True)),
+                ('dropped_bytes', models.PositiveBigIntegerField(default=0, help_text='Audio lost because the writer fell behind the ring buffer')),
+            ],
+            options={
+                'verbose_name': 'Call Recording',
+                'verbose_name_plural': 'Call Recordings',
+                'db_table': 'call_recording',
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CallRecordingSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('track', models.CharField(choices=[('inbound', 'Inbound'), ('outbound', 'Outbound')], max_length=10)),
+                ('index', models.PositiveIntegerField(help_text='Position of the segment within its track')),
+                ('file', models.FileField(max_length=255, upload_to='recordings/')),
+                ('sample_rate', models.PositiveIntegerField()),
+                ('duration_ms', models.PositiveIntegerField()),
+                ('size_bytes', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('recording', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segments', to='voice_flow.callrecording')),
+            ],
+            options={
+                'verbose_name': 'Call Recording Segment',
+                'verbose_name_plural': 'Call Recording Segments',
+                'db_table': 'call_recording_segment',
+                'ordering': ['recording', 'track', 'index'],
+                'constraints': [models.UniqueConstraint(fields=('recording', 'track', 'index'), name='call_recording_segment_unique')],
+            },
+        ),
+    ]
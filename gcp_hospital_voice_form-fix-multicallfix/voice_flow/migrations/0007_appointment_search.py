@@ -0,0 +1,75 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:37
+
+from django.db import migrations, models
+
+# Frozen copy of the FTS5 schema in voice_flow.search as of this migration;
+# later edits to that module must not change what this migration creates.
+CREATE_SEARCH_INDEX = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS appointment_fts USING fts5(
+        full_name, reason_for_visit, symptoms, medical_history,
+        content='appointment', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS appointment_fts_insert AFTER INSERT ON appointment BEGIN
+        INSERT INTO appointment_fts(rowid, full_name, reason_for_visit, symptoms, medical_history)
+        VALUES (new.id, new.full_name, new.reason_for_visit, new.symptoms, new.medical_history);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS appointment_fts_delete AFTER DELETE ON appointment BEGIN
+        INSERT INTO appointment_fts(appointment_fts, rowid, full_name, reason_for_visit, symptoms, medical_history)
+        VALUES ('delete', old.id, old.full_name, old.reason_for_visit, old.symptoms, old.medical_history);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS appointment_fts_update
+    AFTER UPDATE OF full_name, reason_for_visit, symptoms, medical_history ON appointment BEGIN
+        INSERT INTO appointment_fts(appointment_fts, rowid, full_name, reason_for_visit, symptoms, medical_history)
+        VALUES ('delete', old.id, old.full_name, old.reason_for_visit, old.symptoms, old.medical_history);
+        INSERT INTO appointment_fts(rowid, full_name, reason_for_visit, symptoms, medical_history)
+        VALUES (new.id, new.full_name, new.reason_for_visit, new.symptoms, new.medical_history);
+    END
+    """,
+    "INSERT INTO appointment_fts(appointment_fts) VALUES ('rebuild')",
+]
+
+DROP_SEARCH_INDEX = [
+    'DROP TRIGGER IF EXISTS appointment_fts_insert',
+    'DROP TRIGGER IF EXISTS appointment_fts_delete',
+    'DROP TRIGGER IF EXISTS appointment_fts_update',
+    'DROP TABLE IF EXISTS appointment_fts',
+]
+
+
+def run_on_sqlite(statements):
+    # FTS5 is SQLite-only; other databases get just the B-tree indexes
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voice_flow', '0006_appointment_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='appointment',
+            name='contact_number',
+            field=models.CharField(db_index=True, help_text='Contact phone number', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='appointment',
+            name='email',
+            field=models.EmailField(blank=True, db_index=True, help_text='Email address', max_length=254, null=True),
+        ),
+        migrations.RunPython(run_on_sqlite(CREATE_SEARCH_INDEX), run_on_sqlite(DROP_SEARCH_INDEX)),
+    ]
@@ -0,0 +1,142 @@
+"""Local stand-in for the Gemini Live BidiGenerateContent websocket.
+
+MockGeminiLiveServer speaks enough of the Live protocol to drive
+GeminiVoiceConsumer without spending quota. It answers setup with
+setupComplete, and for every user turn it streams synthetic model audio,
+a text part, an executableCode part calling save_patient_field, and then
+turnComplete. A user turn ends on inputComplete, on text input, on
+clientContent with turnComplete, or optionally after a fixed amount of
+input audio, which imitates Gemini's own turn detection. Every delay is
+configurable, so latency and pacing can be shaped for load tests.
+
+Point settings.GEMINI_WS_URL at `server.url` to use it.
+"""
+
+import asyncio
+import base64
+import logging
+
+import numpy as np
+import websockets
+
+from voice_flow import jsoncodec
+from voice_flow.audio import pcm_mime_type, sample_rate_from_mime
+
+logger = logging.getLogger(__name__)
+
+MODEL_SAMPLE_RATE = 24000
+
+
+def synthetic_pcm(ms, sample_rate=MODEL_SAMPLE_RATE, frequency=180.0, phase=0):
+    """
+    A quiet sine tone as PCM16 little-endian bytes; `phase` is a sample offset.
+    """
+    t = (np.arange(sample_rate * ms // 1000) + phase) / sample_rate
+    return (np.sin(2 * np.pi * frequency * t) * 6000).astype('<i2').tobytes()
+
+
+class MockGeminiLiveServer:
+    """
+    Websocket server imitating Gemini Live for local and load testing.
+
+    setup_delay            seconds before setupComplete is sent
+    first_response_delay   seconds between the end of a user turn and the first model part
+    response_audio_ms      model audio per turn, sent in chunks of `audio_chunk_ms`
+    chunk_interval         seconds between audio chunks (None paces them in real time)
+    respond_after_audio_ms end a user turn after this much input audio (0 waits for an explicit end)
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, setup_delay=0.05, first_response_delay=0.3,
+                 response_audio_ms=1200, audio_chunk_ms=40, chunk_interval=None, respond_after_audio_ms=0,
+                 response_text='Thank you. Could you tell me your date of birth?'):
+        self.host = host
+        self.port = port
+        self.setup_delay = setup_delay
+        self.first_response_delay = first_response_delay
+        self.response_audio_ms = response_audio_ms
+        self.audio_chunk_ms = audio_chunk_ms
+        self.chunk_interval = audio_chunk_ms / 1000 if chunk_interval is None else chunk_interval
+        self.respond_after_audio_ms = respond_after_audio_ms
+        self.response_text = response_text
+        self.server = None
+        self.sessions = 0
+        self.turns = 0
+        self.messages_received = 0
+
+    @property
+    def url(self):
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f'ws://{host}:{port}/ws'
+
+    async def start(self):
+        self.server = await websockets.serve(self._serve, self.host, self.port, max_size=32 * 1024 * 1024)
+        return self
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    async def _serve(self, ws):
+        self.sessions += 1
+        session = self.sessions
+        responder = None
+        audio_ms = 0.0
+        turn = 0
+        try:
+            async for raw in ws:
+                self.messages_received += 1
+                msg = jsoncodec.loads(raw)
+                if 'setup' in msg:
+                    await asyncio.sleep(self.setup_delay)
+                    await ws.send(jsoncodec.dumps({'setupComplete': {}}))
+                    continue
+                realtime = msg.get('realtimeInput') or {}
+                end_of_turn = bool(realtime.get('inputComplete') or realtime.get('text')
+                                   or (msg.get('clientContent') or {}).get('turnComplete'))
+                for chunk in realtime.get('mediaChunks') or ():
+                    rate = sample_rate_from_mime(chunk.get('mimeType'), 16000)
+                    audio_ms += len(base64.b64decode(chunk.get('data') or '')) / 2 / rate * 1000
+                if self.respond_after_audio_ms and audio_ms >= self.respond_after_audio_ms:
+                    end_of_turn = True
+                if end_of_turn and (responder is None or responder.done()):
+                    audio_ms = 0.0
+                    turn += 1
+                    responder = asyncio.create_task(self._respond(ws, session, turn))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            if responder is not None:
+                responder.cancel()
+
+    async def _respond(self, ws, session, turn):
+        """
+        Stream one model turn: audio chunks, a text part, a save_patient_field call, turnComplete.
+        """
+        try:
+            await asyncio.sleep(self.first_response_delay)
+            chunk_ms = self.audio_chunk_ms
+            mime_type = pcm_mime_type(MODEL_SAMPLE_RATE)
+            for offset in range(0, self.response_audio_ms, chunk_ms):
+                pcm = synthetic_pcm(min(chunk_ms, self.response_audio_ms - offset),
+                                    phase=offset * MODEL_SAMPLE_RATE // 1000)
+                await ws.send(jsoncodec.dumps({'serverContent': {'modelTurn': {'parts': [{'inlineData': {
+                    'mimeType': mime_type,
+                    'data': base64.b64encode(pcm).decode('ascii'),
+                }}]}}}))
+                if self.chunk_interval:
+                    await asyncio.sleep(self.chunk_interval)
+            code = f'save_patient_field(field_name="full_name", value="Caller {session}-{turn}")'
+            await ws.send(jsoncodec.dumps({'serverContent': {'modelTurn': {'parts': [
+                {'text': self.response_text},
+                {'executableCode': {'language': 'PYTHON', 'code': code}},
+            ]}}}))
+            await ws.send(jsoncodec.dumps({'serverContent': {'turnComplete': True}}))
+            self.turns += 1
+        except websockets.ConnectionClosed:
+            pass
@@ -1,3 +1,5 @@
+import zlib
+
 from django.db import models
 from django.core.validators import RegexValidator, MinValueValidator, MaxValueValidator
 
@@ -18,9 +20,10 @@ class Appointment(models.Model):
     )
     contact_number = models.CharField(
         max_length=20,
+        db_index=True,
         help_text="Contact phone number"
     )
-    email = models.EmailField(help_text="Email address", blank=True, null=True)
+    email = models.EmailField(help_text="Email address", blank=True, null=True, db_index=True)
     address = models.TextField(help_text="Home address (Street, City, State, ZIP)")
     preferred_language = models.CharField(max_length=100, blank=True, null=True, help_text="Preferred language")
     emergency_contact_name = models.CharField(max_length=255, blank=True, null=True, help_text="Emergency contact name")
@@ -115,6 +118,10 @@ class Appointment(models.Model):
     class Meta:
         ordering = ['-created_at']
         db_table = 'appointment'
+        indexes = [
+            # Keyset pagination of the appointment list
+            models.Index(fields=['-created_at', 'id'], name='appointment_created_id_idx'),
+        ]
         verbose_name = 'Appointment'
         verbose_name_plural = 'Appointments'
 
@@ -137,4 +144,162 @@ class AppointmentAttachment(models.Model):
         verbose_name_plural = 'Appointment Attachments'
 
     def __str__(self):
-        return f"Attachment for {self.appointment_id}: {self.original_name}"
\ No newline at end of file
+        return f"Attachment for {self.appointment_id}: {self.original_name}"
+
+
+class AppointmentDraft(models.Model):
+    """
+    Intake fields saved so far during a voice call, so an interrupted call
+    can be resumed or finished. Promoted to an Appointment on completion.
+    """
+    STATUS_IN_PROGRESS = 'in_progress'
+    STATUS_COMPLETED = 'completed'
+
+    session_id = models.CharField(max_length=64, unique=True, help_text="Voice session that owns the draft")
+    fields = models.JSONField(default=dict, help_text="Intake field values saved so far")
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            (STATUS_IN_PROGRESS, 'In progress'),
+            (STATUS_COMPLETED, 'Completed'),
+        ],
+        default=STATUS_IN_PROGRESS,
+        db_index=True,
+        help_text="Whether the draft has been promoted to an appointment"
+    )
+    appointment = models.OneToOneField(
+        Appointment,
+        related_name='draft',
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        help_text="Appointment created from this draft"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-updated_at']
+        db_table = 'appointment_draft'
+        verbose_name = 'Appointment Draft'
+        verbose_name_plural = 'Appointment Drafts'
+
+    def __str__(self):
+        return f"Draft {self.session_id} ({self.status})"
+
+
+class ConversationTranscript(models.Model):
+    """
+    One saved voice conversation. The messages live in their own append-only
+    table so transcripts never widen the appointment rows.
+    """
+    appointment = models.ForeignKey(
+        Appointment,
+        related_name='transcripts',
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        help_text="Appointment the conversation produced"
+    )
+    title = models.CharField(max_length=255, blank=True)
+    started_at = models.DateTimeField(blank=True, null=True, help_text="When the conversation started")
+    ended_at = models.DateTimeField(blank=True, null=True, help_text="When the conversation ended")
+    message_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        db_table = 'conversation_transcript'
+        verbose_name = 'Conversation Transcript'
+        verbose_name_plural = 'Conversation Transcripts'
+
+    def __str__(self):
+        return f"Transcript {self.pk} ({self.message_count} messages)"
+
+
+class TranscriptMessage(models.Model):
+    """
+    A single transcript message. Rows are only ever inserted; long content
+    is stored zlib-compressed in `content_zlib` instead of `content`.
+    """
+    transcript = models.ForeignKey(ConversationTranscript, related_name='messages', on_delete=models.CASCADE)
+    sequence = models.PositiveIntegerField(help_text="Position of the message in the conversation")
+    role = models.CharField(max_length=20)
+    content = models.TextField(blank=True)
+    content_zlib = models.BinaryField(blank=True, null=True)
+    timestamp = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['transcript', 'sequence']
+        db_table = 'transcript_message'
+        verbose_name = 'Transcript Message'
+        verbose_name_plural = 'Transcript Messages'
+        constraints = [
+            models.UniqueConstraint(fields=['transcript', 'sequence'], name='transcript_message_sequence_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.role} message {self.sequence} of transcript {self.transcript_id}"
+
+    @property
+    def text(self):
+        """Message content, decompressed if it was stored compressed"""
+        if self.content_zlib is not None:
+            return zlib.decompress(self.content_zlib).decode('utf-8')
+        return self.content
+
+
+class CallRecording(models.Model):
+    """
+    Index of the WAV segments archived for one voice session.
+    """
+    session_id = models.CharField(max_length=64, unique=True, help_text="Voice session that was recorded")
+    started_at = models.DateTimeField(auto_now_add=True)
+    ended_at = models.DateTimeField(blank=True, null=True)
+    dropped_bytes = models.PositiveBigIntegerField(
+        default=0, help_text="Audio lost because the writer fell behind the ring buffer"
+    )
+
+    class Meta:
+        ordering = ['-started_at']
+        db_table = 'call_recording'
+        verbose_name = 'Call Recording'
+        verbose_name_plural = 'Call Recordings'
+
+    def __str__(self):
+        return f"Recording of {self.session_id}"
+
+
+class CallRecordingSegment(models.Model):
+    """
+    One WAV file of a recording; inbound (caller) and outbound (model) audio are separate tracks.
+    """
+    TRACK_INBOUND = 'inbound'
+    TRACK_OUTBOUND = 'outbound'
+
+    recording = models.ForeignKey(CallRecording, related_name='segments', on_delete=models.CASCADE)
+    track = models.CharField(
+        max_length=10,
+        choices=[
+            (TRACK_INBOUND, 'Inbound'),
+            (TRACK_OUTBOUND, 'Outbound'),
+        ]
+    )
+    index = models.PositiveIntegerField(help_text="Position of the segment within its track")
+    file = models.FileField(upload_to='recordings/', max_length=255)
+    sample_rate = models.PositiveIntegerField()
+    duration_ms = models.PositiveIntegerField()
+    size_bytes = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['recording', 'track', 'index']
+        db_table = 'call_recording_segment'
+        verbose_name = 'Call Recording Segment'
+        verbose_name_plural = 'Call Recording Segments'
+        constraints = [
+            models.UniqueConstraint(fields=['recording', 'track', 'index'], name='call_recording_segment_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.track} segment {self.index} of {self.recording_id}"
@@ -0,0 +1,56 @@
+"""Keyset (cursor) pagination for the appointment list.
+
+Pages are ordered by (-created_at, id) and each page starts strictly after
+the last row of the previous one. Every page is then an index range scan,
+however deep it is, unlike OFFSET. The cursor handed to clients is an opaque
+URL-safe token that encodes that last (created_at, id) pair.
+"""
+
+import base64
+import binascii
+import datetime
+
+from django.db.models import Q
+
+from voice_flow import jsoncodec
+
+KEYSET_ORDERING = ('-created_at', 'id')
+
+
+def encode_cursor(created_at, pk):
+    """
+    Return an opaque token for the position just after (created_at, pk).
+    """
+    raw = jsoncodec.dumps([created_at.isoformat(), pk]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Return the (created_at, pk) encoded in `cursor`; raises ValueError if it is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, pk = jsoncodec.loads(raw)
+        created_at = datetime.datetime.fromisoformat(created_at)
+    except (binascii.Error, TypeError, ValueError) as e:
+        raise ValueError(f'Invalid cursor: {cursor!r}') from e
+    if not isinstance(pk, int) or created_at.tzinfo is None:
+        raise ValueError(f'Invalid cursor: {cursor!r}')
+    return created_at, pk
+
+
+def keyset_page(queryset, page_size, cursor=None):
+    """
+    Return (rows, next_cursor) for one page of `queryset`; next_cursor is None on the last page.
+    """
+    queryset = queryset.order_by(*KEYSET_ORDERING)
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__gt=pk))
+    # One extra row tells whether another page exists without a COUNT
+    rows = list(queryset[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].pk)
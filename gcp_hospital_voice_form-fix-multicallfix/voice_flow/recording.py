@@ -0,0 +1,294 @@
+"""Optional archival of call audio to segmented WAV files.
+
+The consumer never touches the disk or the database for recording. It
+copies each chunk of caller audio (as sent upstream) and model audio into
+a fixed-size PcmRingBuffer per track, which is a short memcpy under a
+lock. A single RecordingWriter thread per process drains every active
+recording each flush interval. It appends the audio to the current WAV
+segment of each track, and starts a new segment after
+VOICE_RECORDING_SEGMENT_SECONDS. Finished segments are indexed as
+CallRecordingSegment rows under one CallRecording per session.
+
+Memory per call is fixed by the ring size. If the writer falls behind,
+the oldest unwritten audio is overwritten and counted in
+CallRecording.dropped_bytes instead of the buffer growing.
+"""
+
+import logging
+import os
+import threading
+import wave
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from voice_flow.constants import (
+    VOICE_RECORDING_BUFFER_SECONDS,
+    VOICE_RECORDING_DIR,
+    VOICE_RECORDING_FLUSH_INTERVAL_SECONDS,
+    VOICE_RECORDING_SEGMENT_SECONDS,
+)
+from voice_flow.models import CallRecording, CallRecordingSegment
+
+logger = logging.getLogger(__name__)
+
+# Ring buffers are sized for the highest rate either track carries (Gemini output)
+BUFFER_SAMPLE_RATE = 24000
+SAMPLE_WIDTH = 2
+
+
+class PcmRingBuffer:
+    """
+    Fixed-capacity byte ring for PCM16 audio of one sample rate.
+
+    write() is called from the event loop and drain() from the writer
+    thread; when full, the oldest bytes are overwritten and counted.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = max(SAMPLE_WIDTH, capacity - capacity % SAMPLE_WIDTH)
+        self._buffer = bytearray(self.capacity)
+        self._start = 0
+        self._size = 0
+        self._lock = threading.Lock()
+        self.sample_rate = None
+        self.dropped = 0
+
+    def write(self, pcm, sample_rate):
+        """
+        Copy `pcm` in; returns False (and keeps nothing) when the sample rate changed mid-call.
+        """
+        length = len(pcm) - len(pcm) % SAMPLE_WIDTH
+        if not length:
+            return True
+        with self._lock:
+            if self.sample_rate is None:
+                self.sample_rate = sample_rate
+            elif sample_rate != self.sample_rate:
+                self.dropped += length
+                return False
+            if length > self.capacity:
+                self.dropped += length - self.capacity
+                pcm = pcm[length - self.capacity:length]
+                length = self.capacity
+            overflow = self._size + length - self.capacity
+            if overflow > 0:
+                self.dropped += overflow
+                self._start = (self._start + overflow) % self.capacity
+                self._size -= overflow
+            end = (self._start + self._size) % self.capacity
+            first = min(length, self.capacity - end)
+            self._buffer[end:end + first] = pcm[:first]
+            self._buffer[:length - first] = pcm[first:length]
+            self._size += length
+        return True
+
+    def drain(self):
+        """
+        Remove and return everything buffered, oldest first.
+        """
+        with self._lock:
+            first = min(self._size, self.capacity - self._start)
+            data = bytes(self._buffer[self._start:self._start + first]) + bytes(self._buffer[:self._size - first])
+            self._start = 0
+            self._size = 0
+        return data
+
+    def __len__(self):
+        return self._size
+
+
+class _TrackWriter:
+    """
+    Writer-thread state for one track: the open WAV segment and its counters.
+    """
+
+    def __init__(self, track):
+        self.track = track
+        self.index = 0
+        self.wav = None
+        self.name = None
+        self.sample_rate = None
+        self.frames = 0
+
+
+class SessionRecorder:
+    """
+    Ring buffers of one call; the consumer only calls inbound(), outbound() and close().
+    """
+
+    def __init__(self, session_id, buffer_seconds=VOICE_RECORDING_BUFFER_SECONDS):
+        capacity = int(buffer_seconds * BUFFER_SAMPLE_RATE) * SAMPLE_WIDTH
+        self.session_id = session_id
+        self.buffers = {
+            CallRecordingSegment.TRACK_INBOUND: PcmRingBuffer(capacity),
+            CallRecordingSegment.TRACK_OUTBOUND: PcmRingBuffer(capacity),
+        }
+        self.closed = False
+        # Touched by the writer thread only
+        self.recording = None
+        self.tracks = {track: _TrackWriter(track) for track in self.buffers}
+
+    def inbound(self, pcm, sample_rate):
+        self.buffers[CallRecordingSegment.TRACK_INBOUND].write(pcm, sample_rate)
+
+    def outbound(self, pcm, sample_rate):
+        self.buffers[CallRecordingSegment.TRACK_OUTBOUND].write(pcm, sample_rate)
+
+    def close(self):
+        """
+        Mark the call ended; the writer flushes what is left and closes the segments.
+        """
+        self.closed = True
+
+    @property
+    def dropped_bytes(self):
+        return sum(buffer.dropped for buffer in self.buffers.values())
+
+
+class RecordingWriter:
+    """
+    Drains the ring buffers of every active recording into WAV segments.
+
+    run_once() does one pass; start() runs it every `interval` seconds on
+    a daemon thread.
+    """
+
+    def __init__(self, root=None, directory=VOICE_RECORDING_DIR, interval=VOICE_RECORDING_FLUSH_INTERVAL_SECONDS,
+                 segment_seconds=VOICE_RECORDING_SEGMENT_SECONDS):
+        self.root = str(root if root is not None else settings.MEDIA_ROOT)
+        self.directory = directory
+        self.interval = interval
+        self.segment_seconds = segment_seconds
+        self._recorders = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def add(self, recorder):
+        with self._lock:
+            self._recorders.append(recorder)
+        return recorder
+
+    @property
+    def active(self):
+        with self._lock:
+            return len(self._recorders)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='voice-recording-writer', daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Recording writer pass failed")
+            finally:
+                close_old_connections()
+
+    def run_once(self):
+        """
+        Write out all buffered audio; recordings whose call ended are finalized and dropped.
+        """
+        with self._lock:
+            recorders = list(self._recorders)
+        for recorder in recorders:
+            closing = recorder.closed
+            try:
+                for track, buffer in recorder.buffers.items():
+                    pcm = buffer.drain()
+                    if pcm:
+                        self._append(recorder, recorder.tracks[track], pcm, buffer.sample_rate)
+                if closing:
+                    self._finish(recorder)
+            finally:
+                # An ended call is dropped even if finalizing it failed, so it is not retried every pass
+                if closing:
+                    with self._lock:
+                        self._recorders.remove(recorder)
+
+    def _append(self, recorder, state, pcm, sample_rate):
+        segment_frames = int(self.segment_seconds * sample_rate)
+        offset = 0
+        while offset < len(pcm):
+            if state.wav is None:
+                self._open_segment(recorder, state, sample_rate)
+            room = (segment_frames - state.frames) * SAMPLE_WIDTH
+            chunk = pcm[offset:offset + room]
+            state.wav.writeframes(chunk)
+            state.frames += len(chunk) // SAMPLE_WIDTH
+            offset += len(chunk)
+            if state.frames >= segment_frames:
+                self._close_segment(recorder, state)
+
+    def _open_segment(self, recorder, state, sample_rate):
+        if recorder.recording is None:
+            recorder.recording, _ = CallRecording.objects.get_or_create(session_id=recorder.session_id)
+        day = timezone.now().strftime('%Y/%m/%d')
+        state.name = f'{self.directory}/{day}/{recorder.session_id}/{state.track}-{state.index:04d}.wav'
+        path = os.path.join(self.root, state.name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        state.wav = wave.open(path, 'wb')
+        state.wav.setnchannels(1)
+        state.wav.setsampwidth(SAMPLE_WIDTH)
+        state.wav.setframerate(sample_rate)
+        state.sample_rate = sample_rate
+        state.frames = 0
+
+    def _close_segment(self, recorder, state):
+        state.wav.close()
+        CallRecordingSegment.objects.create(
+            recording=recorder.recording,
+            track=state.track,
+            index=state.index,
+            file=state.name,
+            sample_rate=state.sample_rate,
+            duration_ms=state.frames * 1000 // state.sample_rate,
+            size_bytes=os.path.getsize(os.path.join(self.root, state.name)),
+        )
+        state.wav = None
+        state.index += 1
+
+    def _finish(self, recorder):
+        for state in recorder.tracks.values():
+            if state.wav is not None:
+                self._close_segment(recorder, state)
+        if recorder.recording is not None:
+            CallRecording.objects.filter(pk=recorder.recording.pk).update(
+                ended_at=timezone.now(), dropped_bytes=recorder.dropped_bytes
+            )
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_recording_writer():
+    """
+    Return the process-wide recording writer, starting its thread on first use.
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = RecordingWriter(
+                directory=getattr(settings, 'VOICE_RECORDING_DIR', VOICE_RECORDING_DIR),
+                interval=getattr(settings, 'VOICE_RECORDING_FLUSH_INTERVAL_SECONDS',
+                                 VOICE_RECORDING_FLUSH_INTERVAL_SECONDS),
+                segment_seconds=getattr(settings, 'VOICE_RECORDING_SEGMENT_SECONDS', VOICE_RECORDING_SEGMENT_SECONDS),
+            )
+        return _writer.start()
+
+
+def start_recording(session_id):
+    """
+    Begin recording a session; returns its SessionRecorder.
+    """
+    buffer_seconds = getattr(settings, 'VOICE_RECORDING_BUFFER_SECONDS', VOICE_RECORDING_BUFFER_SECONDS)
+    return get_recording_writer().add(SessionRecorder(session_id, buffer_seconds=buffer_seconds))
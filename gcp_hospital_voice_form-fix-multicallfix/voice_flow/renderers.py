@@ -0,0 +1,38 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from voice_flow import jsoncodec
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer backed by voice_flow.jsoncodec (orjson when installed).
+
+    Types the codec cannot serialize natively (Decimal, lazy strings,
+    datetimes, querysets) go through DRF's JSONEncoder so the output
+    matches the stock renderer. Indented output is left to the stock
+    renderer.
+    """
+    _encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = _renderer_backend.dumps_bytes(data, default=self._encoder.default)
+        # Keep output a strict javascript subset, as JSONRenderer does
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+def _get_renderer_backend():
+    if jsoncodec.orjson is not None:
+        # Let DRF's encoder format datetimes so output is unchanged
+        return jsoncodec.OrjsonBackend(passthrough_datetime=True)
+    return jsoncodec.StdlibBackend()
+
+
+_renderer_backend = _get_renderer_backend()
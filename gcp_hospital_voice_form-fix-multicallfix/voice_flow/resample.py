@@ -0,0 +1,83 @@
+"""Streaming polyphase resampler for PCM16 capture audio."""
+
+import functools
+import math
+
+import numpy as np
+
+from voice_flow.constants import GEMINI_RESAMPLER_TAPS_PER_PHASE
+
+
+# Kaiser window shape; ~80 dB stopband attenuation
+KAISER_BETA = 8.0
+# Passband edge as a fraction of the output Nyquist frequency
+ROLLOFF = 0.92
+
+
+@functools.lru_cache(maxsize=16)
+def polyphase_filters(up, down, taps_per_phase):
+    """
+    Return an (up, taps_per_phase) array of windowed-sinc sub-filters.
+
+    Each row is one polyphase branch, reversed so that a dot product with
+    a window of input samples (oldest first) yields one output sample.
+    """
+    length = up * taps_per_phase
+    cutoff = ROLLOFF * 0.5 / max(up, down)  # cycles per upsampled sample
+    n = np.arange(length) - (length - 1) / 2.0
+    prototype = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(length, KAISER_BETA)
+    prototype *= up / prototype.sum()
+    phases = prototype.reshape(taps_per_phase, up).T
+    filters = np.ascontiguousarray(phases[:, ::-1], dtype=np.float32)
+    filters.setflags(write=False)
+    return filters
+
+
+class PolyphaseResampler:
+    """
+    Convert a PCM16 mono stream between sample rates, chunk by chunk.
+
+    The rate ratio is reduced to up/down integers and applied with a
+    windowed-sinc polyphase filter bank. Filter history and the fractional
+    output position carry over between calls, so chunk boundaries are
+    seamless. Every output sample for a chunk is computed in one vectorized
+    step.
+    """
+
+    def __init__(self, input_rate, output_rate, taps_per_phase=GEMINI_RESAMPLER_TAPS_PER_PHASE):
+        self.input_rate = int(input_rate)
+        self.output_rate = int(output_rate)
+        divisor = math.gcd(self.input_rate, self.output_rate)
+        self.up = self.output_rate // divisor
+        self.down = self.input_rate // divisor
+        self.taps = int(taps_per_phase)
+        self.filters = polyphase_filters(self.up, self.down, self.taps)
+        self._history = np.zeros(self.taps - 1, dtype=np.float32)
+        # Position of the next output sample, in upsampled steps from the chunk start
+        self._position = 0
+
+    @property
+    def passthrough(self):
+        return self.up == self.down
+
+    def process(self, pcm):
+        """
+        Resample PCM16 little-endian bytes; returns PCM16 bytes at output_rate.
+        """
+        if self.passthrough:
+            return bytes(pcm)
+        samples = np.frombuffer(pcm, dtype='<i2')
+        if not len(samples):
+            return b''
+        buffer = np.concatenate((self._history, samples.astype(np.float32)))
+        limit = len(samples) * self.up
+        positions = np.arange(self._position, limit, self.down, dtype=np.int64)
+        if len(positions):
+            windows = np.lib.stride_tricks.sliding_window_view(buffer, self.taps)
+            out = np.einsum('nk,nk->n', windows[positions // self.up], self.filters[positions % self.up])
+            self._position = int(positions[-1]) + self.down - limit
+        else:
+            out = np.empty(0, dtype=np.float32)
+            self._position -= limit
+        self._history = buffer[len(buffer) - (self.taps - 1):]
+        return np.clip(np.rint(out), -32768, 32767).astype('<i2').tobytes()
@@ -0,0 +1,128 @@
+"""Full-text search over appointments with SQLite FTS5.
+
+appointment_fts is an external-content FTS5 table over the free-text
+columns of `appointment`. It stores only the index; the text stays in the
+appointment rows. Triggers on `appointment` keep it in sync for every write
+path, including update() and bulk_create, which skip model signals.
+Results are ranked with bm25, and a name match weighs more than one in the
+medical history.
+
+SQLite rebuilds a table for some schema changes, and that drops its
+triggers. `manage.py rebuild_appointment_search` recreates anything that is
+missing and reindexes every row.
+"""
+
+import re
+
+from django.db import NotSupportedError, connection
+
+FTS_TABLE = 'appointment_fts'
+# Indexed columns and their bm25 weights
+FTS_COLUMNS = {
+    'full_name': 10.0,
+    'reason_for_visit': 4.0,
+    'symptoms': 2.0,
+    'medical_history': 1.0,
+}
+
+_columns = ', '.join(FTS_COLUMNS)
+_new_values = ', '.join(f'new.{column}' for column in FTS_COLUMNS)
+_old_values = ', '.join(f'old.{column}' for column in FTS_COLUMNS)
+
+CREATE_STATEMENTS = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        {_columns},
+        content='appointment', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON appointment BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.id, {_new_values});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON appointment BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns}) VALUES ('delete', old.id, {_old_values});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF {_columns} ON appointment BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns}) VALUES ('delete', old.id, {_old_values});
+        INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.id, {_new_values});
+    END
+    """,
+]
+
+DROP_STATEMENTS = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_insert',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_delete',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_update',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def is_supported(using=connection):
+    return using.vendor == 'sqlite'
+
+
+def create_search_index(cursor):
+    """
+    Create the FTS table and its triggers if missing, then index every appointment.
+    """
+    for statement in CREATE_STATEMENTS:
+        cursor.execute(statement)
+    cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def drop_search_index(cursor):
+    for statement in DROP_STATEMENTS:
+        cursor.execute(statement)
+
+
+def rebuild_search_index():
+    """
+    Recreate missing FTS objects and reindex all appointments; returns the number of rows indexed.
+    """
+    if not is_supported():
+        raise NotSupportedError('Appointment search requires SQLite with FTS5')
+    with connection.cursor() as cursor:
+        create_search_index(cursor)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+        cursor.execute('SELECT COUNT(*) FROM appointment')
+        return cursor.fetchone()[0]
+
+
+def match_expression(query):
+    """
+    Turn free text into an FTS5 query: every word must match, the last one as a prefix.
+
+    Words are quoted, so FTS5 operators typed by users are searched as text.
+    """
+    tokens = _TOKEN_RE.findall(query or '')
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search_appointment_ids(query, limit):
+    """
+    Return the ids of the best `limit` appointments matching `query`, best first.
+    """
+    if not is_supported():
+        raise NotSupportedError('Appointment search requires SQLite with FTS5')
+    expression = match_expression(query)
+    if expression is None:
+        return []
+    weights = ', '.join(str(weight) for weight in FTS_COLUMNS.values())
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s',
+            [expression, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
@@ -1,6 +1,9 @@
 import logging
 
+from django.conf import settings
 from rest_framework import serializers
+
+from .constants import APPOINTMENT_SUMMARY_FIELDS
 from .models import Appointment, AppointmentAttachment
 
 logger = logging.getLogger(__name__)
@@ -9,6 +12,9 @@ logger = logging.getLogger(__name__)
 class AppointmentSerializer(serializers.ModelSerializer):
     """
     Serializer for Appointment model with all fields included.
+
+    `fields` limits the output to those names (see select_appointment_fields)
+    and `omit_null` leaves out keys whose value is null.
     """
     attachments = serializers.SerializerMethodField(read_only=True)
     
@@ -16,6 +22,19 @@ class AppointmentSerializer(serializers.ModelSerializer):
         model = Appointment
         fields = '__all__'
         read_only_fields = ('created_at', 'updated_at')
+
+    def __init__(self, *args, fields=None, omit_null=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.omit_null = omit_null
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if self.omit_null:
+            return {key: value for key, value in data.items() if value is not None}
+        return data
     
     def validate_contact_number(self, value):
         """Validate contact number format"""
@@ -42,10 +61,8 @@ class AppointmentSerializer(serializers.ModelSerializer):
         return data
 
     def get_attachments(self, obj):
-        attachments = getattr(obj, 'attachments', None)
-        if attachments is None:
-            attachments = obj.attachments.all()
-        return AppointmentAttachmentSerializer(attachments, many=True, context=self.context).data
+        # Served from the prefetch cache when the queryset used prefetch_related('attachments')
+        return AppointmentAttachmentSerializer(obj.attachments.all(), many=True, context=self.context).data
 
 
 class AppointmentAttachmentSerializer(serializers.ModelSerializer):
@@ -62,4 +79,40 @@ class AppointmentAttachmentSerializer(serializers.ModelSerializer):
             if request:
                 return request.build_absolute_uri(obj.file.url)
             return obj.file.url
-        return None
\ No newline at end of file
+        return None
+
+
+def select_appointment_fields(fields=None, view=None):
+    """
+    Resolve `?fields=a,b` or `?view=summary` to a tuple of AppointmentSerializer field names.
+
+    Returns None when every field is wanted; unknown names raise ValidationError.
+    """
+    if fields:
+        selected = tuple(dict.fromkeys(name.strip() for name in fields.split(',') if name.strip()))
+    elif view == 'summary':
+        selected = tuple(getattr(settings, 'APPOINTMENT_SUMMARY_FIELDS', APPOINTMENT_SUMMARY_FIELDS))
+    elif view in (None, '', 'full'):
+        return None
+    else:
+        raise serializers.ValidationError({'view': f'Unknown view: {view}'})
+    available = set(AppointmentSerializer().fields)
+    unknown = [name for name in selected if name not in available]
+    if unknown or not selected:
+        raise serializers.ValidationError({'fields': f"Unknown fields: {', '.join(unknown) or '(none given)'}"})
+    return selected
+
+
+def appointment_queryset(fields=None):
+    """
+    Appointments loading only the columns `fields` needs, with attachments prefetched when included.
+    """
+    queryset = Appointment.objects.all()
+    if fields is None:
+        return queryset.prefetch_related('attachments')
+    # id and created_at are always loaded: they are the pagination key
+    columns = {'id', 'created_at'} | {name for name in fields if name != 'attachments'}
+    queryset = queryset.only(*columns)
+    if 'attachments' in fields:
+        queryset = queryset.prefetch_related('attachments')
+    return queryset
@@ -0,0 +1,186 @@
+"""Cluster-wide registry of live voice sessions and cross-worker messaging.
+
+Every voice consumer joins a channel-layer group named after its session
+id, so any worker that shares the channel layer can reach the call with
+send_to_session(). The session registry records which worker owns each
+call. Entries expire after a TTL that the owning consumer keeps
+refreshing, so calls held by a crashed worker drop out of the registry on
+their own.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+import weakref
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from voice_flow.constants import VOICE_SESSION_REGISTRY, VOICE_SESSION_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Identifies this process in registry entries
+WORKER_ID = f'{socket.gethostname()}:{os.getpid()}'
+
+SESSION_GROUP_PREFIX = 'voice-session.'
+
+# Actions a session_message event can carry (see GeminiVoiceConsumer.session_message)
+ACTION_SEND = 'send'
+ACTION_CLOSE = 'close'
+
+# One registry per event loop: network clients cannot be shared across loops.
+_registries = weakref.WeakKeyDictionary()
+
+
+def new_session_id():
+    return uuid.uuid4().hex
+
+
+def session_group_name(session_id):
+    """
+    Channel-layer group that only the consumer owning `session_id` joins.
+    """
+    return SESSION_GROUP_PREFIX + session_id
+
+
+def _entry(session_id, channel_name, info):
+    # Registry values are strings in every backend, as a Redis hash returns them
+    entry = {str(key): str(value) for key, value in info.items()}
+    entry.update({
+        'session_id': session_id,
+        'worker': WORKER_ID,
+        'channel_name': channel_name or '',
+        'started_at': f'{time.time():.3f}',
+    })
+    return entry
+
+
+class InMemorySessionRegistry:
+    """
+    Process-local registry; only sessions on this worker are visible.
+    """
+
+    # Shared by every event loop in the process
+    _sessions = {}
+
+    def __init__(self, ttl_seconds=VOICE_SESSION_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+
+    async def register(self, session_id, channel_name, **info):
+        self._sessions[session_id] = (_entry(session_id, channel_name, info), time.monotonic() + self.ttl_seconds)
+
+    async def refresh(self, session_id):
+        item = self._sessions.get(session_id)
+        if item is not None:
+            self._sessions[session_id] = (item[0], time.monotonic() + self.ttl_seconds)
+
+    async def unregister(self, session_id):
+        self._sessions.pop(session_id, None)
+
+    async def get(self, session_id):
+        item = self._sessions.get(session_id)
+        if item is None or item[1] <= time.monotonic():
+            return None
+        return dict(item[0])
+
+    async def list(self):
+        now = time.monotonic()
+        return [dict(entry) for entry, expires_at in list(self._sessions.values()) if expires_at > now]
+
+    async def close(self):
+        pass
+
+
+class RedisSessionRegistry:
+    """
+    Shared registry in any server speaking the Redis protocol.
+
+    Each session is a hash under `<prefix>session:<id>` with a TTL, and a
+    set `<prefix>sessions` indexes the ids; ids whose hash has expired are
+    pruned from the index when listing.
+    """
+
+    def __init__(self, url='redis://localhost:6379/0', prefix='voice:', ttl_seconds=VOICE_SESSION_TTL_SECONDS):
+        import redis.asyncio as redis
+
+        self.client = redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self.ttl_seconds = int(ttl_seconds)
+        self.index_key = f'{prefix}sessions'
+
+    def _key(self, session_id):
+        return f'{self.prefix}session:{session_id}'
+
+    async def register(self, session_id, channel_name, **info):
+        key = self._key(session_id)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hset(key, mapping=_entry(session_id, channel_name, info))
+        pipe.expire(key, self.ttl_seconds)
+        pipe.sadd(self.index_key, session_id)
+        await pipe.execute()
+
+    async def refresh(self, session_id):
+        await self.client.expire(self._key(session_id), self.ttl_seconds)
+
+    async def unregister(self, session_id):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.delete(self._key(session_id))
+        pipe.srem(self.index_key, session_id)
+        await pipe.execute()
+
+    async def get(self, session_id):
+        return await self.client.hgetall(self._key(session_id)) or None
+
+    async def list(self):
+        session_ids = sorted(await self.client.smembers(self.index_key))
+        if not session_ids:
+            return []
+        pipe = self.client.pipeline(transaction=False)
+        for session_id in session_ids:
+            pipe.hgetall(self._key(session_id))
+        entries = await pipe.execute()
+        expired = [session_id for session_id, entry in zip(session_ids, entries) if not entry]
+        if expired:
+            await self.client.srem(self.index_key, *expired)
+        return [entry for entry in entries if entry]
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def get_session_registry():
+    """
+    Return the registry configured by settings.VOICE_SESSION_REGISTRY for the running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    registry = _registries.get(loop)
+    if registry is None:
+        config = getattr(settings, 'VOICE_SESSION_REGISTRY', VOICE_SESSION_REGISTRY)
+        options = {'ttl_seconds': getattr(settings, 'VOICE_SESSION_TTL_SECONDS', VOICE_SESSION_TTL_SECONDS)}
+        options.update(config.get('OPTIONS', {}))
+        registry = import_string(config['BACKEND'])(**options)
+        _registries[loop] = registry
+    return registry
+
+
+async def send_to_session(session_id, action, **fields):
+    """
+    Deliver an action to the consumer owning `session_id`, on whichever worker it runs.
+
+    ACTION_SEND takes a `message` dict that is relayed to the browser as-is;
+    ACTION_CLOSE takes an optional `reason`. Delivery is fire-and-forget:
+    nothing happens if the session has already ended.
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        raise RuntimeError('No channel layer is configured')
+    await channel_layer.group_send(session_group_name(session_id), {
+        'type': 'session.message',
+        'action': action,
+        **fields,
+    })
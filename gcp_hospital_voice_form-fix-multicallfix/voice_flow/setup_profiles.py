@@ -0,0 +1,177 @@
+"""Named, versioned Gemini setup profiles that are built and serialized once per process."""
+
+import functools
+
+from voice_flow import jsoncodec
+from voice_flow.constants import GEMINI_MODEL
+from voice_flow.models import Appointment
+
+
+DEFAULT_INSTRUCTIONS = (
+    'You are a helpful medical intake assistant. Speak English only. '
+    'Use a professional, empathetic tone appropriate for healthcare settings.'
+)
+
+# Fields the assistant may save that are not columns on Appointment
+EXTRA_INTAKE_FIELDS = ('confirmation',)
+
+EXECUTABLE_CODE_REQUIREMENTS = (
+    '\n\nCRITICAL EXECUTABLE CODE REQUIREMENTS:\n'
+    '1. You MUST use executable code to save patient data - this is the PREFERRED method\n'
+    '2. Generate Python code with save_patient_field() function calls\n'
+    '3. Use this EXACT format: save_patient_field(field_name="field_name", value="user_value")\n'
+    '4. Save EXACTLY what the user said - do not regenerate, modify, or change the content\n'
+    '5. NEVER save placeholder text or your interpretations\n'
+    '6. Call save_patient_field() immediately after receiving each piece of information\n'
+    '7. You can save multiple fields in one code block if the user provides multiple pieces of information\n'
+    '8. If a field is already saved, move to the next question immediately\n'
+    '9. Speak naturally and conversationally while maintaining professionalism\n'
+    '10. Use appropriate medical terminology when necessary but explain complex terms\n'
+    '11. Show empathy and understanding for patient concerns\n'
+    '12. Available fields: {fields}\n\n'
+    'IMPORTANT: Executable code is the most reliable way to save patient data. '
+    'Generate clean, simple Python code with save_patient_field() calls!'
+)
+
+# Appended to the instructions when a dropped Gemini session is re-established
+RESUME_INSTRUCTIONS = (
+    '\n\nSESSION RESUMED: The connection was briefly interrupted. The following fields are '
+    'already saved; do not ask for them again. Continue the intake with the next unanswered '
+    'question without greeting the patient again.\n{summary}'
+)
+# Longest saved value repeated in the resume summary
+RESUME_VALUE_MAX_CHARS = 200
+
+# Tools array (required by Gemini Live API even for executable code approach)
+SAVE_PATIENT_FIELD_TOOLS = [{
+    "function_declarations": [{
+        "name": "save_patient_field",
+        "description": "DEPRECATED: This function is for compatibility only. You MUST use executable code instead. Generate Python code with save_patient_field() calls to save patient data.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "field_name": {
+                    "type": "string",
+                    "description": "DEPRECATED: Use executable code instead."
+                },
+                "value": {
+                    "type": "string",
+                    "description": "DEPRECATED: Use executable code instead."
+                }
+            },
+            "required": ["field_name", "value"]
+        }
+    }]
+}]
+
+
+def get_intake_field_names():
+    """
+    Return the field names the assistant may save, in Appointment column order.
+    """
+    names = [
+        field.name for field in Appointment._meta.concrete_fields
+        if field.editable and not field.primary_key
+    ]
+    return names + [name for name in EXTRA_INTAKE_FIELDS if name not in names]
+
+
+class SetupProfile:
+    """
+    A named, versioned Gemini setup configuration (model, voice, instructions, tools).
+    """
+
+    def __init__(self, name, version, model=GEMINI_MODEL, voice='Puck', instructions=DEFAULT_INSTRUCTIONS,
+                 instruction_suffix=EXECUTABLE_CODE_REQUIREMENTS, tools=SAVE_PATIENT_FIELD_TOOLS,
+                 response_modalities=('AUDIO',)):
+        self.name = name
+        self.version = int(version)
+        self.model = model
+        self.voice = voice
+        self.instructions = instructions
+        self.instruction_suffix = instruction_suffix
+        self.tools = tools
+        self.response_modalities = list(response_modalities)
+
+    @property
+    def key(self):
+        return f'{self.name}@{self.version}'
+
+    def build_setup(self, model=None, instructions=None):
+        """
+        Build the setup message dict. Prefer serialized_setup() on hot paths.
+        """
+        suffix = self.instruction_suffix.format(
+            fields=', '.join(f'"{name}"' for name in get_intake_field_names())
+        )
+        return {
+            'setup': {
+                'model': model or self.model,
+                'generation_config': {
+                    'response_modalities': self.response_modalities,
+                    'speech_config': {
+                        'voice_config': {
+                            'prebuilt_voice_config': {
+                                'voice_name': self.voice
+                            }
+                        }
+                    }
+                },
+                'system_instruction': {
+                    'parts': [{'text': (instructions or self.instructions) + suffix}]
+                },
+                'tools': self.tools
+            }
+        }
+
+    def resume_setup(self, saved_fields, model=None, instructions=None):
+        """
+        Return the setup message as a JSON string with a summary of saved fields appended.
+        """
+        if not saved_fields:
+            return self.serialized_setup(model=model, instructions=instructions)
+        summary = '\n'.join(
+            f'- {name}: {str(value)[:RESUME_VALUE_MAX_CHARS]}' for name, value in saved_fields.items()
+        )
+        resumed = (instructions or self.instructions) + RESUME_INSTRUCTIONS.format(summary=summary)
+        return jsoncodec.dumps(self.build_setup(model=model, instructions=resumed))
+
+    def serialized_setup(self, model=None, instructions=None):
+        """
+        Return the setup message as a JSON string, built once per (model, instructions).
+        """
+        return _serialize_setup(self.key, model or self.model, instructions or self.instructions)
+
+
+_profiles = {}
+_latest = {}
+
+
+def register_setup_profile(profile):
+    """
+    Register a profile under 'name@version'; the highest version also answers to 'name'.
+    """
+    _profiles[profile.key] = profile
+    current = _latest.get(profile.name)
+    if current is None or profile.version >= current.version:
+        _latest[profile.name] = profile
+    _serialize_setup.cache_clear()
+    return profile
+
+
+def get_setup_profile(profile_id):
+    """
+    Look up a profile by 'name@version' or by name (latest version). Raises KeyError.
+    """
+    if profile_id in _profiles:
+        return _profiles[profile_id]
+    return _latest[profile_id]
+
+
+@functools.lru_cache(maxsize=32)
+def _serialize_setup(profile_key, model, instructions):
+    profile = _profiles[profile_key]
+    return jsoncodec.dumps(profile.build_setup(model=model, instructions=instructions))
+
+
+PATIENT_INTAKE_PROFILE = register_setup_profile(SetupProfile('patient-intake', 1))
@@ -53,6 +53,11 @@ let connectionStartTime = null;
 let connectionTimeoutId = null;
 let lastProcessedUserResponseTimestamp = 0;
 let recentToolCalls = new Map();
+let useBinaryAudio = false; // upgraded after the server acknowledges setup
+let audioSequence = 0;
+let captureAudioCodec = 'pcm16'; // binary capture codec confirmed by 'setup.ack'
+let imaCaptureEncoder = null;
+let outputAudioFormat = { mime_type: 'audio/pcm;rate=24000', sample_rate: 24000 }; // updated by 'audio.format'
 
 // Web Speech API state
 let speechRecognition = null;
@@ -76,6 +81,11 @@ const MAX_RECONNECT_ATTEMPTS = 100;
 const RECONNECT_BASE_DELAY_MS = 3500;
 const RECOVERY_STORAGE_KEY = 'voice_flow_recovery_session';
 const CONNECTION_TIMEOUT_MS = 10000;
+const COMMIT_TIMEOUT_MS = 10000;
+const AUDIO_FRAME_HEADER_BYTES = 8; // uint32 sequence, uint32 sample rate (little-endian)
+// Compact codecs for binary audio frames: 'pcm16', 'mulaw' (2:1) or 'ima-adpcm' (4:1)
+const REQUESTED_CAPTURE_CODEC = 'ima-adpcm';
+const REQUESTED_PLAYBACK_CODEC = 'mulaw';
 
 // Web Speech API Functions
 const initializeSpeechRecognition = () => {
@@ -977,10 +987,15 @@ const setupWebSocketAudio = async () => {
     captureProcessor.onaudioprocess = (event) => {
         if (!ws || ws.readyState !== WebSocket.OPEN || !isRecording) return;
         const input = event.inputBuffer.getChannelData(0);
-        const pcm16k = downsampleAndEncodePcm16(input, captureAudioContext.sampleRate, 16000);
-        if (!pcm16k) return;
-        const base64 = arrayBufferToBase64(pcm16k.buffer);
-        ws.send(JSON.stringify({ type: 'audio', data: base64, mime_type: 'audio/pcm;rate=16000' }));
+        // Sent at the native capture rate; the server resamples to Gemini's input rate
+        const captureRate = captureAudioContext.sampleRate;
+        const pcm16 = encodePcm16(input);
+        if (useBinaryAudio) {
+            ws.send(encodeAudioFrame(encodeCapturePayload(pcm16), captureRate));
+            return;
+        }
+        const base64 = arrayBufferToBase64(pcm16.buffer);
+        ws.send(JSON.stringify({ type: 'audio', data: base64, mime_type: `audio/pcm;rate=${captureRate}` }));
     };
     captureSource.connect(captureProcessor);
     captureProcessor.connect(captureAudioContext.destination);
@@ -1006,6 +1021,9 @@ const setupWebSocket = async () => {
     const url = `${wsScheme}://${window.location.host}/ws/voice/`;
     return new Promise((resolve, reject) => {
         ws = new WebSocket(url);
+        ws.binaryType = 'arraybuffer';
+        useBinaryAudio = false;
+        audioSequence = 0;
         ws.onopen = async () => {
             try {
                 await setupWebSocketAudio();
@@ -1024,9 +1042,16 @@ const setupWebSocket = async () => {
                 // Send setup message
                 const setupMessage = {
                     type: 'setup',
+                    profile: 'patient-intake',
                     model: 'models/gemini-2.5-flash-preview-native-audio-dialog',
                     voice: 'Aoede',
-                    instructions: instructions
+                    instructions: instructions,
+                    audio_transport: 'binary',
+                    audio_header: true,
+                    sample_rate: captureAudioContext.sampleRate,
+                    audio_output: 'binary',
+                    audio_codec: REQUESTED_CAPTURE_CODEC,
+                    audio_output_codec: REQUESTED_PLAYBACK_CODEC
                 };
                 
                 ws.send(JSON.stringify(setupMessage));
@@ -1043,6 +1068,11 @@ const setupWebSocket = async () => {
         
         // ... existing code ...
         ws.onmessage = async (evt) => {
+            if (evt.data instanceof ArrayBuffer) {
+                // Binary model audio: [uint32 sequence][uint32 sample rate][pcm16...]
+                playPcm16Frame(evt.data);
+                return;
+            }
             try {
                 const message = JSON.parse(evt.data);
                 console.log('=== WEBSOCKET MESSAGE RECEIVED ===');
@@ -1050,12 +1080,12 @@ const setupWebSocket = async () => {
                 console.log('Full message:', message);
                 
                 // Log unexpected message types for debugging
-                if (message.type && !['audio', 'text', 'turn_complete', 'error', 'response.function_call.start', 'response.function_call_arguments.done', 'response.function_call.done', 'system.message'].includes(message.type)) {
+                if (message.type && !['setup.ack', 'queued', 'commit.result', 'audio.format', 'reconnecting', 'reconnected', 'audio', 'text', 'turn_complete', 'error', 'response.function_call.start', 'response.function_call_arguments.done', 'response.function_call.done', 'system.message'].includes(message.type)) {
                     console.log('Unexpected message type:', message.type);
                 }
 
-                // Handle quota exceeded error specially
-                if (message.type === 'error' && message.error_type === 'quota_exceeded') {
+                // Handle quota exceeded and overload errors specially
+                if (message.type === 'error' && ['quota_exceeded', 'overloaded'].includes(message.error_type)) {
                     console.log('API quota exceeded, showing user-friendly message');
                     popupMessage(message.message, 'warning', 10000);
                     isManualDisconnect = true;  // Prevent auto-reconnect
@@ -1063,7 +1093,26 @@ const setupWebSocket = async () => {
                     return;
                 }
 
-                if (message.type === 'audio' && message.data) {
+                if (message.type === 'setup.ack') {
+                    useBinaryAudio = message.audio_transport === 'binary';
+                    captureAudioCodec = message.audio_codec || 'pcm16';
+                    imaCaptureEncoder = captureAudioCodec === 'ima-adpcm' ? createImaAdpcmEncoder() : null;
+                    updateConnectionButton('connected');
+                    console.log('Audio transport:', message.audio_transport, 'output:', message.audio_output);
+                } else if (message.type === 'commit.result') {
+                    settlePendingCommit(null, message);
+                } else if (message.type === 'queued') {
+                    // Waiting for a free assistant; setup.ack follows once admitted
+                    updateConnectionButton('queued');
+                    console.log(`Queued at position ${message.position}, about ${message.estimated_wait_seconds}s`);
+                } else if (message.type === 'audio.format') {
+                    outputAudioFormat = message;
+                } else if (message.type === 'reconnecting') {
+                    // Server is re-establishing its Gemini session; keep capturing, audio is buffered
+                    updateConnectionButton('reconnecting');
+                } else if (message.type === 'reconnected') {
+                    updateConnectionButton('connected');
+                } else if (message.type === 'audio' && message.data) {
                     // Enhanced audio playback for native audio dialog
                     const quality = message.quality || 'standard';
                     const sampleRate = message.sample_rate || 16000;
@@ -1164,6 +1213,8 @@ const setupWebSocket = async () => {
                             lastUpdatedField = lastUpdatedValidatedField;
                             
                             if (isError){
+                                // The server keeps saved fields; make it forget the rejected value
+                                ws.send(JSON.stringify({ type: 'intake.reject', field_name: args.field_name }));
                                 // Send error to AI but don't display to user
                                 const systemMessage = `ERROR: The validation for field "${args.field_name}" failed. You MUST ask the user for new information and retry saving it with a corrected function call. Do not proceed until this is successfully saved.`;
                                 ws.send(JSON.stringify({
@@ -1273,6 +1324,7 @@ const setupWebSocket = async () => {
         
         ws.onclose = (event) => {
             console.log('WebSocket closed:', event.code, event.reason);
+            settlePendingCommit(new Error('WebSocket closed before the commit result'));
             if (!isManualDisconnect) {
                 showThinkingIndicator('reconnecting');
                 handleConnectionFailure();
@@ -1292,46 +1344,144 @@ const arrayBufferToBase64 = (buffer) => {
     return btoa(binary);
 };
 
-const downsampleAndEncodePcm16 = (float32Array, inputRate, targetRate) => {
-    if (inputRate === targetRate) {
-        const pcm = new Int16Array(float32Array.length);
-        for (let i = 0; i < float32Array.length; i++) {
-            // Enhanced audio processing with noise reduction for native audio dialog
-            let s = Math.max(-1, Math.min(1, float32Array[i]));
-            // Apply slight noise gate to improve audio quality
-            if (Math.abs(s) < 0.001) s = 0;
-            pcm[i] = s < 0 ? s * 0x8000 : s * 0x7FFF;
-        }
-        return pcm;
+const encodeAudioFrame = (payload, sampleRate) => {
+    const frame = new ArrayBuffer(AUDIO_FRAME_HEADER_BYTES + payload.byteLength);
+    const header = new DataView(frame, 0, AUDIO_FRAME_HEADER_BYTES);
+    header.setUint32(0, audioSequence++ >>> 0, true);
+    header.setUint32(4, sampleRate, true);
+    new Uint8Array(frame, AUDIO_FRAME_HEADER_BYTES).set(new Uint8Array(payload.buffer, payload.byteOffset, payload.byteLength));
+    return frame;
+};
+
+const encodeCapturePayload = (pcm16) => {
+    if (captureAudioCodec === 'mulaw') return mulawEncode(pcm16);
+    if (captureAudioCodec === 'ima-adpcm' && imaCaptureEncoder) return imaCaptureEncoder.encode(pcm16);
+    return pcm16;
+};
+
+// --- μ-law (G.711) ---
+const MULAW_DECODE_TABLE = (() => {
+    const table = new Int16Array(256);
+    for (let i = 0; i < 256; i++) {
+        const u = ~i & 0xFF;
+        const exponent = (u >> 4) & 0x07;
+        const magnitude = ((((u & 0x0F) << 3) + 0x84) << exponent) - 0x84;
+        table[i] = (u & 0x80) ? -magnitude : magnitude;
     }
-    
-    // Enhanced resampling with better anti-aliasing
-    const ratio = inputRate / targetRate;
-    const newLength = Math.floor(float32Array.length / ratio);
-    const pcm = new Int16Array(newLength);
-    let offsetResult = 0;
-    let offsetBuffer = 0;
-    
-    while (offsetResult < newLength) {
-        const nextOffsetBuffer = Math.round((offsetResult + 1) * ratio);
-        let accum = 0, count = 0;
-        
-        for (let i = offsetBuffer; i < nextOffsetBuffer && i < float32Array.length; i++) {
-            accum += float32Array[i];
-            count++;
+    return table;
+})();
+
+const mulawEncode = (pcm16) => {
+    const out = new Uint8Array(pcm16.length);
+    for (let i = 0; i < pcm16.length; i++) {
+        let s = pcm16[i];
+        const sign = s < 0 ? 0x80 : 0;
+        if (s < 0) s = -s;
+        if (s > 32635) s = 32635;
+        s += 0x84;
+        let exponent = 7;
+        for (let mask = 0x4000; (s & mask) === 0 && exponent > 0; mask >>= 1) exponent--;
+        out[i] = ~(sign | (exponent << 4) | ((s >> (exponent + 3)) & 0x0F)) & 0xFF;
+    }
+    return out;
+};
+
+const mulawDecode = (bytes) => {
+    const pcm = new Int16Array(bytes.length);
+    for (let i = 0; i < bytes.length; i++) pcm[i] = MULAW_DECODE_TABLE[bytes[i]];
+    return pcm;
+};
+
+// --- IMA-ADPCM: 4-byte block header [int16 predictor][uint8 index][uint8 padded], low nibble first ---
+const IMA_STEP_TABLE = [
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45,
+    50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190, 209, 230,
+    253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658, 724, 796, 876, 963,
+    1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272, 2499, 2749, 3024, 3327,
+    3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132, 7845, 8630, 9493, 10442,
+    11487, 12635, 13899, 15289, 16818, 18500, 20350, 22385, 24623, 27086, 29794,
+    32767
+];
+const IMA_INDEX_TABLE = [-1, -1, -1, -1, 2, 4, 6, 8, -1, -1, -1, -1, 2, 4, 6, 8];
+const IMA_BLOCK_HEADER_BYTES = 4;
+
+const createImaAdpcmEncoder = () => {
+    let predictor = 0;
+    let index = 0;
+    return {
+        encode(pcm16) {
+            const out = new Uint8Array(IMA_BLOCK_HEADER_BYTES + ((pcm16.length + 1) >> 1));
+            const header = new DataView(out.buffer);
+            header.setInt16(0, predictor, true);
+            header.setUint8(2, index);
+            header.setUint8(3, pcm16.length & 1);
+            for (let i = 0; i < pcm16.length; i++) {
+                let step = IMA_STEP_TABLE[index];
+                let diff = pcm16[i] - predictor;
+                let code = 0;
+                if (diff < 0) { code = 8; diff = -diff; }
+                let delta = step >> 3;
+                if (diff >= step) { code |= 4; diff -= step; delta += step; }
+                step >>= 1;
+                if (diff >= step) { code |= 2; diff -= step; delta += step; }
+                step >>= 1;
+                if (diff >= step) { code |= 1; delta += step; }
+                predictor += (code & 8) ? -delta : delta;
+                predictor = Math.max(-32768, Math.min(32767, predictor));
+                index = Math.max(0, Math.min(88, index + IMA_INDEX_TABLE[code]));
+                out[IMA_BLOCK_HEADER_BYTES + (i >> 1)] |= (i & 1) ? code << 4 : code;
+            }
+            return out;
         }
-        
-        const sample = count > 0 ? accum / count : 0;
-        const s = Math.max(-1, Math.min(1, sample));
-        // Apply noise gate
-        const finalSample = Math.abs(s) < 0.001 ? 0 : s;
-        pcm[offsetResult] = finalSample < 0 ? finalSample * 0x8000 : finalSample * 0x7FFF;
-        offsetResult++;
-        offsetBuffer = nextOffsetBuffer;
+    };
+};
+
+const imaAdpcmDecode = (bytes) => {
+    if (bytes.length < IMA_BLOCK_HEADER_BYTES) return new Int16Array(0);
+    const header = new DataView(bytes.buffer, bytes.byteOffset, IMA_BLOCK_HEADER_BYTES);
+    let predictor = header.getInt16(0, true);
+    let index = Math.min(88, header.getUint8(2));
+    const count = (bytes.length - IMA_BLOCK_HEADER_BYTES) * 2 - (header.getUint8(3) ? 1 : 0);
+    const pcm = new Int16Array(Math.max(0, count));
+    for (let i = 0; i < pcm.length; i++) {
+        const byte = bytes[IMA_BLOCK_HEADER_BYTES + (i >> 1)];
+        const code = (i & 1) ? byte >> 4 : byte & 0x0F;
+        const step = IMA_STEP_TABLE[index];
+        let delta = step >> 3;
+        if (code & 4) delta += step;
+        if (code & 2) delta += step >> 1;
+        if (code & 1) delta += step >> 2;
+        predictor += (code & 8) ? -delta : delta;
+        predictor = Math.max(-32768, Math.min(32767, predictor));
+        index = Math.max(0, Math.min(88, index + IMA_INDEX_TABLE[code]));
+        pcm[i] = predictor;
+    }
+    return pcm;
+};
+
+const encodePcm16 = (float32Array) => {
+    const pcm = new Int16Array(float32Array.length);
+    for (let i = 0; i < float32Array.length; i++) {
+        const s = Math.max(-1, Math.min(1, float32Array[i]));
+        pcm[i] = s < 0 ? s * 0x8000 : s * 0x7FFF;
     }
     return pcm;
 };
 
+const playPcm16Frame = (frame) => {
+    if (frame.byteLength <= AUDIO_FRAME_HEADER_BYTES) return;
+    const header = new DataView(frame, 0, AUDIO_FRAME_HEADER_BYTES);
+    const sampleRate = header.getUint32(4, true) || outputAudioFormat.sample_rate;
+    const payload = new Uint8Array(frame, AUDIO_FRAME_HEADER_BYTES);
+    if (outputAudioFormat.codec === 'mulaw') {
+        playPcm16Samples(mulawDecode(payload), sampleRate);
+    } else if (outputAudioFormat.codec === 'ima-adpcm') {
+        playPcm16Samples(imaAdpcmDecode(payload), sampleRate);
+    } else {
+        playPcm16Samples(new Int16Array(frame, AUDIO_FRAME_HEADER_BYTES, payload.length >> 1), sampleRate);
+    }
+};
+
 const playPcm16Chunk = (base64Data, mimeType) => {
     try {
         const rateMatch = /rate=(\d+)/.exec(mimeType || '');
@@ -1340,8 +1490,14 @@ const playPcm16Chunk = (base64Data, mimeType) => {
         const buf = new ArrayBuffer(raw.length);
         const view = new Uint8Array(buf);
         for (let i = 0; i < raw.length; i++) view[i] = raw.charCodeAt(i);
-        
-        const pcm16 = new Int16Array(buf);
+        playPcm16Samples(new Int16Array(buf), sampleRate);
+    } catch (e) {
+        console.error('Failed to decode PCM chunk', e);
+    }
+};
+
+const playPcm16Samples = (pcm16, sampleRate) => {
+    try {
         const float32 = new Float32Array(pcm16.length);
         
         // Enhanced audio conversion with dynamic range compression for better quality
@@ -1669,8 +1825,8 @@ const handleConfirmationFunctionCall = () => {
         onUploadAttachment: async (appointmentId, file) => {
             return await uploadInsuranceAttachment(appointmentId, file);
         },
-        onSaveConversation: async () => {
-            return await saveConversationToDatabase();
+        onSaveConversation: async (appointmentId) => {
+            return await saveConversationToDatabase(appointmentId);
         },
         onRedirectToAppointment: (appointmentId) => {
             redirectToAppointment(appointmentId);
@@ -2141,8 +2297,35 @@ const prevalidateData = () => {
     });
 };
 
+let pendingCommit = null; // { resolve, reject, timer } settled by the consumer's 'commit.result'
+
+const settlePendingCommit = (error, result) => {
+    if (!pendingCommit) return;
+    const { resolve, reject, timer } = pendingCommit;
+    pendingCommit = null;
+    clearTimeout(timer);
+    if (error) reject(error);
+    else resolve(result);
+};
+
+const commitIntake = (fields) => new Promise((resolve, reject) => {
+    settlePendingCommit(new Error('Superseded by a newer commit'));
+    const timer = setTimeout(() => settlePendingCommit(new Error('Timed out waiting for the commit result')), COMMIT_TIMEOUT_MS);
+    pendingCommit = { resolve, reject, timer };
+    ws.send(JSON.stringify({ type: 'commit', fields }));
+});
+
 const savePatientToDatabase = async () => {
     prevalidateData();
+    // The consumer already holds every saved field; commit there instead of POSTing them back
+    if (ws && ws.readyState === WebSocket.OPEN) {
+        try {
+            return await commitIntake({ ...userData });
+        } catch (error) {
+            // No result over the socket; fall back to the REST endpoint below
+            console.warn('Intake commit failed, saving over HTTP:', error.message);
+        }
+    }
     try {
         const transcriptData = { ...userData };
         const response = await fetch('/api/appointments/', {
@@ -2164,10 +2347,11 @@ const uploadInsuranceAttachment = async (appointmentId, file) => {
     return resp.json();
 };
 
-const saveConversationToDatabase = async () => {
+const saveConversationToDatabase = async (appointmentId = null) => {
     try {
         const conversationData = {
             action: 'save_conversation_to_database',
+            appointment_id: appointmentId,
             title: `Patient Intake Conversation - ${conversationStartTime}`,
             messages: conversationMessages,
             conversation_start_time: conversationStartTime,
@@ -58,7 +58,8 @@ export const updateConnectionButton = (status = 'not-connected') => {
         failed: { text: 'Connection Failed', className: 'status-indicator status-danger', disabled: false },
         connecting: { text: 'Connecting...', className: 'status-indicator status-warning', disabled: true },
         'not-connected': { text: 'Not Connected', className: 'status-indicator status-neutral', disabled: false },
-        reconnecting: { text: 'Reconnecting...', className: 'status-indicator status-warning', disabled: true }
+        reconnecting: { text: 'Reconnecting...', className: 'status-indicator status-warning', disabled: true },
+        queued: { text: 'Waiting in line...', className: 'status-indicator status-warning', disabled: true }
     };
     const config = buttonConfig[status] || buttonConfig['not-connected'];
     connectionBtn.textContent = config.text;
@@ -1014,7 +1015,7 @@ export const openReviewModal = (userData, callbacks) => {
                     return;
                 }
             }
-            await callbacks.onSaveConversation();
+            await callbacks.onSaveConversation(appointmentId);
             // showSuccessPopup('Patient details saved');
             callbacks.onRedirectToAppointment(appointmentId);
         } else {
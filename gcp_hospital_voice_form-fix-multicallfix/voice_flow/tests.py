@@ -1,11 +1,64 @@
+import asyncio
+import base64
+import csv
 import json
-from datetime import date, datetime
-from django.test import TestCase
+import os
+import tempfile
+import wave
+from io import StringIO
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest.mock import AsyncMock, patch
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status, serializers
-from .models import Appointment
+from websockets.exceptions import ConnectionClosedError
+from websockets.frames import Close
+from . import jsoncodec, metrics, sessions
+from .log import BackgroundQueueHandler, SamplingFilter, StructuredFormatter, redact
+from .admission import (
+    AdmissionController,
+    AdmissionRejected,
+    CircuitBreaker,
+    RedisAdmissionStore,
+    TokenBucket,
+    get_admission_controller,
+    scaled_limit,
+)
+from .audio import AUDIO_FRAME_HEADER, parse_audio_frame
+from .audio_codecs import ImaAdpcmEncoder, get_decoder, ima_adpcm_decode, mulaw_decode, mulaw_encode
+from .drafts import DraftWriter, save_drafts
+from .intake import IntakeState
+from .loadtest import percentile, run_worker, summarize
+from .mock_gemini import MockGeminiLiveServer, synthetic_pcm
+from .models import Appointment, AppointmentAttachment, AppointmentDraft, CallRecording, ConversationTranscript
+from .parsers import FastJSONParser
+from .recording import PcmRingBuffer, RecordingWriter, SessionRecorder
+from .renderers import FastJSONRenderer
 from .serializers import AppointmentSerializer
+from .resample import PolyphaseResampler
+from .setup_profiles import SetupProfile, get_intake_field_names, get_setup_profile, register_setup_profile
+from .gemini_pool import GeminiConnectionPool
+from .gemini_protocol import (
+    MESSAGE_ERROR,
+    MESSAGE_SERVER_CONTENT,
+    PART_AUDIO,
+    PART_EXECUTABLE_CODE,
+    PART_OTHER,
+    PART_TEXT,
+    classify_message,
+    classify_part,
+    is_quota_error,
+)
+from .upstream import ReconnectBuffer, UpstreamAudioSender
+from .vad import VoiceActivityDetector
+from .ws import GeminiVoiceConsumer
 
 
 class AppointmentAPITestCase(APITestCase):
@@ -695,3 +748,2148 @@ class AppointmentAPITestCase(APITestCase):
         # Should fail due to regex validation
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('contact_number', response.data['errors'])
+
+
+class FakeGeminiSocket:
+    """
+    In-process stand-in for the upstream Gemini websocket used by consumer tests
+    """
+
+    def __init__(self):
+        self.sent = []
+        self.incoming = asyncio.Queue()
+        self.closed = False
+
+    async def send(self, data):
+        self.sent.append(data)
+
+    async def close(self):
+        self.closed = True
+        await self.incoming.put(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        message = await self.incoming.get()
+        if message is None:
+            raise StopAsyncIteration
+        if isinstance(message, Exception):
+            raise message
+        return message
+
+
+@override_settings(GEMINI_API_KEY='test-key', GEMINI_POOL_SIZE=0)
+class GeminiVoiceConsumerAudioTestCase(SimpleTestCase):
+    """
+    Test cases for the browser -> Gemini audio ingest paths
+    """
+
+    async def _connect(self, setup):
+        self.upstream = FakeGeminiSocket()
+        self.connect_patch = patch('voice_flow.gemini_pool.websockets.connect', AsyncMock(return_value=self.upstream))
+        self.connect_patch.start()
+        self.addCleanup(self.connect_patch.stop)
+        communicator = WebsocketCommunicator(GeminiVoiceConsumer.as_asgi(), '/ws/voice/')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        await communicator.send_json_to({'type': 'setup', **setup})
+        ack = await communicator.receive_json_from()
+        self.assertEqual(ack['type'], 'setup.ack')
+        return communicator, ack
+
+    def test_parse_audio_frame_with_header(self):
+        """
+        Test header parsing on binary audio frames
+        """
+        pcm = b'\x01\x00\x02\x00'
+        sequence, sample_rate, payload = parse_audio_frame(AUDIO_FRAME_HEADER.pack(7, 16000) + pcm, True)
+        self.assertEqual((sequence, sample_rate, bytes(payload)), (7, 16000, pcm))
+
+        sequence, sample_rate, payload = parse_audio_frame(pcm, False)
+        self.assertEqual((sequence, sample_rate, bytes(payload)), (None, None, pcm))
+
+        with self.assertRaises(ValueError):
+            parse_audio_frame(b'\x00\x01', True)
+        with self.assertRaises(ValueError):
+            parse_audio_frame(AUDIO_FRAME_HEADER.pack(1, 16000) + b'\x00', True)
+
+    async def test_binary_audio_forwarded_as_realtime_input(self):
+        """
+        Test that binary PCM frames reach Gemini as realtimeInput chunks
+        """
+        communicator, ack = await self._connect({'audio_transport': 'binary', 'audio_header': True})
+        self.assertEqual(ack['audio_transport'], 'binary')
+
+        pcm = b'\x10\x00' * 160
+        await communicator.send_to(bytes_data=AUDIO_FRAME_HEADER.pack(1, 16000) + pcm)
+        # A replayed sequence number is dropped
+        await communicator.send_to(bytes_data=AUDIO_FRAME_HEADER.pack(1, 16000) + pcm)
+        await communicator.send_to(text_data=json.dumps({'type': 'turn_complete'}))
+        await communicator.disconnect()
+
+        audio_messages = [json.loads(m) for m in self.upstream.sent if 'mediaChunks' in m]
+        self.assertEqual(len(audio_messages), 1)
+        chunk = audio_messages[0]['realtimeInput']['mediaChunks'][0]
+        self.assertEqual(base64.b64decode(chunk['data']), pcm)
+        self.assertEqual(chunk['mimeType'], 'audio/pcm;rate=16000;channels=1')
+
+    async def test_binary_audio_ignored_without_upgrade(self):
+        """
+        Test that binary frames are ignored until the client opts in
+        """
+        communicator, ack = await self._connect({})
+        self.assertEqual(ack['audio_transport'], 'json')
+
+        await communicator.send_to(bytes_data=b'\x10\x00' * 160)
+        await communicator.send_to(text_data=json.dumps({'type': 'turn_complete'}))
+        await communicator.disconnect()
+
+        self.assertFalse(any('mediaChunks' in m for m in self.upstream.sent))
+
+    async def test_native_rate_capture_resampled_to_gemini_rate(self):
+        """
+        Test that 48 kHz capture declared in setup reaches Gemini at 16 kHz
+        """
+        communicator, ack = await self._connect({'audio_transport': 'binary', 'audio_header': False, 'sample_rate': 48000})
+        self.assertEqual((ack['sample_rate'], ack['upstream_sample_rate']), (48000, 16000))
+
+        await communicator.send_to(bytes_data=make_tone(ms=120, sample_rate=48000))
+        await communicator.disconnect()
+
+        chunks = [json.loads(m)['realtimeInput']['mediaChunks'][0] for m in self.upstream.sent if 'mediaChunks' in m]
+        self.assertEqual({chunk['mimeType'] for chunk in chunks}, {'audio/pcm;rate=16000;channels=1'})
+        self.assertEqual(sum(len(base64.b64decode(chunk['data'])) for chunk in chunks), 2 * 16 * 120)
+
+    async def test_odd_length_json_chunk_dropped(self):
+        """
+        Test that a JSON audio chunk that is not whole PCM16 samples is dropped, at any rate
+        """
+        communicator, ack = await self._connect({})
+        pcm = b'\x10\x00' * 480
+        for data, rate in ((pcm + b'\x01', 48000), (pcm[:-1], 16000), (pcm, 16000)):
+            await communicator.send_json_to({'type': 'audio', 'data': base64.b64encode(data).decode(),
+                                             'mime_type': f'audio/pcm;rate={rate}'})
+        await communicator.send_to(text_data=json.dumps({'type': 'turn_complete'}))
+        await communicator.disconnect()
+
+        chunks = [json.loads(m)['realtimeInput']['mediaChunks'][0] for m in self.upstream.sent if 'mediaChunks' in m]
+        self.assertEqual([base64.b64decode(chunk['data']) for chunk in chunks], [pcm])
+
+    async def test_unsupported_sample_rate_dropped_with_error(self):
+        """
+        Test that frames declaring a rate outside the accepted set are dropped and reported once
+        """
+        communicator, ack = await self._connect({'audio_transport': 'binary', 'audio_header': True})
+
+        pcm = b'\x10\x00' * 160
+        await communicator.send_to(bytes_data=AUDIO_FRAME_HEADER.pack(1, 12345) + pcm)
+        error = await communicator.receive_json_from()
+        self.assertEqual(error, {'type': 'error', 'message': 'Unsupported audio sample rate: 12345'})
+        await communicator.send_to(bytes_data=AUDIO_FRAME_HEADER.pack(2, 12345) + pcm)
+        self.assertTrue(await communicator.receive_nothing(0.05))
+        await communicator.send_to(bytes_data=AUDIO_FRAME_HEADER.pack(3, 16000) + pcm)
+        await communicator.send_to(text_data=json.dumps({'type': 'turn_complete'}))
+        await communicator.disconnect()
+
+        chunks = [json.loads(m)['realtimeInput']['mediaChunks'][0] for m in self.upstream.sent if 'mediaChunks' in m]
+        self.assertEqual([base64.b64decode(chunk['data']) for chunk in chunks], [pcm])
+
+    @override_settings(GEMINI_VAD_END_OF_TURN_MS=100)
+    async def test_vad_drops_silence_and_completes_turn(self):
+        """
+        Test that with VAD on, silence is not forwarded and trailing silence sends inputComplete
+        """
+        communicator, ack = await self._connect({'audio_transport': 'binary', 'audio_header': False, 'vad': True})
+        self.assertTrue(ack['vad'])
+
+        await communicator.send_to(bytes_data=bytes(6400))
+        self.assertTrue(await communicator.receive_nothing(0.05))
+        self.assertFalse(any('mediaChunks' in m for m in self.upstream.sent))
+
+        await communicator.send_to(bytes_data=make_tone(ms=200))
+        await communicator.send_to(bytes_data=bytes(16000))
+        await communicator.disconnect()
+
+        sent = [json.loads(m) for m in self.upstream.sent[1:]]
+        audio = b''.join(base64.b64decode(m['realtimeInput']['mediaChunks'][0]['data'])
+                         for m in sent if 'mediaChunks' in m['realtimeInput'])
+        # 200 ms pre-roll + 200 ms tone + 300 ms hangover at 16 kHz
+        self.assertEqual(len(audio), 32 * (200 + 200 + 300))
+        self.assertEqual(sent[-1], {'realtimeInput': {'inputComplete': True}})
+
+
+def make_tone(ms, sample_rate=16000, frequency=220.0, amplitude=0.3):
+    """
+    PCM16 sine tone used as a stand-in for speech
+    """
+    import numpy as np
+
+    t = np.arange(sample_rate * ms // 1000) / sample_rate
+    return (np.sin(2 * np.pi * frequency * t) * amplitude * 32767).astype('<i2').tobytes()
+
+
+class VoiceActivityDetectorTestCase(SimpleTestCase):
+    """
+    Test cases for the NumPy energy / zero-crossing VAD
+    """
+
+    def test_speech_keeps_preroll_and_hangover(self):
+        """
+        Test that the gate opens on speech with pre-roll and closes after the hangover
+        """
+        vad = VoiceActivityDetector(16000, frame_ms=20, preroll_ms=40, hangover_ms=60, end_of_turn_ms=200)
+        silence = bytes(640) * 10
+        self.assertEqual(vad.process(silence).audio, b'')
+
+        result = vad.process(make_tone(ms=100) + bytes(640) * 5)
+        self.assertEqual(len(result.audio), 640 * (2 + 5 + 3))
+        self.assertFalse(result.end_of_turn)
+
+        result = vad.process(bytes(640) * 10)
+        self.assertEqual(result.audio, b'')
+        self.assertTrue(result.end_of_turn)
+        # End of turn is reported once per turn
+        self.assertFalse(vad.process(bytes(640) * 20).end_of_turn)
+
+    def test_partial_frames_are_buffered(self):
+        """
+        Test that bytes short of a frame are carried into the next call
+        """
+        vad = VoiceActivityDetector(16000, frame_ms=20, preroll_ms=0, hangover_ms=0)
+        tone = make_tone(ms=40)
+        self.assertEqual(vad.process(tone[:500]).audio, b'')
+        self.assertEqual(vad.process(tone[500:]).audio, tone)
+
+    def test_odd_chunk_does_not_shift_later_samples(self):
+        """
+        Test that a stray odd byte is dropped rather than misaligning the audio that follows
+        """
+        vad = VoiceActivityDetector(16000, frame_ms=20, preroll_ms=0, hangover_ms=0)
+        tone = make_tone(ms=40)
+        self.assertEqual(vad.process(bytes(641)).audio, b'')
+        result = vad.process(tone)
+        self.assertTrue(result.speech)
+        self.assertEqual(result.audio, tone)
+
+    def test_quiet_hiss_is_not_speech(self):
+        """
+        Test that low-level broadband noise with a high zero-crossing rate stays gated
+        """
+        import numpy as np
+
+        rng = np.random.default_rng(0)
+        hiss = (rng.standard_normal(16000) * 300).astype('<i2').tobytes()
+        vad = VoiceActivityDetector(16000, threshold_dbfs=-45.0, silence_keepalive_ms=0)
+        self.assertEqual(vad.process(hiss).audio, b'')
+
+    def test_keepalive_thins_silence(self):
+        """
+        Test that one silent frame per keepalive interval is still forwarded
+        """
+        vad = VoiceActivityDetector(16000, frame_ms=20, silence_keepalive_ms=200)
+        self.assertEqual(len(vad.process(bytes(640) * 50).audio), 640 * 5)
+
+
+class UpstreamAudioSenderTestCase(SimpleTestCase):
+    """
+    Test cases for upstream audio coalescing and queue policies
+    """
+
+    MIME = 'audio/pcm;rate=16000;channels=1'
+
+    def _chunk(self, value, ms=40):
+        return bytes([value, 0]) * (16 * ms)
+
+    async def test_adjacent_chunks_merged_into_frames(self):
+        """
+        Test that small chunks are merged up to the configured frame duration
+        """
+        sent = []
+
+        async def send(payload):
+            sent.append(json.loads(payload))
+
+        sender = UpstreamAudioSender(send, frame_ms=100, max_queue=16)
+        for value in (1, 2, 3):
+            await sender.enqueue_audio(self._chunk(value), self.MIME, 16000)
+        await sender.enqueue_message(json.dumps({'realtimeInput': {'inputComplete': True}}))
+        await sender.close()
+
+        self.assertEqual(len(sent), 2)
+        frame = base64.b64decode(sent[0]['realtimeInput']['mediaChunks'][0]['data'])
+        self.assertEqual(frame, self._chunk(1) + self._chunk(2) + self._chunk(3))
+        self.assertEqual(sent[1], {'realtimeInput': {'inputComplete': True}})
+
+    async def test_partial_frame_flushed_after_frame_duration(self):
+        """
+        Test that a lone chunk is not held longer than one frame duration
+        """
+        sent = []
+
+        async def send(payload):
+            sent.append(payload)
+
+        sender = UpstreamAudioSender(send, frame_ms=20, max_queue=16)
+        await sender.enqueue_audio(self._chunk(1, ms=10), self.MIME, 16000)
+        await asyncio.sleep(0.1)
+        self.assertEqual(len(sent), 1)
+        await sender.close()
+
+    async def test_drop_policies_when_queue_full(self):
+        """
+        Test drop_oldest and drop_newest when the sender cannot keep up
+        """
+        release = asyncio.Event()
+        sent = []
+
+        async def slow_send(payload):
+            await release.wait()
+            sent.append(json.loads(payload))
+
+        for policy, expected in (('drop_oldest', [1, 4, 5]), ('drop_newest', [1, 2, 3])):
+            release.clear()
+            sent.clear()
+            sender = UpstreamAudioSender(slow_send, frame_ms=40, max_queue=2, policy=policy)
+            await sender.enqueue_audio(self._chunk(1), self.MIME, 16000)
+            await asyncio.sleep(0)  # sender picks up chunk 1 and blocks on send
+            for value in (2, 3, 4, 5):
+                await sender.enqueue_audio(self._chunk(value), self.MIME, 16000)
+            self.assertEqual(sender.dropped_chunks, 2)
+            release.set()
+            await sender.close()
+            first_bytes = [base64.b64decode(m['realtimeInput']['mediaChunks'][0]['data'])[0] for m in sent]
+            self.assertEqual(first_bytes, expected, policy)
+
+
+class GeminiConnectionPoolTestCase(SimpleTestCase):
+    """
+    Test cases for the warm upstream connection pool
+    """
+
+    async def test_acquire_reuses_refilled_connections(self):
+        """
+        Test that the pool refills in the background and hands out warm sockets
+        """
+        opened = []
+
+        async def connect(api_key):
+            socket = FakeGeminiSocket()
+            opened.append(socket)
+            return socket
+
+        pool = GeminiConnectionPool(size=2, max_idle_seconds=30, check_interval=60, connect=connect)
+        first = await pool.acquire('models/test', 'key')
+        self.assertIs(first, opened[0])
+        await asyncio.sleep(0)
+        self.assertEqual(pool.idle_count('models/test'), 2)
+
+        second = await pool.acquire('models/test', 'key')
+        self.assertIs(second, opened[1])
+        await pool.close()
+        self.assertTrue(opened[2].closed)
+
+    async def test_stale_connections_discarded(self):
+        """
+        Test that closed or over-age idle sockets are never handed out
+        """
+        opened = []
+
+        async def connect(api_key):
+            socket = FakeGeminiSocket()
+            opened.append(socket)
+            return socket
+
+        pool = GeminiConnectionPool(size=1, max_idle_seconds=30, check_interval=60, connect=connect)
+        await pool.acquire('models/test', 'key')
+        await asyncio.sleep(0)
+        opened[1].closed = True
+
+        fresh = await pool.acquire('models/test', 'key')
+        self.assertIs(fresh, opened[2])
+        await pool.close()
+
+    @override_settings(GEMINI_API_KEY='test-key', GEMINI_POOL_SIZE=0, GEMINI_SPECULATIVE_CONNECT=True)
+    async def test_speculative_connect_before_setup(self):
+        """
+        Test that the consumer can open the upstream socket before setup arrives
+        """
+        upstream = FakeGeminiSocket()
+        with patch('voice_flow.gemini_pool.websockets.connect', AsyncMock(return_value=upstream)) as connect:
+            communicator = WebsocketCommunicator(GeminiVoiceConsumer.as_asgi(), '/ws/voice/')
+            await communicator.connect()
+            await asyncio.sleep(0.05)
+            self.assertEqual(connect.await_count, 1)
+
+            await communicator.send_json_to({'type': 'setup'})
+            ack = await communicator.receive_json_from()
+            self.assertEqual(ack['type'], 'setup.ack')
+            self.assertEqual(connect.await_count, 1)
+            self.assertIn('setup', json.loads(upstream.sent[0]))
+            await communicator.disconnect()
+
+
+class SetupProfileTestCase(SimpleTestCase):
+    """
+    Test cases for setup profiles and cached setup payloads
+    """
+
+    def test_field_list_derived_from_appointment_model(self):
+        """
+        Test that the available fields follow the Appointment model
+        """
+        fields = get_intake_field_names()
+        self.assertEqual(fields[:3], ['full_name', 'dob', 'gender'])
+        self.assertEqual(fields[-1], 'confirmation')
+        self.assertNotIn('id', fields)
+        self.assertNotIn('created_at', fields)
+
+    def test_serialized_setup_is_cached(self):
+        """
+        Test that identical setups reuse one serialized payload
+        """
+        profile = get_setup_profile('patient-intake')
+        first = profile.serialized_setup(instructions='Be brief.')
+        self.assertIs(first, profile.serialized_setup(instructions='Be brief.'))
+
+        setup = json.loads(first)['setup']
+        self.assertEqual(setup['model'], profile.model)
+        self.assertEqual(setup['generation_config']['speech_config']['voice_config']['prebuilt_voice_config']['voice_name'], 'Puck')
+        text = setup['system_instruction']['parts'][0]['text']
+        self.assertTrue(text.startswith('Be brief.'))
+        self.assertIn('"appointment_availability", "confirmation"', text)
+
+    def test_profiles_selected_by_name_or_version(self):
+        """
+        Test lookups by bare name (latest version) and by name@version
+        """
+        register_setup_profile(SetupProfile('test-profile', 1, voice='Puck'))
+        register_setup_profile(SetupProfile('test-profile', 2, voice='Aoede'))
+        self.assertEqual(get_setup_profile('test-profile').voice, 'Aoede')
+        self.assertEqual(get_setup_profile('test-profile@1').voice, 'Puck')
+        with self.assertRaises(KeyError):
+            get_setup_profile('missing-profile')
+
+    @override_settings(GEMINI_API_KEY='test-key', GEMINI_POOL_SIZE=0)
+    async def test_consumer_sends_profile_setup(self):
+        """
+        Test that the consumer sends the selected profile's cached payload
+        """
+        upstream = FakeGeminiSocket()
+        with patch('voice_flow.gemini_pool.websockets.connect', AsyncMock(return_value=upstream)):
+            communicator = WebsocketCommunicator(GeminiVoiceConsumer.as_asgi(), '/ws/voice/')
+            await communicator.connect()
+            await communicator.send_json_to({'type': 'setup', 'profile': 'patient-intake@1'})
+            ack = await communicator.receive_json_from()
+            self.assertEqual(ack['profile'], 'patient-intake@1')
+            self.assertIs(upstream.sent[0], get_setup_profile('patient-intake').serialized_setup())
+
+            await communicator.send_json_to({'type': 'setup', 'profile': 'no-such-profile'})
+            error = await communicator.receive_json_from()
+            self.assertEqual(error['type'], 'error')
+            await communicator.disconnect()
+
+
+class GeminiMessageClassifierTestCase(SimpleTestCase):
+    """
+    Test cases for classifying upstream Gemini messages
+    """
+
+    def test_classify_message_by_top_level_key(self):
+        """
+        Test camelCase and snake_case spellings map to the same kind
+        """
+        self.assertEqual(classify_message({'serverContent': {'turnComplete': True}})[0], MESSAGE_SERVER_CONTENT)
+        self.assertEqual(classify_message({'server_content': {}})[0], MESSAGE_SERVER_CONTENT)
+        kind, body = classify_message({'error': {'code': 429, 'status': 'RESOURCE_EXHAUSTED'}})
+        self.assertEqual(kind, MESSAGE_ERROR)
+        self.assertTrue(is_quota_error(body))
+
+    def test_classify_part(self):
+        """
+        Test part classification, including non-audio inline data
+        """
+        audio = {'inlineData': {'mimeType': 'audio/pcm;rate=24000', 'data': 'AAAA'}}
+        self.assertEqual(classify_part(audio), (PART_AUDIO, audio['inlineData']))
+        self.assertEqual(classify_part({'inline_data': {'mime_type': 'image/png', 'data': ''}})[0], PART_OTHER)
+        self.assertEqual(classify_part({'text': 'hello'}), (PART_TEXT, 'hello'))
+        self.assertEqual(classify_part({'executableCode': {'code': 'x'}})[0], PART_EXECUTABLE_CODE)
+
+    @override_settings(GEMINI_API_KEY='test-key', GEMINI_POOL_SIZE=0)
+    async def test_consumer_dispatch(self):
+        """
+        Test that audio mentioning 'quota' is relayed and a structured quota error closes the call
+        """
+        upstream = FakeGeminiSocket()
+        with patch('voice_flow.gemini_pool.websockets.connect', AsyncMock(return_value=upstream)):
+            communicator = WebsocketCommunicator(GeminiVoiceConsumer.as_asgi(), '/ws/voice/')
+            await communicator.connect()
+            await communicator.send_json_to({'type': 'setup'})
+            await communicator.receive_json_from()
+
+            quota_b64 = base64.b64encode(b'quota').decode()
+            await upstream.incoming.put(json.dumps({'serverContent': {'modelTurn': {'parts': [
+                {'inlineData': {'mimeType': 'audio/pcm;rate=24000', 'data': quota_b64}},
+                {'executableCode': {'code': 'save_patient_field(field_name="full_name", value="Ann Lee")'}},
+            ]}, 'turnComplete': True}}))
+            audio = await communicator.receive_json_from()
+            self.assertEqual((audio['type'], audio['data']), ('audio', quota_b64))
+            events = [await communicator.receive_json_from() for _ in range(3)]
+            self.assertEqual(json.loads(events[1]['arguments']), {'field_name': 'full_name', 'value': 'Ann Lee'})
+            self.assertEqual((await communicator.receive_json_from())['type'], 'turn_complete')
+
+            await upstream.incoming.put(json.dumps({'error': {'code': 429, 'status': 'RESOURCE_EXHAUSTED'}}))
+            error = await communicator.receive_json_from()
+            self.assertEqual(error['error_type'], 'quota_exceeded')
+            self.assertEqual((await communicator.receive_output())['type'], 'websocket.close')
+
+
+@override_settings(GEMINI_API_KEY='test-key', GEMINI_POOL_SIZE=0)
+class GeminiVoiceConsumerAudioRelayTestCase(SimpleTestCase):
+    """
+    Test cases for relaying model audio to the browser as binary frames
+    """
+
+    async def test_model_audio_relayed_as_binary_frames(self):
+        """
+        Test that audio parts arrive as headed PCM frames with format sent once
+        """
+        upstream = FakeGeminiSocket()
+        with patch('voice_flow.gemini_pool.websockets.connect', AsyncMock(return_value=upstream)):
+            communicator = WebsocketCommunicator(GeminiVoiceConsumer.as_asgi(), '/ws/voice/')
+            await communicator.connect()
+            await communicator.send_json_to({'type': 'setup', 'audio_output': 'binary'})
+            ack = await communicator.receive_json_from()
+            self.assertEqual(ack['audio_output'], 'binary')
+
+            chunks = [b'\x01\x00' * 240, b'\x02\x00' * 240]
+            for chunk in chunks:
+                await upstream.incoming.put(json.dumps({'serverContent': {'modelTurn': {'parts': [
+                    {'inlineData': {'mimeType': 'audio/pcm;rate=24000', 'data': base64.b64encode(chunk).decode()}}
+                ]}}}))
+
+            audio_format = await communicator.receive_json_from()
+            self.assertEqual(audio_format, {
+                'type': 'audio.format', 'mime_type': 'audio/pcm;rate=24000',
+                'sample_rate': 24000, 'channels': 1, 'codec': 'pcm16', 'quality': 'high'
+            })
+            for sequence, chunk in enumerate(chunks):
+                frame = await communicator.receive_from()
+                self.assertIsInstance(frame, bytes)
+                self.assertEqual(AUDIO_FRAME_HEADER.unpack_from(frame), (sequence, 24000))
+                self.assertEqual(frame[AUDIO_FRAME_HEADER.size:], chunk)
+            self.assertTrue(await communicator.receive_nothing())
+            await communicator.disconnect()
+
+    async def test_model_audio_encoded_with_negotiated_codec(self):
+        """
+        Test that binary model audio uses the output codec and capture frames are decoded
+        """
+        upstream = FakeGeminiSocket()
+        with patch('voice_flow.gemini_pool.websockets.connect', AsyncMock(return_value=upstream)):
+            communicator = WebsocketCommunicator(GeminiVoiceConsumer.as_asgi(), '/ws/voice/')
+            await communicator.connect()
+            await communicator.send_json_to({'type': 'setup', 'audio_transport': 'binary', 'audio_header': False,
+                                             'audio_codec': 'ima-adpcm', 'audio_output': 'binary',
+                                             'audio_output_codec': 'mulaw'})
+            ack = await communicator.receive_json_from()
+            self.assertEqual((ack['audio_codec'], ack['audio_output_codec']), ('ima-adpcm', 'mulaw'))
+
+            tone = make_tone(ms=60)
+            await communicator.send_to(bytes_data=ImaAdpcmEncoder().encode(tone))
+
+            await upstream.incoming.put(json.dumps({'serverContent': {'modelTurn': {'parts': [
+                {'inlineData': {'mimeType': 'audio/pcm;rate=24000', 'data': base64.b64encode(tone).decode()}}
+            ]}}}))
+            self.assertEqual((await communicator.receive_json_from())['codec'], 'mulaw')
+            frame = await communicator.receive_from()
+            self.assertEqual(len(frame), AUDIO_FRAME_HEADER.size + len(tone) // 2)
+            self.assertEqual(mulaw_decode(frame[AUDIO_FRAME_HEADER.size:]), mulaw_decode(mulaw_encode(tone)))
+            await communicator.disconnect()
+
+        chunks = [json.loads(m)['realtimeInput']['mediaChunks'][0] for m in upstream.sent if 'mediaChunks' in m]
+        received = b''.join(base64.b64decode(chunk['data']) for chunk in chunks)
+        self.assertEqual(received, ima_adpcm_decode(ImaAdpcmEncoder().encode(tone)))
+
+
+
+def make_appointment_data(**overrides):
+    """
+    Minimal valid appointment payload for the current Appointment model
+    """
+    data = {
+        'full_name': 'John Doe',
+        'dob': '1990-01-15',
+        'gender': 'Male',
+        'contact_number': '+1234567890',
+        'email': 'john.doe@example.com',
+        'address': '123 Main St, City, State, 12345',
+        'caller_type': 'Patient',
+        'reason_for_visit': 'Regular checkup',
+        'visit_type': 'First time',
+        'referral_source': 'Self',
+        'symptoms': 'No current symptoms',
+        'pain_level': 0,
+    }
+    data.update(overrides)
+    return data
+
+
+class JSONCodecTestCase(TestCase):
+    """
+    Test cases for the pluggable JSON codec and the DRF renderer/parser
+    """
+
+    def test_backends_round_trip_identically(self):
+        """
+        Test that every available backend produces equivalent compact JSON
+        """
+        message = {'serverContent': {'modelTurn': {'parts': [{'text': 'Café \u2014 ok'}]}}, 'n': [1, 2.5, None, True]}
+        for backend in jsoncodec.available_backends():
+            encoded = backend.dumps(message)
+            self.assertIsInstance(encoded, str)
+            self.assertNotIn(', ', encoded)
+            self.assertEqual(backend.loads(encoded), message)
+            self.assertEqual(backend.loads(backend.dumps_bytes(message)), message)
+        with self.assertRaises(jsoncodec.JSONDecodeError):
+            jsoncodec.loads('{not json')
+
+    def test_renderer_matches_stock_renderer(self):
+        """
+        Test that FastJSONRenderer output decodes to the same data as JSONRenderer
+        """
+        from decimal import Decimal
+        from rest_framework.renderers import JSONRenderer
+
+        data = {'when': datetime(2025, 1, 2, 3, 4, 5), 'day': date(2025, 1, 2), 'amount': Decimal('1.50'),
+                'text': 'line\u2028sep', 'items': [1, 'two']}
+        fast = FastJSONRenderer().render(data)
+        self.assertNotIn(b'\xe2\x80\xa8', fast)
+        self.assertEqual(json.loads(fast), json.loads(JSONRenderer().render(data)))
+
+    def test_parser_rejects_invalid_json(self):
+        """
+        Test that FastJSONParser raises ParseError on malformed bodies
+        """
+        import io
+        from rest_framework.exceptions import ParseError
+
+        self.assertEqual(FastJSONParser().parse(io.BytesIO(b'{"a": [1]}')), {'a': [1]})
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(io.BytesIO(b'{"a": '))
+
+    def test_appointment_api_uses_fast_renderer(self):
+        """
+        Test that the appointments API round-trips through the fast parser and renderer
+        """
+        url = reverse('voice_flow:appointment_api')
+        response = self.client.post(url, json.dumps(make_appointment_data()), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.get(url)
+        self.assertIsInstance(response.accepted_renderer, FastJSONRenderer)
+        self.assertEqual(response.json()['data'][0]['full_name'], 'John Doe')
+
+
+class TurnLatencyMetricsTestCase(TestCase):
+    """
+    Test cases for per-session turn timing and the metrics endpoint
+    """
+
+    def setUp(self):
+        metrics.reset()
+        self.now = 0.0
+        self.timer = metrics.TurnTimer(clock=lambda: self.now)
+
+    def tearDown(self):
+        metrics.reset()
+
+    def test_turn_intervals_anchor_on_last_audio_before_turn_end(self):
+        """
+        Test that time-to-first-audio and turn response use the last user chunk before inputComplete
+        """
+        self.timer.setup_sent()
+        self.now = 0.2
+        self.timer.upstream_message()
+        for self.now in (1.0, 1.1, 1.2):
+            self.timer.user_audio()
+        self.now = 1.5
+        self.timer.user_turn_end()
+        self.now = 1.6
+        self.timer.user_audio()  # trailing silence after the turn ended
+        self.now = 2.0
+        self.timer.model_audio()
+        self.now = 2.1
+        self.timer.model_audio()
+        self.now = 4.2
+        self.timer.model_turn_complete()
+
+        histograms = metrics.snapshot()['histograms']
+        self.assertEqual(histograms[metrics.SETUP_TO_FIRST_MESSAGE]['count'], 1)
+        self.assertAlmostEqual(histograms[metrics.SETUP_TO_FIRST_MESSAGE]['sum_ms'], 200, places=3)
+        self.assertEqual(histograms[metrics.TIME_TO_FIRST_AUDIO]['count'], 1)
+        self.assertAlmostEqual(histograms[metrics.TIME_TO_FIRST_AUDIO]['max_ms'], 800, places=3)
+        self.assertAlmostEqual(histograms[metrics.TURN_RESPONSE]['max_ms'], 3000, places=3)
+        self.assertEqual(histograms[metrics.TURN_RESPONSE]['p50_ms'], 3000.0)
+
+    def test_histogram_percentiles(self):
+        """
+        Test bucket-based percentile estimates
+        """
+        histogram = metrics.LatencyHistogram(buckets=(10, 100))
+        for ms in [5] * 90 + [50] * 9 + [500]:
+            histogram.observe(ms / 1000)
+        self.assertEqual(histogram.percentile(0.5), 10.0)
+        self.assertEqual(histogram.percentile(0.99), 100.0)
+        self.assertEqual(histogram.percentile(1.0), 500.0)
+        self.assertEqual(histogram.snapshot()['buckets'], {'10': 90, '100': 9, '+Inf': 1})
+
+    def test_metrics_endpoint_requires_staff(self):
+        """
+        Test that the metrics endpoint is staff-only and returns histograms
+        """
+        from django.contrib.auth import get_user_model
+
+        url = reverse('voice_flow:voice_metrics')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 302)
+
+        staff = get_user_model().objects.create_user('ops', password='pw', is_staff=True)
+        self.client.force_login(staff)
+        metrics.observe(metrics.TURN_RESPONSE, 0.3)
+        data = self.client.get(url).json()
+        self.assertEqual(data['histograms'][metrics.TURN_RESPONSE]['count'], 1)
+        self.assertIn('pid', data['worker'])
+
+
+class VoiceLoggingTestCase(SimpleTestCase):
+    """
+    Test cases for the queued, sampled and redacting log pipeline
+    """
+
+    def test_redact_masks_patient_identifiers(self):
+        """
+        Test that e-mails, dates, phone numbers and saved values are masked
+        """
+        message = redact('save_patient_field(field_name="email", value="Ann Lee") ann@example.com 1990-01-15 +1 (555) 123-4567')
+        self.assertNotIn('Ann Lee', message)
+        self.assertNotIn('ann@example.com', message)
+        self.assertNotIn('1990-01-15', message)
+        self.assertNotIn('555', message)
+        self.assertIn('field_name="email"', message)
+
+    def test_sampling_keeps_warnings_and_uses_longest_prefix(self):
+        """
+        Test per-category sampling rates
+        """
+        import logging
+
+        sampling = SamplingFilter(rates={'voice_flow.ws': 1.0, 'voice_flow.ws.tools': 0.0})
+        record = logging.LogRecord('voice_flow.ws.tools', logging.INFO, __file__, 1, 'x', (), None)
+        self.assertFalse(sampling.filter(record))
+        record.levelno = logging.WARNING
+        self.assertTrue(sampling.filter(record))
+        self.assertTrue(sampling.filter(logging.LogRecord('voice_flow.ws', logging.INFO, __file__, 1, 'x', (), None)))
+
+    def test_background_handler_writes_structured_redacted_lines(self):
+        """
+        Test that records are written as JSON lines off the calling thread, with PHI extras dropped
+        """
+        import io
+        import logging
+
+        stream = io.StringIO()
+        handler = BackgroundQueueHandler(stream=stream, queue_size=100)
+        handler.setFormatter(StructuredFormatter())
+        logger = logging.getLogger('voice_flow.tests.logging')
+        logger.addHandler(handler)
+        logger.propagate = False
+        try:
+            logger.warning('Saved %s for %s', 'email', 'ann@example.com', extra={'value': 'Ann Lee', 'session': 's1'})
+            handler.flush()
+        finally:
+            logger.removeHandler(handler)
+            handler.close()
+        entry = json.loads(stream.getvalue().splitlines()[0])
+        self.assertEqual(entry['level'], 'WARNING')
+        self.assertEqual(entry['session'], 's1')
+        self.assertEqual(entry['value'], '[REDACTED]')
+        self.assertEqual(entry['message'], 'Saved email for [REDACTED]')
+
+    def test_background_handler_from_dict_config_flushes_without_restarting(self):
+        """
+        Test that dictConfig builds the handler from LOGGING and flush() keeps the same listener thread
+        """
+        import io
+        import logging
+        import logging.config
+
+        stream = io.StringIO()
+        logging.config.dictConfig({
+            'version': 1,
+            'disable_existing_loggers': False,
+            'formatters': {'structured': {'()': 'voice_flow.log.StructuredFormatter'}},
+            'handlers': {'voice_queue': {
+                'class': 'voice_flow.log.BackgroundQueueHandler', 'stream': stream, 'formatter': 'structured',
+            }},
+            'loggers': {'voice_flow.tests.dictconfig': {'handlers': ['voice_queue'], 'propagate': False}},
+        })
+        logger = logging.getLogger('voice_flow.tests.dictconfig')
+        handler = logger.handlers[0]
+        try:
+            thread = handler.listener._thread
+            for index in range(3):
+                logger.warning('line %d', index)
+                handler.flush()
+                self.assertEqual(len(stream.getvalue().splitlines()), index + 1)
+            self.assertIs(handler.listener._thread, thread)
+        finally:
+            logger.removeHandler(handler)
+            handler.close()
+
+    def test_background_handler_drops_when_queue_full(self):
+        """
+        Test that a full queue drops records instead of blocking
+        """
+        import io
+        import logging
+
+        handler = BackgroundQueueHandler(stream=io.StringIO(), queue_size=1)
+        handler.listener.stop()
+        try:
+            for _ in range(3):
+                handler.handle(logging.LogRecord('voice_flow', logging.INFO, __file__, 1, 'x', (), None))
+            self.assertEqual(handler.dropped, 2)
+        finally:
+            handler.queue.get_nowait()
+            handler.close()
+
+
+class PolyphaseResamplerTestCase(SimpleTestCase):
+    """
+    Test cases for the streaming polyphase resampler
+    """
+
+    def _rms(self, pcm, skip=200):
+        import numpy as np
+
+        samples = np.frombuffer(pcm, dtype='<i2')[skip:].astype(float)
+        return float(np.sqrt(np.mean(samples ** 2)))
+
+    def test_rates_and_chunking_are_seamless(self):
+        """
+        Test output length, gain and that chunked input matches one-shot output
+        """
+        for input_rate in (48000, 44100, 8000):
+            tone = make_tone(ms=500, sample_rate=input_rate, frequency=1000.0)
+            whole = PolyphaseResampler(input_rate, 16000).process(tone)
+            resampler = PolyphaseResampler(input_rate, 16000)
+            chunked = b''.join(resampler.process(tone[i:i + 2048]) for i in range(0, len(tone), 2048))
+            self.assertEqual(whole, chunked)
+            self.assertEqual(len(whole), 2 * 8000)
+            self.assertAlmostEqual(self._rms(whole), self._rms(tone), delta=self._rms(tone) * 0.02)
+
+    def test_content_above_output_nyquist_is_removed(self):
+        """
+        Test that a 12 kHz tone does not alias into 16 kHz output
+        """
+        tone = make_tone(ms=500, sample_rate=48000, frequency=12000.0)
+        self.assertLess(self._rms(PolyphaseResampler(48000, 16000).process(tone)), 5.0)
+
+    def test_same_rate_passes_through(self):
+        """
+        Test that matching rates return the input unchanged
+        """
+        tone = make_tone(ms=20)
+        self.assertEqual(PolyphaseResampler(16000, 16000).process(tone), tone)
+
+
+class AudioCodecTestCase(SimpleTestCase):
+    """
+    Test cases for the μ-law and IMA-ADPCM codecs
+    """
+
+    def _snr_db(self, reference, decoded):
+        import numpy as np
+
+        ref = np.frombuffer(reference, dtype='<i2').astype(float)
+        out = np.frombuffer(decoded, dtype='<i2').astype(float)
+        return 10 * np.log10(np.sum(ref ** 2) / np.sum((ref - out) ** 2))
+
+    def test_mulaw_round_trip(self):
+        """
+        Test G.711 reference values and round-trip accuracy
+        """
+        import numpy as np
+
+        extremes = np.array([0, -1, 32767, -32768], dtype='<i2').tobytes()
+        self.assertEqual(mulaw_encode(extremes), bytes([0xFF, 0x7F, 0x80, 0x00]))
+        self.assertEqual(np.frombuffer(mulaw_decode(b'\x80\x00'), dtype='<i2').tolist(), [32124, -32124])
+        tone = make_tone(ms=500, frequency=440.0)
+        encoded = mulaw_encode(tone)
+        self.assertEqual(len(encoded), len(tone) // 2)
+        self.assertGreater(self._snr_db(tone, mulaw_decode(encoded)), 35)
+
+    def test_ima_adpcm_round_trip_across_blocks(self):
+        """
+        Test that chunked IMA-ADPCM blocks decode independently with good accuracy
+        """
+        tone = make_tone(ms=500, frequency=440.0)
+        encoder = ImaAdpcmEncoder()
+        blocks = [encoder.encode(tone[i:i + 642]) for i in range(0, len(tone), 642)]
+        decoded = b''.join(ima_adpcm_decode(block) for block in blocks)
+        self.assertEqual(len(decoded), len(tone))
+        self.assertLess(sum(len(block) for block in blocks), len(tone) // 3)
+        self.assertGreater(self._snr_db(tone, decoded), 25)
+        # Decoding a later block alone matches decoding it in sequence
+        self.assertEqual(ima_adpcm_decode(blocks[3]), decoded[3 * 642:4 * 642])
+
+    def test_ima_adpcm_saturation_is_clamped(self):
+        """
+        Test that full-scale square waves decode without wrapping around
+        """
+        import numpy as np
+
+        square = np.tile(np.array([32767] * 20 + [-32768] * 20, dtype='<i2'), 20).tobytes()
+        decoded = np.frombuffer(ima_adpcm_decode(ImaAdpcmEncoder().encode(square)), dtype='<i2')
+        self.assertEqual(decoded.max(), 32767)
+        self.assertEqual(decoded.min(), -32768)
+        with self.assertRaises(ValueError):
+            ima_adpcm_decode(b'\x00\x00')
+        self.assertEqual(get_decoder('pcm16')(b'\x01\x02'), b'\x01\x02')
+
+
+@override_settings(GEMINI_API_KEY='test-key', GEMINI_POOL_SIZE=0, GEMINI_RECONNECT_BACKOFF_SECONDS=0)
+class GeminiReconnectTestCase(SimpleTestCase):
+    """
+    Test cases for transparent upstream reconnects
+    """
+
+    async def test_drop_reconnects_with_summary_and_buffered_audio(self):
+        """
+        Test that a dropped upstream is replaced, setup replayed with saved fields and buffered input flushed
+        """
+        first, second = FakeGeminiSocket(), FakeGeminiSocket()
+        release = asyncio.Event()
+
+        async def connect(*args, **kwargs):
+            if not connect.calls:
+                connect.calls += 1
+                return first
+            await release.wait()
+            return second
+        connect.calls = 0
+
+        with patch('voice_flow.gemini_pool.websockets.connect', connect):
+            communicator = WebsocketCommunicator(GeminiVoiceConsumer.as_asgi(), '/ws/voice/')
+            await communicator.connect()
+            await communicator.send_json_to({'type': 'setup', 'audio_transport': 'binary', 'audio_header': False})
+            await communicator.receive_json_from()
+
+            await first.incoming.put(json.dumps({'serverContent': {'modelTurn': {'parts': [
+                {'executableCode': {'code': 'save_patient_field(field_name="full_name", value="Ann Lee")'}}
+            ]}}}))
+            for _ in range(3):
+                await communicator.receive_json_from()
+
+            await first.incoming.put(ConnectionResetError('upstream reset'))
+            self.assertEqual(await communicator.receive_json_from(), {'type': 'reconnecting'})
+
+            pcm = b'\x10\x00' * 320
+            await communicator.send_to(bytes_data=pcm)
+            await communicator.send_json_to({'type': 'turn_complete'})
+            self.assertTrue(await communicator.receive_nothing(0.05))
+            release.set()
+            self.assertEqual(await communicator.receive_json_from(), {'type': 'reconnected'})
+            await communicator.disconnect()
+
+        self.assertTrue(first.closed)
+        setup = json.loads(second.sent[0])['setup']
+        instructions = setup['system_instruction']['parts'][0]['text']
+        self.assertIn('SESSION RESUMED', instructions)
+        self.assertIn('- full_name: Ann Lee', instructions)
+        replayed = [json.loads(m)['realtimeInput'] for m in second.sent[1:]]
+        self.assertEqual(base64.b64decode(replayed[0]['mediaChunks'][0]['data']), pcm)
+        self.assertEqual(replayed[-1], {'inputComplete': True})
+
+    @override_settings(GEMINI_RECONNECT_ATTEMPTS=0)
+    async def test_drop_without_reconnect_reports_connection_lost(self):
+        """
+        Test that with reconnects disabled the browser is told and the socket closed
+        """
+        upstream = FakeGeminiSocket()
+        with patch('voice_flow.gemini_pool.websockets.connect', AsyncMock(return_value=upstream)):
+            communicator = WebsocketCommunicator(GeminiVoiceConsumer.as_asgi(), '/ws/voice/')
+            await communicator.connect()
+            await communicator.send_json_to({'type': 'setup'})
+            await communicator.receive_json_from()
+            await upstream.incoming.put(ConnectionResetError('upstream reset'))
+            error = await communicator.receive_json_from()
+            self.assertEqual(error['message'], 'Connection lost: upstream reset')
+            self.assertEqual((await communicator.receive_output())['type'], 'websocket.close')
+
+    @override_settings(GEMINI_RECONNECT_ATTEMPTS=3)
+    async def test_upstream_that_keeps_dropping_gives_up(self):
+        """
+        Test that reconnects stop once the budget is spent when no reconnected upstream ever answers
+        """
+        sockets = []
+
+        async def connect(*args, **kwargs):
+            upstream = FakeGeminiSocket()
+            await upstream.incoming.put(ConnectionResetError('upstream reset'))
+            sockets.append(upstream)
+            return upstream
+
+        with patch('voice_flow.gemini_pool.websockets.connect', connect):
+            communicator = WebsocketCommunicator(GeminiVoiceConsumer.as_asgi(), '/ws/voice/')
+            await communicator.connect()
+            await communicator.send_json_to({'type': 'setup'})
+            received = []
+            while True:
+                output = await communicator.receive_output(2)
+                if output['type'] == 'websocket.close':
+                    break
+                received.append(json.loads(output['text']))
+
+        self.assertEqual(len(sockets), 4)
+        self.assertEqual([message['type'] for message in received].count('reconnected'), 3)
+        self.assertEqual(received[-1]['message'], 'Connection lost: upstream reset')
+
+    @override_settings(GEMINI_RECONNECT_ATTEMPTS=1)
+    async def test_budget_resets_after_upstream_answers(self):
+        """
+        Test that a reconnected upstream which sends a message earns a fresh reconnect budget
+        """
+        sockets = []
+
+        async def connect(*args, **kwargs):
+            upstream = FakeGeminiSocket()
+            await upstream.incoming.put(json.dumps({'setupComplete': {}}))
+            await upstream.incoming.put(ConnectionResetError('upstream reset'))
+            sockets.append(upstream)
+            return upstream
+
+        with patch('voice_flow.gemini_pool.websockets.connect', connect):
+            communicator = WebsocketCommunicator(GeminiVoiceConsumer.as_asgi(), '/ws/voice/')
+            await communicator.connect()
+            await communicator.send_json_to({'type': 'setup'})
+            await communicator.receive_json_from()
+            for _ in range(3):
+                self.assertEqual(await communicator.receive_json_from(), {'type': 'reconnecting'})
+                self.assertEqual(await communicator.receive_json_from(), {'type': 'reconnected'})
+            await communicator.disconnect()
+        self.assertGreaterEqual(len(sockets), 4)
+
+    async def test_rejected_session_is_not_reconnected(self):
+        """
+        Test that an invalid-argument close ends the session instead of reconnecting
+        """
+        upstream = FakeGeminiSocket()
+        connect = AsyncMock(return_value=upstream)
+        with patch('voice_flow.gemini_pool.websockets.connect', connect):
+            communicator = WebsocketCommunicator(GeminiVoiceConsumer.as_asgi(), '/ws/voice/')
+            await communicator.connect()
+            await communicator.send_json_to({'type': 'setup'})
+            await communicator.receive_json_from()
+            await upstream.incoming.put(ConnectionClosedError(Close(1007, 'Request contains an invalid argument.'), None))
+            error = await communicator.receive_json_from()
+            self.assertEqual(error['type'], 'error')
+            self.assertIn('invalid argument', error['message'])
+            self.assertEqual((await communicator.receive_output())['type'], 'websocket.close')
+        self.assertEqual(connect.await_count, 1)
+
+    def test_reconnect_buffer_evicts_oldest_audio_only(self):
+        """
+        Test that the ring keeps control messages and the newest audio
+        """
+        buffer = ReconnectBuffer(max_audio_bytes=4)
+        buffer.add_audio(b'aa', 'audio/pcm', 16000)
+        buffer.add_message('{"x":1}', 'text input')
+        buffer.add_audio(b'bb', 'audio/pcm', 16000)
+        buffer.add_audio(b'cc', 'audio/pcm', 16000)
+        self.assertEqual(len(buffer), 3)
+        self.assertEqual(buffer.dropped_bytes, 2)
+
+
+class StandInRedisServer:
+    """
+    In-process server speaking just enough of the Redis protocol (RESP3) for
+    the session registry, the admission store and the pub/sub channel layer
+    """
+
+    def __init__(self):
+        self.strings = {}
+        self.hashes = {}
+        self.sets = {}
+        self.expiry = {}
+        self.subscribers = {}
+        self.server = None
+
+    @property
+    def url(self):
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f'redis://{host}:{port}/0'
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._serve, '127.0.0.1', 0)
+        return self
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    def _encode(self, value, kind=b'*'):
+        if value is None:
+            return b'_\r\n'
+        if isinstance(value, int):
+            return b':%d\r\n' % value
+        if isinstance(value, dict):
+            items = [item for pair in value.items() for item in pair]
+            return b'%%%d\r\n' % len(value) + b''.join(self._encode(item) for item in items)
+        if isinstance(value, (list, tuple)):
+            return kind + b'%d\r\n' % len(value) + b''.join(self._encode(item) for item in value)
+        if isinstance(value, str):
+            value = value.encode()
+        return b'$%d\r\n%s\r\n' % (len(value), value)
+
+    async def _read_command(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            size = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(size + 2))[:-2])
+        return args
+
+    def _expire_key(self, key):
+        deadline = self.expiry.get(key)
+        if deadline is not None and deadline <= asyncio.get_running_loop().time():
+            self.strings.pop(key, None)
+            self.hashes.pop(key, None)
+            self.sets.pop(key, None)
+            del self.expiry[key]
+
+    async def _serve(self, reader, writer):
+        subscriptions = set()
+        try:
+            while (args := await self._read_command(reader)) is not None:
+                command = args[0].upper().decode()
+                if len(args) > 1:
+                    self._expire_key(args[1])
+                if command in ('SUBSCRIBE', 'UNSUBSCRIBE'):
+                    for channel in args[1:]:
+                        if command == 'SUBSCRIBE':
+                            subscriptions.add(channel)
+                            self.subscribers.setdefault(channel, set()).add(writer)
+                        else:
+                            subscriptions.discard(channel)
+                            self.subscribers.get(channel, set()).discard(writer)
+                        writer.write(self._encode([command.lower(), channel, len(subscriptions)], b'>'))
+                else:
+                    writer.write(self._reply(command, args[1:]))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for channel in subscriptions:
+                self.subscribers.get(channel, set()).discard(writer)
+            writer.close()
+
+    def _reply(self, command, args):
+        if command == 'HELLO':
+            return self._encode({'server': 'stand-in', 'proto': 3})
+        if command == 'PING':
+            return b'+PONG\r\n'
+        if command == 'PUBLISH':
+            receivers = list(self.subscribers.get(args[0], ()))
+            for receiver in receivers:
+                receiver.write(self._encode([b'message', args[0], args[1]], b'>'))
+            return self._encode(len(receivers))
+        if command == 'SET':
+            options = [arg.upper() for arg in args[2:]]
+            if b'NX' in options and args[0] in self.strings:
+                return self._encode(None)
+            self.strings[args[0]] = args[1]
+            self.expiry.pop(args[0], None)
+            if b'EX' in options:
+                self.expiry[args[0]] = asyncio.get_running_loop().time() + int(args[3 + options.index(b'EX')])
+            return b'+OK\r\n'
+        if command in ('GET', 'MGET'):
+            for key in args:
+                self._expire_key(key)
+            values = [self.strings.get(key) for key in args]
+            return self._encode(values[0] if command == 'GET' else values)
+        if command == 'HSET':
+            fields = self.hashes.setdefault(args[0], {})
+            added = len(set(args[1::2]) - fields.keys())
+            fields.update(zip(args[1::2], args[2::2]))
+            return self._encode(added)
+        if command == 'HGETALL':
+            return self._encode(self.hashes.get(args[0], {}))
+        if command == 'SADD':
+            members = self.sets.setdefault(args[0], set())
+            before = len(members)
+            members.update(args[1:])
+            return self._encode(len(members) - before)
+        if command == 'SREM':
+            members = self.sets.get(args[0], set())
+            removed = len(members.intersection(args[1:]))
+            members.difference_update(args[1:])
+            return self._encode(removed)
+        if command == 'SMEMBERS':
+            return self._encode(sorted(self.sets.get(args[0], ())), b'~')
+        if command == 'EXPIRE':
+            exists = args[0] in self.strings or args[0] in self.hashes or args[0] in self.sets
+            if exists:
+                self.expiry[args[0]] = asyncio.get_running_loop().time() + int(args[1])
+            return self._encode(int(exists))
+        if command == 'DEL':
+            removed = 0
+            for key in args:
+                removed += any(store.pop(key, None) is not None for store in (self.strings, self.hashes, self.sets))
+                self.expiry.pop(key, None)
+            return self._encode(removed)
+        return b'-ERR unknown command\r\n'
+
+
+@override_settings(GEMINI_API_KEY='test-key', GEMINI_POOL_SIZE=0)
+class VoiceSessionRegistryTestCase(TestCase):
+    """
+    Test cases for the session registry and cross-worker session messaging
+    """
+
+    async def _connect_session(self):
+        upstream = FakeGeminiSocket()
+        connect_patch = patch('voice_flow.gemini_pool.websockets.connect', AsyncMock(return_value=upstream))
+        connect_patch.start()
+        self.addCleanup(connect_patch.stop)
+        communicator = WebsocketCommunicator(GeminiVoiceConsumer.as_asgi(), '/ws/voice/')
+        await communicator.connect()
+        await communicator.send_json_to({'type': 'setup'})
+        ack = await communicator.receive_json_from()
+        return communicator, ack['session_id']
+
+    async def test_session_registered_and_reachable_by_id(self):
+        """
+        Test that a call is registered to this worker and can be messaged and closed by session id
+        """
+        communicator, session_id = await self._connect_session()
+        entry = await sessions.get_session_registry().get(session_id)
+        self.assertEqual(entry['worker'], sessions.WORKER_ID)
+
+        await sessions.send_to_session(session_id, sessions.ACTION_SEND, message={'type': 'notice', 'text': 'hi'})
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'notice', 'text': 'hi'})
+
+        await sessions.send_to_session(session_id, sessions.ACTION_CLOSE, reason='Moved to a nurse')
+        self.assertEqual((await communicator.receive_json_from())['message'], 'Moved to a nurse')
+        self.assertEqual((await communicator.receive_output())['type'], 'websocket.close')
+        await communicator.disconnect()
+        self.assertIsNone(await sessions.get_session_registry().get(session_id))
+
+    async def test_redis_backends_reach_session_from_another_worker(self):
+        """
+        Test the Redis registry and pub/sub layer against a stand-in server, messaging from a second layer
+        """
+        from channels.layers import get_channel_layer
+        from channels_redis.pubsub import RedisPubSubChannelLayer
+
+        server = await StandInRedisServer().start()
+        with self.settings(
+            CHANNEL_LAYERS={'default': {
+                'BACKEND': 'channels_redis.pubsub.RedisPubSubChannelLayer',
+                'CONFIG': {'hosts': [server.url]},
+            }},
+            VOICE_SESSION_REGISTRY={
+                'BACKEND': 'voice_flow.sessions.RedisSessionRegistry',
+                'OPTIONS': {'url': server.url},
+            },
+        ):
+            communicator, session_id = await self._connect_session()
+            registry = sessions.get_session_registry()
+            self.assertEqual([entry['session_id'] for entry in await registry.list()], [session_id])
+
+            other_worker = RedisPubSubChannelLayer(hosts=[server.url])
+            await other_worker.group_send(sessions.session_group_name(session_id), {
+                'type': 'session.message', 'action': sessions.ACTION_SEND, 'message': {'type': 'notice'},
+            })
+            self.assertEqual(await communicator.receive_json_from(), {'type': 'notice'})
+
+            await communicator.disconnect()
+            self.assertEqual(await registry.list(), [])
+
+            # An entry whose hash expired is pruned from the index
+            await registry.register('stale', 'channel')
+            server.hashes.clear()
+            self.assertEqual(await registry.list(), [])
+            self.assertEqual(server.sets[b'voice:sessions'], set())
+
+            await other_worker.flush()
+            await get_channel_layer().flush()
+            await registry.close()
+        await server.stop()
+
+    def test_sessions_endpoint_requires_staff(self):
+        """
+        Test that the session listing is staff-only and shows the owning worker
+        """
+        from asgiref.sync import async_to_sync
+        from django.contrib.auth import get_user_model
+
+        url = reverse('voice_flow:voice_sessions')
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        registry = sessions.InMemorySessionRegistry()
+        async_to_sync(registry.register)('abc', 'channel')
+        self.addCleanup(async_to_sync(registry.unregister), 'abc')
+        staff = get_user_model().objects.create_user('ops', password='pw', is_staff=True)
+        self.client.force_login(staff)
+        data = self.client.get(url).json()
+        self.assertIn({'session_id': 'abc', 'worker': sessions.WORKER_ID}, [
+            {key: entry[key] for key in ('session_id', 'worker')} for entry in data['sessions']
+        ])
+
+
+class FakeClock:
+    """
+    Manually advanced clock for rate and breaker tests
+    """
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@override_settings(GEMINI_API_KEY='test-key', GEMINI_POOL_SIZE=0)
+class AdmissionControlTestCase(SimpleTestCase):
+    """
+    Test cases for session admission, queueing and the quota circuit breaker
+    """
+
+    def test_token_bucket_refills_at_rate(self):
+        """
+        Test that the bucket allows a burst and then one start per 1/rate seconds
+        """
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2.0, burst=2, clock=clock)
+        bucket.take()
+        bucket.take()
+        self.assertAlmostEqual(bucket.time_until(1), 0.5)
+        self.assertAlmostEqual(bucket.time_until(3), 1.5)
+        clock.now += 0.5
+        self.assertEqual(bucket.time_until(1), 0.0)
+
+    def test_breaker_opens_then_ramps_and_backs_off(self):
+        """
+        Test that capacity is zero while open, ramps linearly and a repeat trip doubles the cooldown
+        """
+        clock = FakeClock()
+        breaker = CircuitBreaker(cooldown_seconds=10, max_cooldown_seconds=30, ramp_seconds=20, clock=clock)
+        self.assertEqual((breaker.state, breaker.capacity()), ('closed', 1.0))
+        breaker.trip()
+        self.assertEqual((breaker.state, breaker.capacity(), breaker.retry_after()), ('open', 0.0, 10.0))
+        clock.now += 15
+        self.assertEqual((breaker.state, breaker.capacity()), ('ramping', 0.25))
+        self.assertEqual(scaled_limit(10, breaker.capacity()), 2)
+        breaker.trip()
+        self.assertEqual(breaker.retry_after(), 20.0)
+        clock.now += 20 + 20
+        self.assertEqual(breaker.state, 'closed')
+        breaker.trip()
+        self.assertEqual(breaker.retry_after(), 10.0)
+
+    async def test_queue_admits_in_order_and_rejects_when_full(self):
+        """
+        Test that callers over the limit wait in FIFO order with a position and estimate
+        """
+        controller = AdmissionController(max_sessions=1, rate=0, queue_size=2, session_seconds=60)
+        first = await controller.acquire()
+        updates = []
+
+        async def on_queued(position, wait):
+            updates.append((position, wait))
+
+        second = asyncio.create_task(controller.acquire(on_queued))
+        await asyncio.sleep(0)
+        third = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+        self.assertEqual(updates, [(1, 60.0)])
+        with self.assertRaises(AdmissionRejected) as rejected:
+            await controller.acquire()
+        self.assertEqual(rejected.exception.reason, 'queue_full')
+
+        await first.release()
+        admitted = await asyncio.wait_for(second, 1)
+        self.assertFalse(third.done())
+        await admitted.release()
+        await (await asyncio.wait_for(third, 1)).release()
+        self.assertEqual(controller.snapshot()['active'], 0)
+
+    async def test_open_breaker_rejects_after_max_wait(self):
+        """
+        Test that nothing is admitted while the breaker is open
+        """
+        controller = AdmissionController(max_sessions=5, rate=0, max_wait_seconds=0.05)
+        await controller.record_quota_error()
+        with self.assertRaises(AdmissionRejected) as rejected:
+            await controller.acquire()
+        self.assertEqual(rejected.exception.reason, 'timeout')
+        self.assertGreater(rejected.exception.retry_after, 0)
+
+    async def test_cluster_store_shares_slots_and_breaker(self):
+        """
+        Test that two workers share the cluster slot limit and a tripped breaker
+        """
+        server = await StandInRedisServer().start()
+        stores = [RedisAdmissionStore(url=server.url, max_sessions=1) for _ in range(2)]
+        first, second = (AdmissionController(max_sessions=5, rate=0, store=store) for store in stores)
+
+        admission, _ = await first._try_admit()
+        self.assertEqual(admission.slot, 0)
+        self.assertEqual(await second._try_admit(), (None, None))
+        await admission.release()
+        admission, _ = await second._try_admit()
+        self.assertIsNotNone(admission)
+        await admission.release()
+
+        await first.record_quota_error()
+        self.assertEqual((await second._try_admit())[0], None)
+        self.assertEqual(second.breaker.state, 'open')
+        for store in stores:
+            await store.close()
+        await server.stop()
+
+    @override_settings(GEMINI_ADMISSION_MAX_SESSIONS=1, GEMINI_ADMISSION_RATE=0)
+    async def test_consumer_waits_in_queue_until_a_session_ends(self):
+        """
+        Test that a caller over the limit is told it is queued and set up once a slot frees
+        """
+        with patch('voice_flow.gemini_pool.websockets.connect', AsyncMock(side_effect=lambda *args, **kwargs: FakeGeminiSocket())):
+            first = WebsocketCommunicator(GeminiVoiceConsumer.as_asgi(), '/ws/voice/')
+            await first.connect()
+            await first.send_json_to({'type': 'setup'})
+            self.assertEqual((await first.receive_json_from())['type'], 'setup.ack')
+
+            second = WebsocketCommunicator(GeminiVoiceConsumer.as_asgi(), '/ws/voice/')
+            await second.connect()
+            await second.send_json_to({'type': 'setup'})
+            queued = await second.receive_json_from()
+            self.assertEqual((queued['type'], queued['position']), ('queued', 1))
+            self.assertIn('estimated_wait_seconds', queued)
+
+            await first.disconnect()
+            self.assertEqual((await second.receive_json_from())['type'], 'setup.ack')
+            await second.disconnect()
+
+    async def test_structured_quota_error_opens_breaker(self):
+        """
+        Test that a quota error from Gemini stops further admissions on this worker
+        """
+        upstream = FakeGeminiSocket()
+        with patch('voice_flow.gemini_pool.websockets.connect', AsyncMock(return_value=upstream)):
+            communicator = WebsocketCommunicator(GeminiVoiceConsumer.as_asgi(), '/ws/voice/')
+            await communicator.connect()
+            await communicator.send_json_to({'type': 'setup'})
+            await communicator.receive_json_from()
+            await upstream.incoming.put(json.dumps({'error': {'code': 429, 'status': 'RESOURCE_EXHAUSTED'}}))
+            self.assertEqual((await communicator.receive_json_from())['error_type'], 'quota_exceeded')
+            await communicator.wait()
+        self.assertEqual(get_admission_controller().breaker.state, 'open')
+
+
+@override_settings(GEMINI_API_KEY='test-key', GEMINI_POOL_SIZE=0)
+class MockGeminiLoadTestCase(SimpleTestCase):
+    """
+    Test cases for the mock Gemini Live server and the load-test driver
+    """
+
+    async def test_consumer_turn_against_mock_server(self):
+        """
+        Test that the consumer completes setup and relays a full synthetic model turn
+        """
+        async with MockGeminiLiveServer(first_response_delay=0, response_audio_ms=80, chunk_interval=0) as mock:
+            with self.settings(GEMINI_WS_URL=mock.url):
+                communicator = WebsocketCommunicator(GeminiVoiceConsumer.as_asgi(), '/ws/voice/')
+                await communicator.connect()
+                await communicator.send_json_to({'type': 'setup', 'audio_transport': 'binary', 'audio_output': 'binary'})
+                self.assertEqual((await communicator.receive_json_from())['type'], 'setup.ack')
+                await communicator.send_json_to({'type': 'turn_complete'})
+
+                received = []
+                while 'turn_complete' not in received:
+                    output = await communicator.receive_output(2)
+                    received.append('audio' if output.get('bytes') else json.loads(output['text'])['type'])
+                await communicator.disconnect()
+
+        self.assertEqual(received[:3], ['audio.format', 'audio', 'audio'])
+        self.assertIn('text', received)
+        self.assertIn('response.function_call_arguments.done', received)
+        self.assertEqual((mock.sessions, mock.turns), (1, 1))
+
+    @override_settings(VOICE_RECORDING_ENABLED=True)
+    async def test_load_driver_reports_latency_throughput_and_memory(self):
+        """
+        Test a small in-process run end to end, without recording calls or writing drafts
+        """
+        with patch('voice_flow.ws.start_recording') as start_recording, \
+                patch('voice_flow.drafts.save_drafts') as save_drafts:
+            result = await run_worker(2, turns=2, speech_ms=80, pace=0, ramp_seconds=0, mock_options={
+                'first_response_delay': 0.01, 'response_audio_ms': 80, 'chunk_interval': 0,
+            })
+        start_recording.assert_not_called()
+        save_drafts.assert_not_called()
+        report = summarize([result])
+        self.assertEqual(report['errors'], [])
+        self.assertEqual((report['clients'], report['turns']), (2, 4))
+        self.assertGreaterEqual(report['turn_latency_ms']['p50'], 10)
+        self.assertLessEqual(report['turn_latency_ms']['p50'], report['turn_latency_ms']['p99'])
+        self.assertGreater(report['messages_per_second_per_worker'][0], 0)
+        self.assertIsNotNone(report['rss_per_session_kib'])
+
+    def test_percentile_is_nearest_rank(self):
+        """
+        Test the percentile used for the latency report
+        """
+        samples = list(range(1, 101))
+        self.assertEqual((percentile(samples, 0.5), percentile(samples, 0.99), percentile([], 0.5)), (50, 99, None))
+
+
+@override_settings(GEMINI_API_KEY='test-key', GEMINI_POOL_SIZE=0)
+class IntakeStateTestCase(TestCase):
+    """
+    Test cases for server-side intake state and committing it to an Appointment
+    """
+
+    def test_apply_ignores_repeats_and_unknown_fields(self):
+        """
+        Test that only new values for known fields are recorded
+        """
+        intake = IntakeState()
+        self.assertTrue(intake.apply('full_name', ' Ann Lee '))
+        self.assertFalse(intake.apply('full_name', 'Ann Lee'))
+        self.assertFalse(intake.apply('favourite_colour', 'blue'))
+        self.assertTrue(intake.apply('full_name', 'Ann B. Lee'))
+        self.assertEqual(intake.fields, {'full_name': 'Ann B. Lee'})
+
+    def test_appointment_data_normalizes_spoken_values(self):
+        """
+        Test date, yes/no and not-needed conversion, and that helper fields are dropped
+        """
+        intake = IntakeState()
+        intake.update({'dob': '1/5/1990', 'interpreter_need': 'No', 'symptoms': 'no',
+                       'interpreter_language': 'not-needed', 'confirmation': 'yes'})
+        self.assertEqual(intake.appointment_data(), {
+            'dob': '1990-01-05', 'interpreter_need': False, 'symptoms': 'no', 'interpreter_language': None,
+        })
+
+    async def test_commit_message_creates_appointment_once(self):
+        """
+        Test that saved fields are relayed once and a commit creates a single Appointment
+        """
+        upstream = FakeGeminiSocket()
+        data = make_appointment_data()
+        with patch('voice_flow.gemini_pool.websockets.connect', AsyncMock(return_value=upstream)):
+            communicator = WebsocketCommunicator(GeminiVoiceConsumer.as_asgi(), '/ws/voice/')
+            await communicator.connect()
+            await communicator.send_json_to({'type': 'setup'})
+            await communicator.receive_json_from()
+
+            code = '\n'.join(f'save_patient_field(field_name="{name}", value="{value}")' for name, value in data.items())
+            await upstream.incoming.put(json.dumps({'serverContent': {'modelTurn': {'parts': [
+                {'executableCode': {'code': code}},
+                {'executableCode': {'code': 'save_patient_field(field_name="full_name", value="John Doe")'}},
+            ]}}}))
+            relayed = [await communicator.receive_json_from() for _ in range(3 * len(data))]
+            self.assertTrue(await communicator.receive_nothing(0.05))
+            self.assertEqual(sum(event['type'] == 'response.function_call.done' for event in relayed), len(data))
+
+            await communicator.send_json_to({'type': 'commit', 'fields': {'email': 'jd@example.com'}})
+            result = await communicator.receive_json_from()
+            self.assertEqual((result['type'], result['success']), ('commit.result', True))
+            self.assertEqual(result['data']['email'], 'jd@example.com')
+
+            await communicator.send_json_to({'type': 'commit'})
+            again = await communicator.receive_json_from()
+            self.assertEqual(again['data']['id'], result['data']['id'])
+            await communicator.disconnect()
+        self.assertEqual(await Appointment.objects.acount(), 1)
+
+    async def test_commit_reports_validation_errors(self):
+        """
+        Test that an incomplete intake is not saved and the missing fields are reported
+        """
+        intake = IntakeState()
+        intake.apply('full_name', 'Ann Lee')
+        result = await intake.commit()
+        self.assertFalse(result['success'])
+        self.assertIn('dob', result['errors'])
+        self.assertIsNone(intake.appointment_id)
+
+    async def test_commit_with_malformed_fields_fails(self):
+        """
+        Test that a commit whose fields are not an object gets a failed commit.result
+        """
+        with patch('voice_flow.gemini_pool.websockets.connect', AsyncMock(return_value=FakeGeminiSocket())):
+            communicator = WebsocketCommunicator(GeminiVoiceConsumer.as_asgi(), '/ws/voice/')
+            await communicator.connect()
+            await communicator.send_json_to({'type': 'setup'})
+            await communicator.receive_json_from()
+
+            await communicator.send_json_to({'type': 'commit', 'fields': ['email', 'jd@example.com']})
+            result = await communicator.receive_json_from()
+            await communicator.disconnect()
+        self.assertEqual(result, {'type': 'commit.result', 'success': False, 'message': 'fields must be an object'})
+        self.assertEqual(await Appointment.objects.acount(), 0)
+
+
+@override_settings(GEMINI_API_KEY='test-key', GEMINI_POOL_SIZE=0)
+class AppointmentDraftTestCase(TestCase):
+    """
+    Test cases for write-behind intake drafts and their promotion to Appointments
+    """
+
+    async def test_writer_batches_updates_into_one_write(self):
+        """
+        Test that many field updates within an interval reach the database in one write
+        """
+        writer = DraftWriter(interval=0.05)
+        intake = IntakeState()
+        for name, value in make_appointment_data().items():
+            intake.apply(name, value)
+            writer.update('call-1', intake.fields)
+        writer.update('call-2', {'full_name': 'Ann Lee'})
+        self.assertEqual(await AppointmentDraft.objects.acount(), 0)
+        await asyncio.sleep(0.2)
+        self.assertEqual(writer.writes, 1)
+        draft = await AppointmentDraft.objects.aget(session_id='call-1')
+        self.assertEqual(draft.fields, intake.fields)
+        self.assertEqual(draft.status, AppointmentDraft.STATUS_IN_PROGRESS)
+
+        writer.update('call-2', {'full_name': 'Ann B. Lee'})
+        await writer.flush('call-2')
+        self.assertEqual(writer.writes, 2)
+        self.assertEqual((await AppointmentDraft.objects.aget(session_id='call-2')).fields, {'full_name': 'Ann B. Lee'})
+
+    async def test_dropped_call_is_resumed_and_promoted_on_commit(self):
+        """
+        Test that a disconnect flushes the draft and a new call can resume and commit it
+        """
+        # Values arrive as the strings spoken into save_patient_field calls
+        data = {name: str(value) for name, value in make_appointment_data().items()}
+        upstreams = []
+
+        def open_upstream(*args, **kwargs):
+            upstreams.append(FakeGeminiSocket())
+            return upstreams[-1]
+
+        with patch('voice_flow.gemini_pool.websockets.connect', AsyncMock(side_effect=open_upstream)):
+            first = WebsocketCommunicator(GeminiVoiceConsumer.as_asgi(), '/ws/voice/')
+            await first.connect()
+            await first.send_json_to({'type': 'setup'})
+            draft_id = (await first.receive_json_from())['draft_id']
+            code = '\n'.join(f'save_patient_field(field_name="{name}", value="{value}")' for name, value in data.items())
+            await upstreams[0].incoming.put(json.dumps({'serverContent': {'modelTurn': {'parts': [
+                {'executableCode': {'code': code}},
+            ]}}}))
+            for _ in range(3 * len(data)):
+                await first.receive_json_from()
+            await first.disconnect()
+            draft = await AppointmentDraft.objects.aget(session_id=draft_id)
+            self.assertEqual(draft.fields, data)
+
+            second = WebsocketCommunicator(GeminiVoiceConsumer.as_asgi(), '/ws/voice/')
+            await second.connect()
+            await second.send_json_to({'type': 'setup', 'resume_draft': draft_id})
+            ack = await second.receive_json_from()
+            self.assertEqual((ack['draft_id'], ack['resumed_fields']), (draft_id, data))
+            # The model is told what is already saved instead of asking again
+            setup = json.loads(upstreams[1].sent[0])
+            self.assertIn(data['full_name'], json.dumps(setup))
+
+            await second.send_json_to({'type': 'commit'})
+            result = await second.receive_json_from()
+            self.assertTrue(result['success'])
+            await second.disconnect()
+
+        draft = await AppointmentDraft.objects.aget(session_id=draft_id)
+        self.assertEqual(draft.status, AppointmentDraft.STATUS_COMPLETED)
+        self.assertEqual(draft.appointment_id, result['data']['id'])
+
+    def test_supervisor_promotes_draft(self):
+        """
+        Test that staff can list in-progress drafts and finish one with corrections
+        """
+        data = make_appointment_data()
+        email = data.pop('email')
+        save_drafts({'call-9': data})
+        staff = User.objects.create_user('supervisor', password='secret', is_staff=True)
+        self.client.force_login(staff)
+
+        listed = self.client.get(reverse('voice_flow:appointment_drafts')).json()
+        self.assertEqual([draft['session_id'] for draft in listed['drafts']], ['call-9'])
+
+        url = reverse('voice_flow:promote_appointment_draft', args=['call-9'])
+        for body in (['email', email], 'email', {'fields': [email]}):
+            response = self.client.post(url, data=json.dumps(body), content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(Appointment.objects.exists())
+
+        response = self.client.post(url, data=json.dumps({'fields': {'email': email}}), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        appointment = Appointment.objects.get()
+        self.assertEqual((appointment.email, appointment.draft.session_id), (email, 'call-9'))
+        self.assertEqual(self.client.get(reverse('voice_flow:appointment_drafts')).json()['drafts'], [])
+        self.assertEqual(self.client.post(url).status_code, 404)
+
+
+@override_settings(TRANSCRIPT_BULK_BATCH_SIZE=4, TRANSCRIPT_COMPRESS_MIN_BYTES=100)
+class ConversationTranscriptTestCase(TestCase):
+    """
+    Test cases for storing and reading conversation transcripts
+    """
+
+    def setUp(self):
+        self.appointment = Appointment.objects.create(**make_appointment_data(dob=date(1990, 1, 15)))
+        self.messages = [
+            {'role': 'assistant' if index % 2 else 'user', 'content': f'Message {index}',
+             'timestamp': '2026-10-17T09:00:00Z'}
+            for index in range(9)
+        ]
+        self.messages.append({'role': 'user', 'content': 'long answer ' * 50})
+
+    def save(self, **payload):
+        payload.setdefault('action', 'save_conversation_to_database')
+        return self.client.post('/save/', data=json.dumps(payload), content_type='application/json')
+
+    def test_save_conversation_stores_compressed_rows(self):
+        """
+        Test that the client's save action stores every message and a later save never appends to it
+        """
+        response = self.client.post(reverse('voice_flow:appointment_api'), make_appointment_data(),
+                                    content_type='application/json')
+        appointment = Appointment.objects.get(pk=response.json()['data']['id'])
+        response = self.save(appointment_id=appointment.pk, messages=self.messages, title='Intake',
+                             conversation_start_time='2026-10-17T09:00:00Z')
+        self.assertEqual(response.status_code, 200)
+        transcript = ConversationTranscript.objects.get(pk=response.json()['transcript_id'])
+        self.assertEqual((transcript.appointment, transcript.message_count), (appointment, 10))
+
+        long_message = transcript.messages.get(sequence=10)
+        self.assertEqual(long_message.content, '')
+        self.assertEqual(long_message.text, self.messages[-1]['content'])
+        self.assertIsNone(transcript.messages.get(sequence=1).content_zlib)
+
+        response = self.save(transcript_id=transcript.pk, messages=[{'role': 'system', 'content': 'Ended'}])
+        self.assertNotEqual(response.json()['transcript_id'], transcript.pk)
+        transcript.refresh_from_db()
+        self.assertEqual((transcript.message_count, transcript.messages.count()), (10, 10))
+
+    def test_save_conversation_rejects_appointment_of_another_session(self):
+        """
+        Test that a transcript cannot be linked to an appointment this session did not create
+        """
+        response = self.save(appointment_id=self.appointment.pk, messages=self.messages)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('appointment_id', response.json()['error'])
+        self.assertFalse(ConversationTranscript.objects.exists())
+
+    def test_save_conversation_rejects_invalid_messages(self):
+        """
+        Test that a malformed message rejects the whole save
+        """
+        response = self.save(messages=[{'role': 'user', 'content': 'Hi'}, {'content': 'no role'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ConversationTranscript.objects.exists())
+
+    def test_transcript_pages_and_stream(self):
+        """
+        Test that staff can page through a transcript by sequence or stream it as NDJSON
+        """
+        transcript_id = self.save(messages=self.messages).json()['transcript_id']
+        url = reverse('voice_flow:conversation_transcript', args=[transcript_id])
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(User.objects.create_user('auditor', password='secret', is_staff=True))
+
+        contents, after = [], 0
+        while after is not None:
+            page = self.client.get(url, {'after': after, 'limit': 4}).json()
+            contents += [message['content'] for message in page['messages']]
+            after = page['next_after']
+        self.assertEqual(contents, [message['content'] for message in self.messages])
+        self.assertEqual(page['transcript']['message_count'], 10)
+
+        response = self.client.get(url, {'stream': '1'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual([json.loads(line)['sequence'] for line in lines], list(range(1, 11)))
+
+
+class CallRecordingTestCase(TestCase):
+    """
+    Test cases for off-loop call audio archival
+    """
+
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.writer = RecordingWriter(root=self.media.name, segment_seconds=1)
+
+    def test_ring_buffer_memory_is_fixed(self):
+        """
+        Test that a full ring keeps the newest audio and counts what it overwrote
+        """
+        ring = PcmRingBuffer(8)
+        self.assertTrue(ring.write(b'\x01\x00\x02\x00\x03\x00', 16000))
+        self.assertTrue(ring.write(b'\x04\x00\x05\x00\x06\x00', 16000))
+        self.assertEqual((len(ring), ring.dropped), (8, 4))
+        self.assertEqual(ring.drain(), b'\x03\x00\x04\x00\x05\x00\x06\x00')
+        self.assertTrue(ring.write(bytes(20), 16000))
+        self.assertEqual((len(ring), ring.dropped, len(ring._buffer)), (8, 16, 8))
+        self.assertFalse(ring.write(b'\x00\x00', 24000))
+
+    def test_writer_splits_tracks_into_wav_segments(self):
+        """
+        Test that buffered audio is written as fixed-length WAV segments and indexed per session
+        """
+        recorder = self.writer.add(SessionRecorder('call-1', buffer_seconds=3))
+        recorder.inbound(synthetic_pcm(1500, 16000), 16000)
+        self.writer.run_once()
+        recorder.inbound(synthetic_pcm(1000, 16000), 16000)
+        recorder.outbound(synthetic_pcm(400), 24000)
+        recorder.close()
+        self.writer.run_once()
+        self.assertEqual(self.writer.active, 0)
+
+        recording = CallRecording.objects.get(session_id='call-1')
+        self.assertIsNotNone(recording.ended_at)
+        self.assertEqual(recording.dropped_bytes, 0)
+        segments = list(recording.segments.values_list('track', 'index', 'duration_ms', 'sample_rate'))
+        self.assertEqual(segments, [
+            ('inbound', 0, 1000, 16000), ('inbound', 1, 1000, 16000), ('inbound', 2, 500, 16000),
+            ('outbound', 0, 400, 24000),
+        ])
+        segment = recording.segments.get(track='inbound', index=2)
+        with wave.open(os.path.join(self.media.name, segment.file.name)) as wav:
+            self.assertEqual((wav.getframerate(), wav.getnframes()), (16000, 8000))
+        self.assertEqual(segment.size_bytes, os.path.getsize(os.path.join(self.media.name, segment.file.name)))
+
+    @override_settings(GEMINI_API_KEY='test-key', GEMINI_POOL_SIZE=0, VOICE_RECORDING_ENABLED=True)
+    async def test_consumer_records_caller_audio(self):
+        """
+        Test that caller audio sent during a session ends up in the recording
+        """
+        upstream = FakeGeminiSocket()
+        with patch('voice_flow.gemini_pool.websockets.connect', AsyncMock(return_value=upstream)), \
+                patch('voice_flow.recording.get_recording_writer', return_value=self.writer):
+            communicator = WebsocketCommunicator(GeminiVoiceConsumer.as_asgi(), '/ws/voice/')
+            await communicator.connect()
+            await communicator.send_json_to({'type': 'setup', 'audio_transport': 'binary', 'audio_header': False,
+                                            'sample_rate': 16000})
+            ack = await communicator.receive_json_from()
+            pcm = synthetic_pcm(200, 16000)
+            for offset in range(0, len(pcm), 640):
+                await communicator.send_to(bytes_data=pcm[offset:offset + 640])
+            await communicator.disconnect()
+
+        await database_sync_to_async(self.writer.run_once)()
+        recording = await CallRecording.objects.aget(session_id=ack['session_id'])
+        segment = await recording.segments.aget()
+        self.assertEqual((segment.track, segment.duration_ms), ('inbound', 200))
+
+    @override_settings(GEMINI_API_KEY='test-key', GEMINI_POOL_SIZE=0, VOICE_RECORDING_ENABLED=True)
+    async def test_consumer_records_silence_the_vad_drops(self):
+        """
+        Test that caller audio is recorded before the VAD gate, silence included
+        """
+        upstream = FakeGeminiSocket()
+        with patch('voice_flow.gemini_pool.websockets.connect', AsyncMock(return_value=upstream)), \
+                patch('voice_flow.recording.get_recording_writer', return_value=self.writer):
+            communicator = WebsocketCommunicator(GeminiVoiceConsumer.as_asgi(), '/ws/voice/')
+            await communicator.connect()
+            await communicator.send_json_to({'type': 'setup', 'audio_transport': 'binary', 'audio_header': False,
+                                            'vad': True})
+            ack = await communicator.receive_json_from()
+            await communicator.send_to(bytes_data=bytes(2 * 16 * 600))
+            await communicator.send_to(bytes_data=make_tone(ms=200))
+            await communicator.disconnect()
+
+        forwarded = sum(len(base64.b64decode(json.loads(m)['realtimeInput']['mediaChunks'][0]['data']))
+                        for m in upstream.sent if 'mediaChunks' in m)
+        self.assertLess(forwarded, 2 * 16 * 800)
+        await database_sync_to_async(self.writer.run_once)()
+        recording = await CallRecording.objects.aget(session_id=ack['session_id'])
+        segment = await recording.segments.aget()
+        self.assertEqual((segment.track, segment.duration_ms), ('inbound', 800))
+
+    def test_ended_call_dropped_when_finalizing_fails(self):
+        """
+        Test that a recording whose finalization raises is not retried on every pass
+        """
+        recorder = self.writer.add(SessionRecorder('call-3'))
+        recorder.close()
+        with patch.object(self.writer, '_finish', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                self.writer.run_once()
+        self.assertEqual(self.writer.active, 0)
+
+
+class AppointmentListPaginationTestCase(APITestCase):
+    """
+    Test cases for keyset pagination of the appointment list
+    """
+
+    def setUp(self):
+        base = datetime(2026, 10, 1, 9, 0, tzinfo=dt_timezone.utc)
+        # Two appointments share a timestamp so the id tie-breaker is exercised
+        for index, hours in enumerate([0, 1, 1, 2, 3]):
+            appointment = Appointment.objects.create(**make_appointment_data(full_name=f'Patient {index}',
+                                                                             dob=date(1990, 1, 15)))
+            Appointment.objects.filter(pk=appointment.pk).update(created_at=base + timedelta(hours=hours))
+        self.expected = list(Appointment.objects.order_by('-created_at', 'id').values_list('full_name', flat=True))
+
+    def test_pages_follow_cursor_without_gaps(self):
+        """
+        Test that following next_cursor visits every appointment once, newest first
+        """
+        names, cursor, pages = [], None, 0
+        while True:
+            params = {'page_size': 2, **({'cursor': cursor} if cursor else {})}
+            body = self.client.get('/api/appointments/', params).json()
+            names += [row['full_name'] for row in body['data']]
+            self.assertNotIn('total', body)
+            pages += 1
+            cursor = body['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual((names, pages), (self.expected, 3))
+
+    def test_total_is_optional_and_bad_cursor_is_rejected(self):
+        """
+        Test that include_total adds the row count and a malformed cursor is a 400
+        """
+        body = self.client.get('/api/appointments/', {'page_size': 10, 'include_total': 'true'}).json()
+        self.assertEqual((body['count'], body['total'], body['next_cursor']), (5, 5, None))
+        response = self.client.get('/api/appointments/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+class AppointmentSparseFieldsTestCase(APITestCase):
+    """
+    Test cases for attachment prefetching and sparse fieldsets on the appointment API
+    """
+
+    def setUp(self):
+        for index in range(3):
+            appointment = Appointment.objects.create(**make_appointment_data(full_name=f'Patient {index}',
+                                                                             dob=date(1990, 1, 15)))
+            for name in ('card-front.png', 'card-back.png'):
+                AppointmentAttachment.objects.create(appointment=appointment, file=f'attachments/{name}',
+                                                     original_name=name, content_type='image/png', size_bytes=10)
+
+    def test_list_prefetches_attachments(self):
+        """
+        Test that the list costs one query for appointments and one for all their attachments
+        """
+        with self.assertNumQueries(2):
+            body = self.client.get('/api/appointments/').json()
+        self.assertEqual([len(row['attachments']) for row in body['data']], [2, 2, 2])
+
+    def test_summary_view_loads_only_summary_columns(self):
+        """
+        Test that view=summary returns only the dashboard columns without touching attachments
+        """
+        with self.assertNumQueries(1):
+            body = self.client.get('/api/appointments/', {'view': 'summary'}).json()
+        self.assertEqual(set(body['data'][0]), {'id', 'full_name', 'dob', 'reason_for_visit', 'visit_type', 'created_at'})
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/appointments/', {'fields': 'full_name'})
+        self.assertNotIn('medical_history', queries.captured_queries[0]['sql'])
+
+    def test_fields_and_omit_null(self):
+        """
+        Test that fields selects columns on the detail view, omit_null drops nulls and unknown names are rejected
+        """
+        appointment = Appointment.objects.first()
+        url = f'/api/appointments/{appointment.pk}/'
+        body = self.client.get(url, {'fields': 'full_name,primary_physician'}).json()
+        self.assertEqual(body['data'], {'full_name': appointment.full_name, 'primary_physician': None})
+        body = self.client.get(url, {'fields': 'full_name,primary_physician', 'omit_null': 'true'}).json()
+        self.assertEqual(body['data'], {'full_name': appointment.full_name})
+        self.assertEqual(self.client.get(url, {'fields': 'full_name,ssn'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'view': 'everything'}).status_code, 400)
+
+
+class AppointmentSearchTestCase(TestCase):
+    """
+    Test cases for full-text appointment search
+    """
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('frontdesk', password='secret', is_staff=True))
+        self.migraine = Appointment.objects.create(**make_appointment_data(
+            full_name='Maria Lopez', dob=date(1985, 3, 2), symptoms='Recurring migraine with aura',
+            email='maria@example.com', contact_number='+15550001'))
+        self.history = Appointment.objects.create(**make_appointment_data(
+            full_name='Tom Reyes', dob=date(1970, 7, 9), medical_history='Migraine as a teenager',
+            email='tom@example.com', contact_number='+15550002'))
+        self.other = Appointment.objects.create(**make_appointment_data(full_name='Ann Lee', dob=date(1990, 1, 1)))
+
+    def search(self, **params):
+        return self.client.get(reverse('voice_flow:appointment_search'), params).json()
+
+    def test_results_are_ranked_and_follow_writes(self):
+        """
+        Test that matches are ranked by field weight and the index follows updates, bulk writes and deletes
+        """
+        names = [row['full_name'] for row in self.search(q='migra', view='summary')['data']]
+        self.assertEqual(names, ['Maria Lopez', 'Tom Reyes'])
+
+        Appointment.objects.filter(pk=self.other.pk).update(reason_for_visit='Migraine follow-up')
+        self.assertIn('Ann Lee', [row['full_name'] for row in self.search(q='migraine')['data']])
+        Appointment.objects.bulk_create([Appointment(**make_appointment_data(full_name='Zoe Quinn',
+                                                                             dob=date(2000, 2, 2)))])
+        self.assertEqual([row['full_name'] for row in self.search(q='zoe')['data']], ['Zoe Quinn'])
+        self.migraine.delete()
+        self.assertNotIn('Maria Lopez', [row['full_name'] for row in self.search(q='migraine')['data']])
+
+    def test_exact_lookups_and_operators_in_query(self):
+        """
+        Test exact email/contact lookups alone and combined with q, and that FTS syntax in q is treated as text
+        """
+        self.assertEqual([row['id'] for row in self.search(email='tom@example.com')['data']], [self.history.pk])
+        self.assertEqual(self.search(q='migraine', contact_number='+15550001')['count'], 1)
+        self.assertEqual(self.search(q='migraine OR "lee" NEAR(')['count'], 0)
+        self.assertFalse(self.client.get(reverse('voice_flow:appointment_search')).json()['success'])
+
+    def test_rebuild_command_restores_dropped_triggers(self):
+        """
+        Test that the rebuild command recreates missing triggers and indexes existing rows
+        """
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER appointment_fts_insert')
+            cursor.execute("INSERT INTO appointment_fts(appointment_fts) VALUES ('delete-all')")
+        out = StringIO()
+        call_command('rebuild_appointment_search', stdout=out)
+        self.assertIn('Indexed 3 appointments', out.getvalue())
+        self.assertEqual(self.search(q='lopez')['count'], 1)
+        Appointment.objects.create(**make_appointment_data(full_name='New Patient', dob=date(1999, 9, 9)))
+        self.assertEqual(self.search(q='new patient')['count'], 1)
+
+
+@override_settings(APPOINTMENT_IMPORT_BATCH_SIZE=2)
+class AppointmentBulkImportTestCase(APITestCase):
+    """
+    Test cases for the bulk appointment import endpoint
+    """
+
+    def setUp(self):
+        self.rows = [make_appointment_data(full_name=f'Patient {index}') for index in range(5)]
+        self.rows[3] = make_appointment_data(full_name='Bad Date', dob='not-a-date')
+
+    def test_json_array_is_inserted_in_batches(self):
+        """
+        Test that valid rows are bulk-inserted per batch while invalid rows are reported by position
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/appointments/bulk/', self.rows, format='json')
+        body = response.json()
+        self.assertEqual((body['created'], body['failed']), (4, 1))
+        self.assertEqual(body['errors'][0]['row'], 3)
+        self.assertIn('dob', body['errors'][0]['errors'])
+        self.assertEqual(sorted(body['ids']), list(Appointment.objects.order_by('id').values_list('id', flat=True)))
+        inserts = [query for query in queries.captured_queries if query['sql'].startswith('INSERT INTO "appointment"')]
+        self.assertEqual(len(inserts), 3)
+
+    def test_ndjson_body_and_bad_lines(self):
+        """
+        Test that an NDJSON body is imported line by line and unparseable lines become row errors
+        """
+        lines = [json.dumps(row) for row in self.rows[:3]] + ['', '{not json', '[1, 2]']
+        response = self.client.post('/api/appointments/bulk/', data='\n'.join(lines).encode(),
+                                    content_type='application/x-ndjson')
+        body = response.json()
+        self.assertEqual((body['created'], Appointment.objects.count()), (3, 3))
+        self.assertEqual([(error['row'], error['errors']) for error in body['errors']][1], (4, 'Expected a JSON object'))
+        self.assertEqual(body['errors'][0]['row'], 3)
+
+    def test_rejects_non_array_body(self):
+        """
+        Test that a single JSON object is refused in favour of the single-row API
+        """
+        response = self.client.post('/api/appointments/bulk/', self.rows[0], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Appointment.objects.exists())
+
+
+@override_settings(APPOINTMENT_EXPORT_CHUNK_SIZE=2)
+class AppointmentExportTestCase(TestCase):
+    """
+    Test cases for the streaming appointment export
+    """
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('reports', password='secret', is_staff=True))
+        for day in range(1, 6):
+            appointment = Appointment.objects.create(**make_appointment_data(full_name=f'Patient {day}',
+                                                                             dob=date(1990, 1, day)))
+            Appointment.objects.filter(pk=appointment.pk).update(
+                created_at=datetime(2026, 10, day, 12, 0, tzinfo=dt_timezone.utc)
+            )
+            AppointmentAttachment.objects.create(appointment=appointment, file=f'attachments/{day}.pdf',
+                                                 original_name=f'{day}.pdf', content_type='application/pdf',
+                                                 size_bytes=day)
+
+    def export(self, **params):
+        response = self.client.get(reverse('voice_flow:appointment_export'), params)
+        with CaptureQueriesContext(connection) as queries:
+            content = b''.join(response.streaming_content).decode()
+        return response, content, len(queries.captured_queries)
+
+    def test_ndjson_with_attachments_in_chunked_batches(self):
+        """
+        Test that rows stream in creation order with attachments fetched once per chunk
+        """
+        response, content, query_count = self.export(include_attachments='true')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([row['full_name'] for row in rows], [f'Patient {day}' for day in range(1, 6)])
+        self.assertEqual([row['attachments'][0]['size_bytes'] for row in rows], [1, 2, 3, 4, 5])
+        # One appointment query plus one attachment query per chunk of two
+        self.assertEqual(query_count, 4)
+
+    def test_csv_with_date_range_and_fields(self):
+        """
+        Test that the CSV export honours the inclusive date range and the selected columns
+        """
+        response, content, _ = self.export(format='csv', **{'from': '2026-10-02', 'to': '2026-10-04'},
+                                           fields='full_name,dob')
+        self.assertIn('attachment; filename="appointments-', response['Content-Disposition'])
+        rows = list(csv.reader(StringIO(content)))
+        self.assertEqual(rows[0], ['id', 'full_name', 'dob'])
+        self.assertEqual([row[1:] for row in rows[1:]], [
+            ['Patient 2', '1990-01-02'], ['Patient 3', '1990-01-03'], ['Patient 4', '1990-01-04'],
+        ])
+
+    def test_csv_neutralizes_formulas(self):
+        """
+        Test that CSV values a spreadsheet would run as formulas are prefixed with a quote
+        """
+        Appointment.objects.filter(full_name='Patient 1').update(
+            full_name='=HYPERLINK("http://example.com")', reason_for_visit='@SUM(A1)', symptoms='-2+3',
+        )
+        _, content, _ = self.export(format='csv', fields='full_name,contact_number,reason_for_visit,symptoms')
+        row = list(csv.reader(StringIO(content)))[1]
+        self.assertEqual(row[1:], [
+            '\'=HYPERLINK("http://example.com")', "'+1234567890", "'@SUM(A1)", "'-2+3",
+        ])
+
+    def test_rejects_bad_parameters(self):
+        """
+        Test that unknown formats and malformed dates are refused
+        """
+        url = reverse('voice_flow:appointment_export')
+        self.assertEqual(self.client.get(url, {'format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'from': '10/02/2026'}).status_code, 400)
@@ -0,0 +1,145 @@
+"""Append-only storage of conversation transcripts.
+
+A transcript is a header row (ConversationTranscript) plus one
+TranscriptMessage row per message, numbered by `sequence`. Messages are
+only ever inserted, in bulk_create batches, and a saved transcript is
+never added to afterwards. Long message content is stored
+zlib-compressed. Readers page by sequence (keyset, so deep pages cost the
+same as the first) or stream every message without loading the whole
+transcript into memory.
+"""
+
+import zlib
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from rest_framework import serializers
+
+from voice_flow.constants import (
+    TRANSCRIPT_BULK_BATCH_SIZE,
+    TRANSCRIPT_COMPRESS_MIN_BYTES,
+    TRANSCRIPT_STREAM_CHUNK_SIZE,
+)
+from voice_flow.models import Appointment, ConversationTranscript, TranscriptMessage
+
+MESSAGE_ROLES = frozenset({'user', 'assistant', 'system'})
+
+
+def encode_content(text, min_bytes=TRANSCRIPT_COMPRESS_MIN_BYTES):
+    """
+    Return (content, content_zlib) for a message; only text of at least `min_bytes` is compressed.
+    """
+    raw = text.encode('utf-8')
+    if min_bytes is None or len(raw) < min_bytes:
+        return text, None
+    return '', zlib.compress(raw)
+
+
+def _parse_timestamp(value, label):
+    if value in (None, ''):
+        return None
+    parsed = parse_datetime(value) if isinstance(value, str) else None
+    if parsed is None:
+        raise serializers.ValidationError({label: 'Enter a valid ISO 8601 date/time.'})
+    return parsed
+
+
+def build_messages(transcript, messages, start=1):
+    """
+    Validate raw {role, content, timestamp} dicts and return unsaved TranscriptMessage rows.
+    """
+    if not isinstance(messages, list):
+        raise serializers.ValidationError({'messages': 'Expected a list of messages.'})
+    min_bytes = getattr(settings, 'TRANSCRIPT_COMPRESS_MIN_BYTES', TRANSCRIPT_COMPRESS_MIN_BYTES)
+    rows = []
+    for index, message in enumerate(messages):
+        if not isinstance(message, dict) or message.get('role') not in MESSAGE_ROLES:
+            raise serializers.ValidationError({'messages': f'Message {index} needs a role of user, assistant or system.'})
+        content, content_zlib = encode_content(str(message.get('content') or ''), min_bytes)
+        rows.append(TranscriptMessage(
+            transcript=transcript,
+            sequence=start + index,
+            role=message['role'],
+            content=content,
+            content_zlib=content_zlib,
+            timestamp=_parse_timestamp(message.get('timestamp'), f'messages[{index}].timestamp'),
+        ))
+    return rows
+
+
+def save_transcript(data, allowed_appointment_ids=()):
+    """
+    Store the `save_conversation_to_database` payload as a new transcript and return it.
+
+    `appointment_id` is only linked when it is in `allowed_appointment_ids`,
+    the appointments the caller's session created.
+    """
+    batch_size = getattr(settings, 'TRANSCRIPT_BULK_BATCH_SIZE', TRANSCRIPT_BULK_BATCH_SIZE)
+    appointment = None
+    if data.get('appointment_id'):
+        try:
+            appointment_id = int(data['appointment_id'])
+        except (TypeError, ValueError):
+            appointment_id = None
+        if appointment_id in allowed_appointment_ids:
+            appointment = Appointment.objects.filter(pk=appointment_id).first()
+        if appointment is None:
+            raise serializers.ValidationError({'appointment_id': 'Appointment not found.'})
+    started_at = _parse_timestamp(data.get('conversation_start_time'), 'conversation_start_time')
+    ended_at = _parse_timestamp(data.get('conversation_end_time'), 'conversation_end_time')
+    with transaction.atomic():
+        transcript = ConversationTranscript.objects.create(
+            appointment=appointment,
+            title=str(data.get('title') or '')[:255],
+            started_at=started_at,
+            ended_at=ended_at,
+        )
+        rows = build_messages(transcript, data.get('messages') or [])
+        TranscriptMessage.objects.bulk_create(rows, batch_size=batch_size)
+        transcript.message_count = len(rows)
+        transcript.save(update_fields=['message_count'])
+    return transcript
+
+
+def serialize_transcript(transcript):
+    return {
+        'id': transcript.pk,
+        'appointment_id': transcript.appointment_id,
+        'title': transcript.title,
+        'started_at': transcript.started_at,
+        'ended_at': transcript.ended_at,
+        'message_count': transcript.message_count,
+        'created_at': transcript.created_at,
+    }
+
+
+def serialize_message(message):
+    return {
+        'sequence': message.sequence,
+        'role': message.role,
+        'content': message.text,
+        'timestamp': message.timestamp,
+    }
+
+
+def message_page(transcript_id, after=0, limit=None):
+    """
+    Return (messages, next_after) for up to `limit` messages with sequence > `after`.
+    """
+    rows = list(
+        TranscriptMessage.objects.filter(transcript_id=transcript_id, sequence__gt=after)
+        .order_by('sequence')[:limit + 1]
+    )
+    next_after = rows[limit - 1].sequence if len(rows) > limit else None
+    return [serialize_message(row) for row in rows[:limit]], next_after
+
+
+def iter_messages(transcript_id):
+    """
+    Yield every message of a transcript in order, fetching from the database in chunks.
+    """
+    chunk_size = getattr(settings, 'TRANSCRIPT_STREAM_CHUNK_SIZE', TRANSCRIPT_STREAM_CHUNK_SIZE)
+    queryset = TranscriptMessage.objects.filter(transcript_id=transcript_id).order_by('sequence')
+    for row in queryset.iterator(chunk_size=chunk_size):
+        yield serialize_message(row)
@@ -0,0 +1,227 @@
+"""Per-session sender that batches capture audio on its way to Gemini."""
+
+import asyncio
+import collections
+import logging
+
+from voice_flow.audio import build_realtime_audio_payload
+from voice_flow.constants import (
+    GEMINI_AUDIO_CONFIG,
+    GEMINI_UPSTREAM_FRAME_MS,
+    GEMINI_UPSTREAM_QUEUE_SIZE,
+    GEMINI_UPSTREAM_QUEUE_POLICY,
+)
+
+logger = logging.getLogger(__name__)
+
+QUEUE_POLICY_BLOCK = 'block'
+QUEUE_POLICY_DROP_OLDEST = 'drop_oldest'
+QUEUE_POLICY_DROP_NEWEST = 'drop_newest'
+QUEUE_POLICIES = (QUEUE_POLICY_BLOCK, QUEUE_POLICY_DROP_OLDEST, QUEUE_POLICY_DROP_NEWEST)
+
+_AUDIO = 'audio'
+_MESSAGE = 'message'
+_STOP = 'stop'
+
+
+class UpstreamAudioSender:
+    """
+    Bounded queue plus a background task that owns all writes to Gemini.
+
+    Adjacent audio chunks with the same mime type are merged until a frame
+    of `frame_ms` is reached or the frame has waited `frame_ms`. Any other
+    message (text input, inputComplete) flushes pending audio first, so the
+    upstream order matches the order the browser sent things in. Only audio
+    counts towards the queue limit; control messages are never dropped.
+    """
+
+    def __init__(self, send, on_error=None, frame_ms=GEMINI_UPSTREAM_FRAME_MS,
+                 max_queue=GEMINI_UPSTREAM_QUEUE_SIZE, policy=GEMINI_UPSTREAM_QUEUE_POLICY):
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f'Unknown upstream queue policy: {policy}')
+        self._send = send
+        self._on_error = on_error
+        self.frame_ms = frame_ms
+        self.max_queue = max(1, int(max_queue))
+        self.policy = policy
+
+        self._items = collections.deque()
+        self._queued_audio = 0
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Event()
+        self._space.set()
+        self._task = None
+
+        self._pending = bytearray()
+        self._pending_mime = None
+        self._pending_frame_bytes = 0
+        self._deadline = None
+
+        self.dropped_chunks = 0
+        self.frames_sent = 0
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def enqueue_audio(self, pcm, mime_type, sample_rate=None, channels=None):
+        """
+        Queue raw PCM16 for upstream delivery, applying the queue policy when full.
+        Returns False when the chunk was dropped.
+        """
+        self._ensure_started()
+        while self._queued_audio >= self.max_queue:
+            if self.policy == QUEUE_POLICY_DROP_NEWEST:
+                self.dropped_chunks += 1
+                logger.debug("Upstream queue full, dropped newest audio chunk", extra={'dropped_chunks': self.dropped_chunks})
+                return False
+            if self.policy == QUEUE_POLICY_DROP_OLDEST and self._drop_oldest_audio():
+                break
+            self._space.clear()
+            await self._space.wait()
+        rate = int(sample_rate or GEMINI_AUDIO_CONFIG["sample_rate"])
+        channels = int(channels or GEMINI_AUDIO_CONFIG["channels"])
+        frame_bytes = max(2, rate * channels * 2 * self.frame_ms // 1000)
+        self._items.append((_AUDIO, bytes(pcm), mime_type, frame_bytes))
+        self._queued_audio += 1
+        self._wakeup.set()
+        return True
+
+    async def enqueue_message(self, payload, label='message'):
+        """
+        Queue an already serialized upstream message behind any pending audio.
+        """
+        self._ensure_started()
+        self._items.append((_MESSAGE, payload, label, None))
+        self._wakeup.set()
+
+    async def close(self, timeout=1.0):
+        """
+        Flush whatever is queued and stop the sender task.
+        """
+        if self._task is None:
+            return
+        if not self._task.done():
+            self._items.append((_STOP, None, None, None))
+            self._wakeup.set()
+            try:
+                await asyncio.wait_for(asyncio.shield(self._task), timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                self._task.cancel()
+        self._task = None
+
+    def _drop_oldest_audio(self):
+        for index, item in enumerate(self._items):
+            if item[0] == _AUDIO:
+                del self._items[index]
+                self._queued_audio -= 1
+                self.dropped_chunks += 1
+                logger.debug("Upstream queue full, dropped oldest audio chunk", extra={'dropped_chunks': self.dropped_chunks})
+                return True
+        return False
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._items:
+                self._wakeup.clear()
+                timeout = None
+                if self._pending:
+                    timeout = max(0.0, self._deadline - loop.time())
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    await self._flush()
+                    continue
+
+            while self._items:
+                kind, payload, meta, frame_bytes = self._items.popleft()
+                if kind == _AUDIO:
+                    self._queued_audio -= 1
+                    self._space.set()
+                    if self._pending and meta != self._pending_mime:
+                        await self._flush()
+                    if not self._pending:
+                        self._pending_mime = meta
+                        self._pending_frame_bytes = frame_bytes
+                        self._deadline = loop.time() + self.frame_ms / 1000
+                    self._pending += payload
+                    if len(self._pending) >= self._pending_frame_bytes:
+                        await self._flush()
+                elif kind == _MESSAGE:
+                    await self._flush()
+                    await self._deliver(payload, meta)
+                else:
+                    await self._flush()
+                    return
+
+    async def _flush(self):
+        if not self._pending:
+            return
+        payload = build_realtime_audio_payload(self._pending, self._pending_mime)
+        self._pending = bytearray()
+        self._deadline = None
+        if await self._deliver(payload, 'audio chunk'):
+            self.frames_sent += 1
+
+    async def _deliver(self, payload, label):
+        try:
+            await self._send(payload)
+            return True
+        except Exception as e:
+            logger.warning("Upstream send failed (%s): %s", label, e)
+            if self._on_error:
+                await self._on_error(label, e)
+            return False
+
+
+class ReconnectBuffer:
+    """
+    Bounded ring of upstream input held while the Gemini socket is re-established.
+
+    Audio beyond `max_audio_bytes` evicts the oldest audio; control messages
+    (text input, inputComplete) are always kept so the turn structure
+    survives the reconnect.
+    """
+
+    def __init__(self, max_audio_bytes):
+        self.max_audio_bytes = max(0, int(max_audio_bytes))
+        self._items = collections.deque()
+        self._audio_bytes = 0
+        self.dropped_bytes = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def add_audio(self, pcm, mime_type, sample_rate):
+        pcm = bytes(pcm)
+        self._items.append((_AUDIO, pcm, mime_type, sample_rate))
+        self._audio_bytes += len(pcm)
+        while self._audio_bytes > self.max_audio_bytes:
+            if not self._evict_oldest_audio():
+                break
+
+    def add_message(self, payload, label):
+        self._items.append((_MESSAGE, payload, label, None))
+
+    async def replay_into(self, sender):
+        """
+        Move everything buffered into an UpstreamAudioSender, in arrival order.
+        """
+        items = list(self._items)
+        self._items.clear()
+        self._audio_bytes = 0
+        for kind, payload, meta, sample_rate in items:
+            if kind == _AUDIO:
+                await sender.enqueue_audio(payload, meta, sample_rate)
+            else:
+                await sender.enqueue_message(payload, meta)
+
+    def _evict_oldest_audio(self):
+        for index, item in enumerate(self._items):
+            if item[0] == _AUDIO:
+                del self._items[index]
+                self._audio_bytes -= len(item[1])
+                self.dropped_bytes += len(item[1])
+                return True
+        return False
@@ -10,7 +10,15 @@ urlpatterns = [
     path('save/', views.save_voice_flow, name='save_voice_flow'),
     path('clear-voice-flow-session/', views.clear_voice_flow_session, name='clear_voice_flow_session'),
     path('api/appointments/', views.AppointmentAPIView.as_view(), name='appointment_api'),
+    path('api/appointments/bulk/', views.AppointmentBulkImportAPIView.as_view(), name='appointment_bulk_import'),
     path('api/appointments/<int:appointment_id>/', views.AppointmentAPIView.as_view(), name='appointment_detail'),
     path('api/appointments/<int:appointment_id>/attachments/', views.AppointmentAttachmentAPIView.as_view(), name='appointment_attachments'),
     path('api/upload/', views.upload_document, name='upload_document'),
+    path('api/admin/voice-metrics/', views.voice_metrics, name='voice_metrics'),
+    path('api/admin/voice-sessions/', views.voice_sessions, name='voice_sessions'),
+    path('api/admin/drafts/', views.appointment_drafts, name='appointment_drafts'),
+    path('api/admin/appointments/search/', views.appointment_search, name='appointment_search'),
+    path('api/admin/appointments/export/', views.appointment_export, name='appointment_export'),
+    path('api/admin/transcripts/<int:transcript_id>/', views.conversation_transcript, name='conversation_transcript'),
+    path('api/admin/drafts/<str:session_id>/promote/', views.promote_appointment_draft, name='promote_appointment_draft'),
 ]
@@ -71,6 +71,26 @@ def format_serializer_errors(serializer_errors):
     
     return formatted_errors
 
+# Session key holding the ids of the appointments this browser session created
+SESSION_APPOINTMENTS_KEY = 'voice_flow_appointment_ids'
+SESSION_APPOINTMENTS_LIMIT = 20
+
+
+def remember_appointment(session, appointment_id):
+    """
+    Record that `session` created the appointment, so it may attach its transcript later.
+    """
+    ids = [pk for pk in session.get(SESSION_APPOINTMENTS_KEY, []) if pk != appointment_id]
+    session[SESSION_APPOINTMENTS_KEY] = (ids + [appointment_id])[-SESSION_APPOINTMENTS_LIMIT:]
+
+
+def session_appointment_ids(session):
+    """
+    Ids of the appointments created by `session`.
+    """
+    return frozenset(session.get(SESSION_APPOINTMENTS_KEY, ()))
+
+
 def try_except_wrapper(func):
     """
     Decorator that wraps a function in a try-except block and returns a tuple of (result, error).
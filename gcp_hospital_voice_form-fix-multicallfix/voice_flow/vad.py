@@ -0,0 +1,143 @@
+"""Energy / zero-crossing voice activity detection for upstream PCM16 audio."""
+
+import collections
+
+import numpy as np
+
+from voice_flow.constants import (
+    GEMINI_VAD_FRAME_MS,
+    GEMINI_VAD_THRESHOLD_DBFS,
+    GEMINI_VAD_MAX_ZCR,
+    GEMINI_VAD_HANGOVER_MS,
+    GEMINI_VAD_PREROLL_MS,
+    GEMINI_VAD_END_OF_TURN_MS,
+    GEMINI_VAD_SILENCE_KEEPALIVE_MS,
+)
+
+
+# Frames this much louder than the threshold count as speech whatever their ZCR
+_LOUD_MARGIN_DB = 15.0
+_FULL_SCALE = 32768.0
+
+
+def frame_features(pcm, frame_samples):
+    """
+    Return per-frame (energy_dbfs, zero_crossing_rate) arrays for whole frames in `pcm`.
+    """
+    samples = np.frombuffer(pcm, dtype='<i2')
+    n_frames = len(samples) // frame_samples
+    frames = samples[:n_frames * frame_samples].reshape(n_frames, frame_samples).astype(np.float32)
+    power = np.mean(np.square(frames / _FULL_SCALE), axis=1)
+    energy_dbfs = 10.0 * np.log10(np.maximum(power, 1e-10))
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / float(frame_samples - 1)
+    return energy_dbfs, zcr
+
+
+class VADResult:
+    __slots__ = ('audio', 'end_of_turn', 'speech')
+
+    def __init__(self, audio, end_of_turn, speech):
+        self.audio = audio
+        self.end_of_turn = end_of_turn
+        self.speech = speech
+
+
+class VoiceActivityDetector:
+    """
+    Gate a PCM16 mono stream so that mostly speech reaches Gemini.
+
+    Frames are classified in bulk with NumPy. A frame is speech when its
+    energy is above `threshold_dbfs` and its zero-crossing rate is below
+    `max_zcr` (hiss), or when it is very loud. Speech opens the gate and
+    the preceding `preroll_ms` of audio is sent first so word onsets are not
+    clipped; the gate stays open for `hangover_ms` after the last speech
+    frame. While closed, one frame per `silence_keepalive_ms` is still
+    forwarded (0 drops all silence). After `end_of_turn_ms` of trailing
+    silence following speech, the result reports end_of_turn once.
+    """
+
+    def __init__(self, sample_rate, frame_ms=GEMINI_VAD_FRAME_MS, threshold_dbfs=GEMINI_VAD_THRESHOLD_DBFS,
+                 max_zcr=GEMINI_VAD_MAX_ZCR, hangover_ms=GEMINI_VAD_HANGOVER_MS, preroll_ms=GEMINI_VAD_PREROLL_MS,
+                 end_of_turn_ms=GEMINI_VAD_END_OF_TURN_MS, silence_keepalive_ms=GEMINI_VAD_SILENCE_KEEPALIVE_MS):
+        self.sample_rate = int(sample_rate)
+        self.frame_ms = frame_ms
+        self.frame_samples = max(2, self.sample_rate * frame_ms // 1000)
+        self.frame_bytes = self.frame_samples * 2
+        self.threshold_dbfs = threshold_dbfs
+        self.max_zcr = max_zcr
+        self.hangover_frames = self._frames(hangover_ms)
+        self.end_of_turn_frames = self._frames(end_of_turn_ms) if end_of_turn_ms else 0
+        self.keepalive_frames = self._frames(silence_keepalive_ms) if silence_keepalive_ms else 0
+        self._preroll = collections.deque(maxlen=self._frames(preroll_ms))
+        self._remainder = b''
+        self._in_speech = False
+        self._turn_active = False
+        self._hangover_left = 0
+        self._silent_frames = 0
+        self._since_keepalive = 0
+        self.frames_in = 0
+        self.frames_sent = 0
+
+    def _frames(self, ms):
+        return max(0, int(round(ms / self.frame_ms)))
+
+    def process(self, pcm):
+        """
+        Feed PCM16 bytes; return a VADResult with the audio to forward.
+
+        Bytes that do not fill a whole frame are held until the next call.
+        A trailing odd byte is dropped so later samples stay aligned.
+        """
+        pcm = bytes(pcm)
+        if len(pcm) % 2:
+            pcm = pcm[:-1]
+        data = self._remainder + pcm if self._remainder else pcm
+        usable = len(data) - len(data) % self.frame_bytes
+        self._remainder = data[usable:]
+        if not usable:
+            return VADResult(b'', False, self._in_speech)
+
+        energy, zcr = frame_features(data[:usable], self.frame_samples)
+        speech = (energy >= self.threshold_dbfs) & (
+            (zcr <= self.max_zcr) | (energy >= self.threshold_dbfs + _LOUD_MARGIN_DB)
+        )
+
+        out = []
+        end_of_turn = False
+        frame_bytes = self.frame_bytes
+        for index, is_speech in enumerate(speech.tolist()):
+            frame = data[index * frame_bytes:(index + 1) * frame_bytes]
+            self.frames_in += 1
+            if is_speech:
+                if not self._in_speech:
+                    out.extend(self._preroll)
+                    self._preroll.clear()
+                self._in_speech = True
+                self._turn_active = True
+                self._hangover_left = self.hangover_frames
+                self._silent_frames = 0
+                out.append(frame)
+                continue
+
+            self._silent_frames += 1
+            if self._in_speech and self._hangover_left > 0:
+                self._hangover_left -= 1
+                out.append(frame)
+                continue
+            self._in_speech = False
+
+            if self._turn_active and self.end_of_turn_frames and self._silent_frames >= self.end_of_turn_frames:
+                self._turn_active = False
+                end_of_turn = True
+
+            if self.keepalive_frames:
+                self._since_keepalive += 1
+                if self._since_keepalive >= self.keepalive_frames:
+                    self._since_keepalive = 0
+                    out.append(frame)
+                    continue
+            self._preroll.append(frame)
+
+        self.frames_sent += len(out)
+        return VADResult(b''.join(out), end_of_turn, self._in_speech)
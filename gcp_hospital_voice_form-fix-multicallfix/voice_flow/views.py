@@ -1,30 +1,52 @@
-import json
 import os
-import traceback
+import datetime
 import logging
 import uuid
 
 import requests
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.views import View
 from django.utils.decorators import method_decorator
 from django.conf import settings
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.core.files.storage import default_storage
+from django.db import NotSupportedError
 from rest_framework import serializers, status
+from rest_framework.exceptions import ParseError
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
+from rest_framework.utils.encoders import JSONEncoder
 
 from voice_flow.utils import (
+    SESSION_APPOINTMENTS_KEY,
     get_initial_checklist_data,
-    format_serializer_errors
+    format_serializer_errors,
+    remember_appointment,
+    session_appointment_ids,
+)
+from voice_flow import export, jsoncodec, metrics, search, sessions, transcripts
+from voice_flow.constants import (
+    APPOINTMENT_MAX_PAGE_SIZE,
+    APPOINTMENT_PAGE_SIZE,
+    APPOINTMENT_SEARCH_LIMIT,
+    TRANSCRIPT_MAX_PAGE_SIZE,
+    TRANSCRIPT_PAGE_SIZE,
+)
+from voice_flow.bulk_import import import_appointments, iter_ndjson
+from voice_flow.pagination import keyset_page
+from voice_flow.drafts import load_draft, promote_draft
+from voice_flow.models import Appointment, AppointmentAttachment, AppointmentDraft, ConversationTranscript
+from voice_flow.serializers import (
+    AppointmentSerializer,
+    AppointmentAttachmentSerializer,
+    appointment_queryset,
+    select_appointment_fields,
 )
-from voice_flow.models import Appointment, AppointmentAttachment
-from voice_flow.serializers import AppointmentSerializer, AppointmentAttachmentSerializer
 
 logger = logging.getLogger(__name__)
 
@@ -55,6 +77,8 @@ def voice_flow_conversation(request):
     Renders the voice flow conversation page.
     """
     context = get_context_data(request)
+    # A non-empty session gets a cookie, which the voice websocket then shares
+    request.session.setdefault(SESSION_APPOINTMENTS_KEY, [])
     return render(request, 'voice_flow/conversation.html', context)
 
 
@@ -83,28 +107,201 @@ def clear_voice_flow_session(request):
         logger.error(f"Error clearing session: {e}")
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
+@staff_member_required
+def voice_metrics(request):
+    """
+    Returns this worker's voice session latency histograms (staff only).
+    """
+    return JsonResponse(metrics.snapshot())
+
+
+@staff_member_required
+async def voice_sessions(request):
+    """
+    Returns the live voice sessions in the registry and the worker owning each (staff only).
+    """
+    entries = await sessions.get_session_registry().list()
+    return JsonResponse({'worker': sessions.WORKER_ID, 'sessions': entries})
+
+
+@staff_member_required
+def appointment_drafts(request):
+    """
+    Returns the in-progress intake drafts left by live or interrupted calls (staff only).
+    """
+    drafts = AppointmentDraft.objects.filter(status=AppointmentDraft.STATUS_IN_PROGRESS).values(
+        'session_id', 'fields', 'created_at', 'updated_at'
+    )
+    return JsonResponse({'drafts': list(drafts)})
+
+
+@staff_member_required
+@require_POST
+def promote_appointment_draft(request, session_id):
+    """
+    Finish an interrupted call: create the Appointment from its draft plus any corrections in the body.
+    """
+    draft = load_draft(session_id)
+    if draft is None:
+        return JsonResponse({'success': False, 'message': 'Draft not found'}, status=404)
+    try:
+        corrections = jsoncodec.loads(request.body) if request.body else {}
+    except jsoncodec.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    fields = corrections.get('fields') if isinstance(corrections, dict) else None
+    if not isinstance(corrections, dict) or (fields is not None and not isinstance(fields, dict)):
+        return JsonResponse({'error': 'Expected a JSON object with an optional "fields" object'}, status=400)
+    result = promote_draft(draft, fields)
+    return JsonResponse(result, status=201 if result['success'] else 400)
+
+
+@staff_member_required
+def appointment_search(request):
+    """
+    Search appointments (staff only).
+
+    `?q=` is matched against name, reason for visit, symptoms and medical
+    history through the FTS5 index and results come back best match first.
+    `?email=` and `?contact_number=` are exact lookups and can be combined
+    with `q`. `?fields=` / `?view=summary` / `?omit_null=true` work as on the
+    appointments API.
+    """
+    query = request.GET.get('q', '').strip()
+    exact = {name: request.GET[name].strip() for name in ('email', 'contact_number') if request.GET.get(name)}
+    if not query and not exact:
+        return JsonResponse({'success': False, 'message': 'Provide q, email or contact_number'}, status=400)
+    try:
+        fields = select_appointment_fields(request.GET.get('fields'), request.GET.get('view'))
+    except serializers.ValidationError as validation_error:
+        return JsonResponse({'success': False, 'errors': format_serializer_errors(validation_error.detail)}, status=400)
+
+    limit = getattr(settings, 'APPOINTMENT_SEARCH_LIMIT', APPOINTMENT_SEARCH_LIMIT)
+    queryset = appointment_queryset(fields).filter(**exact)
+    if query:
+        try:
+            ranked_ids = search.search_appointment_ids(query, limit)
+        except NotSupportedError as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=501)
+        by_id = queryset.in_bulk(ranked_ids)
+        appointments = [by_id[pk] for pk in ranked_ids if pk in by_id]
+    else:
+        appointments = list(queryset.order_by('-created_at', 'id')[:limit])
+
+    data = AppointmentSerializer(
+        appointments, many=True, fields=fields, omit_null=request.GET.get('omit_null') in ('1', 'true'),
+        context={'request': request},
+    ).data
+    return JsonResponse({'success': True, 'data': data, 'count': len(data)})
+
+
+@staff_member_required
+def appointment_export(request):
+    """
+    Stream every appointment as NDJSON (default) or CSV (`?format=csv`) (staff only).
+
+    `?from=YYYY-MM-DD` and `?to=YYYY-MM-DD` limit the creation date
+    (inclusive), `?fields=` limits the columns and
+    `?include_attachments=true` adds attachment metadata to each row.
+    Memory use does not grow with the number of rows.
+    """
+    export_format = request.GET.get('format', 'ndjson')
+    if export_format not in export.EXPORT_FORMATS:
+        return JsonResponse({'success': False, 'message': f'Unknown format: {export_format}'}, status=400)
+    try:
+        created_from, created_to = (
+            datetime.date.fromisoformat(request.GET[name]) if request.GET.get(name) else None for name in ('from', 'to')
+        )
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'from and to must be YYYY-MM-DD dates'}, status=400)
+    try:
+        fields = select_appointment_fields(request.GET.get('fields'))
+    except serializers.ValidationError as validation_error:
+        return JsonResponse({'success': False, 'errors': format_serializer_errors(validation_error.detail)}, status=400)
+
+    include_attachments = request.GET.get('include_attachments') in ('1', 'true')
+    columns = export.export_columns(fields)
+    rows = export.iter_appointments(
+        export.export_queryset(created_from, created_to), columns, include_attachments=include_attachments
+    )
+    if export_format == 'csv':
+        lines = export.csv_lines(rows, columns + (['attachments'] if include_attachments else []))
+    else:
+        lines = export.ndjson_lines(rows)
+    response = StreamingHttpResponse(lines, content_type=export.EXPORT_FORMATS[export_format])
+    filename = f"appointments-{datetime.date.today():%Y%m%d}.{export_format}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@staff_member_required
+def conversation_transcript(request, transcript_id):
+    """
+    Returns a saved transcript for audits (staff only).
+
+    Messages are paged by sequence: `?after=<sequence>&limit=<n>`, with
+    `next_after` set while more remain. `?stream=1` instead streams every
+    message as newline-delimited JSON.
+    """
+    transcript = ConversationTranscript.objects.filter(pk=transcript_id).first()
+    if transcript is None:
+        return JsonResponse({'error': 'Transcript not found'}, status=404)
+
+    if request.GET.get('stream') in ('1', 'true'):
+        encoder = JSONEncoder()
+        lines = (
+            jsoncodec.dumps_bytes(message, default=encoder.default) + b'\n'
+            for message in transcripts.iter_messages(transcript.pk)
+        )
+        response = StreamingHttpResponse(lines, content_type='application/x-ndjson')
+        response['X-Message-Count'] = str(transcript.message_count)
+        return response
+
+    try:
+        after = int(request.GET.get('after', 0))
+        limit = int(request.GET.get('limit', getattr(settings, 'TRANSCRIPT_PAGE_SIZE', TRANSCRIPT_PAGE_SIZE)))
+    except ValueError:
+        return JsonResponse({'error': 'after and limit must be integers'}, status=400)
+    limit = max(1, min(limit, getattr(settings, 'TRANSCRIPT_MAX_PAGE_SIZE', TRANSCRIPT_MAX_PAGE_SIZE)))
+    messages, next_after = transcripts.message_page(transcript.pk, after=after, limit=limit)
+    return JsonResponse({
+        'transcript': transcripts.serialize_transcript(transcript),
+        'messages': messages,
+        'next_after': next_after,
+    })
+
+
 @csrf_exempt
 @require_POST
 def save_voice_flow(request):
     try:        
-        data = json.loads(request.body)
+        data = jsoncodec.loads(request.body)
         action = data.get('action')
         
         if action == 'save_voice_flow':
             return JsonResponse({'success': True, 'message': 'Details saved successfully.'})
 
+        elif action == 'save_conversation_to_database':
+            transcript = transcripts.save_transcript(
+                data, allowed_appointment_ids=session_appointment_ids(request.session)
+            )
+            return JsonResponse({
+                'success': True,
+                'message': 'Conversation saved successfully.',
+                'transcript_id': transcript.pk,
+                'message_count': transcript.message_count,
+            })
+
         else:
             return JsonResponse({'error': 'Invalid action'}, status=400)
 
-    except json.JSONDecodeError:
+    except jsoncodec.JSONDecodeError:
         return JsonResponse({'error': 'Invalid JSON'}, status=400)
     
     except serializers.ValidationError as validation_error:
         return JsonResponse({'error': format_serializer_errors(validation_error.detail)}, status=400)
     
     except Exception as e:
-        logger.error(f"Error processing AI action '{action}': {e}")
-        traceback.print_exc()
+        logger.exception(f"Error processing AI action '{action}': {e}")
         return JsonResponse({'error': str(e)}, status=500)
 
 
@@ -173,6 +370,7 @@ class AppointmentAPIView(APIView):
             serializer = AppointmentSerializer(data=request.data)
             if serializer.is_valid():
                 appointment = serializer.save()
+                remember_appointment(request.session, appointment.pk)
                 return Response({
                     'success': True,
                     'message': 'Appointment created successfully',
@@ -194,14 +392,35 @@ class AppointmentAPIView(APIView):
     
     def get(self, request, appointment_id=None):
         """
-        Get appointments - either all appointments or a specific one by ID.
+        Get appointments - either a page of appointments or a specific one by ID.
+
+        The list is keyset-paginated on (-created_at, id): pass `next_cursor`
+        from a response as `?cursor=` to get the following page, and
+        `?page_size=` to change the page length. `?include_total=true` adds
+        the total row count, which costs a COUNT over the table.
+
+        Both forms accept `?fields=a,b` or `?view=summary` to return (and
+        load) only those columns, and `?omit_null=true` to drop null values.
         """
         try:
+            try:
+                fields = select_appointment_fields(request.query_params.get('fields'), request.query_params.get('view'))
+            except serializers.ValidationError as validation_error:
+                return Response({
+                    'success': False,
+                    'message': 'Validation failed',
+                    'errors': format_serializer_errors(validation_error.detail)
+                }, status=status.HTTP_400_BAD_REQUEST)
+            options = {
+                'fields': fields,
+                'omit_null': request.query_params.get('omit_null') in ('1', 'true'),
+                'context': {'request': request},
+            }
             if appointment_id:
                 # Get specific appointment by ID
                 try:
-                    appointment = Appointment.objects.get(id=appointment_id)
-                    serializer = AppointmentSerializer(appointment, context={'request': request})
+                    appointment = appointment_queryset(fields).get(id=appointment_id)
+                    serializer = AppointmentSerializer(appointment, **options)
                     return Response({
                         'success': True,
                         'message': 'Appointment retrieved successfully',
@@ -213,15 +432,29 @@ class AppointmentAPIView(APIView):
                         'message': 'Appointment not found'
                     }, status=status.HTTP_404_NOT_FOUND)
             else:
-                appointments = Appointment.objects.all()
-                serializer = AppointmentSerializer(appointments, many=True, context={'request': request})
-                
-                return Response({
+                default_size = getattr(settings, 'APPOINTMENT_PAGE_SIZE', APPOINTMENT_PAGE_SIZE)
+                max_size = getattr(settings, 'APPOINTMENT_MAX_PAGE_SIZE', APPOINTMENT_MAX_PAGE_SIZE)
+                try:
+                    page_size = max(1, min(int(request.query_params.get('page_size', default_size)), max_size))
+                    appointments, next_cursor = keyset_page(
+                        appointment_queryset(fields), page_size, request.query_params.get('cursor')
+                    )
+                except ValueError:
+                    return Response({
+                        'success': False,
+                        'message': 'Invalid page_size or cursor'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+                data = AppointmentSerializer(appointments, many=True, **options).data
+                response = {
                     'success': True,
-                    'message': f'Retrieved {len(serializer.data)} appointments',
-                    'data': serializer.data,
-                    'count': len(serializer.data)
-                }, status=status.HTTP_200_OK)
+                    'message': f'Retrieved {len(data)} appointments',
+                    'data': data,
+                    'count': len(data),
+                    'next_cursor': next_cursor,
+                }
+                if request.query_params.get('include_total') in ('1', 'true'):
+                    response['total'] = Appointment.objects.count()
+                return Response(response, status=status.HTTP_200_OK)
                 
         except Exception as e:
             logger.error(f"Error retrieving appointments: {e}")
@@ -232,6 +465,51 @@ class AppointmentAPIView(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class AppointmentBulkImportAPIView(APIView):
+    """
+    API View for importing many appointments in one request.
+
+    The body is a JSON array of appointments, or NDJSON (one appointment per
+    line, Content-Type: application/x-ndjson) which is read as it streams in.
+    Rows are validated and inserted in batches; invalid rows are reported by
+    their 0-based position and do not stop the import.
+    """
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        try:
+            if request.content_type.startswith(('application/x-ndjson', 'application/jsonl')):
+                rows = iter_ndjson(request.stream or ())
+            else:
+                rows = request.data
+                if not isinstance(rows, list):
+                    return Response({
+                        'success': False,
+                        'message': 'Expected a JSON array of appointments or an NDJSON body'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+            result = import_appointments(rows)
+            return Response({
+                'success': not result['errors'],
+                'message': f"Imported {result['created']} of {result['total']} appointments",
+                'created': result['created'],
+                'failed': len(result['errors']),
+                'ids': result['ids'],
+                'errors': result['errors'],
+            }, status=status.HTTP_200_OK)
+        except ParseError as e:
+            return Response({
+                'success': False,
+                'message': f'Invalid JSON: {e.detail}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Error importing appointments: {e}")
+            return Response({
+                'success': False,
+                'message': 'Internal server error',
+                'error': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class AppointmentAttachmentAPIView(APIView):
     permission_classes = [AllowAny]
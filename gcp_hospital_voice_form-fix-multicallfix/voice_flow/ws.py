@@ -1,12 +1,83 @@
 import asyncio
-import json
-import websockets
+import base64
+import binascii
+import logging
+import math
+import random
+import re
 
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from django.conf import settings
 
-from voice_flow.constants import GEMINI_WS_URL, GEMINI_API_KEY, GEMINI_MODEL, GEMINI_AUDIO_CONFIG
+from voice_flow import jsoncodec, metrics, sessions
+from voice_flow.admission import AdmissionRejected, get_admission_controller
+from voice_flow.audio_codecs import CODEC_PCM16, get_decoder, get_encoder
+from voice_flow.audio import AUDIO_FRAME_HEADER, parse_audio_frame, pcm_mime_type, sample_rate_from_mime
+from voice_flow.drafts import get_draft_writer, load_draft
+from voice_flow.constants import (
+    GEMINI_API_KEY,
+    GEMINI_MODEL,
+    GEMINI_AUDIO_CONFIG,
+    GEMINI_UPSTREAM_FRAME_MS,
+    GEMINI_UPSTREAM_QUEUE_SIZE,
+    GEMINI_UPSTREAM_QUEUE_POLICY,
+    GEMINI_SPECULATIVE_CONNECT,
+    GEMINI_SETUP_PROFILE,
+    GEMINI_VAD_ENABLED,
+    GEMINI_VAD_FRAME_MS,
+    GEMINI_VAD_THRESHOLD_DBFS,
+    GEMINI_VAD_MAX_ZCR,
+    GEMINI_VAD_HANGOVER_MS,
+    GEMINI_VAD_PREROLL_MS,
+    GEMINI_VAD_END_OF_TURN_MS,
+    GEMINI_VAD_SILENCE_KEEPALIVE_MS,
+    GEMINI_RESAMPLER_TAPS_PER_PHASE,
+    GEMINI_INPUT_SAMPLE_RATES,
+    GEMINI_AUDIO_CODECS,
+    GEMINI_RECONNECT_ATTEMPTS,
+    GEMINI_RECONNECT_BACKOFF_SECONDS,
+    GEMINI_RECONNECT_BACKOFF_MAX_SECONDS,
+    GEMINI_RECONNECT_BUFFER_MS,
+    VOICE_RECORDING_ENABLED,
+    VOICE_SESSION_TTL_SECONDS,
+)
+from voice_flow.gemini_pool import get_gemini_pool, is_connection_open
+from voice_flow.intake import IntakeState
+from voice_flow.recording import start_recording
+from voice_flow.gemini_protocol import (
+    MESSAGE_CONTENT_PARTS,
+    MESSAGE_ERROR,
+    MESSAGE_SERVER_CONTENT,
+    MESSAGE_TOOL_CALL,
+    PART_AUDIO,
+    PART_EXECUTABLE_CODE,
+    PART_FUNCTION_CALL,
+    PART_TEXT,
+    classify_message,
+    classify_part,
+    first_of,
+    is_permanent_close,
+    is_quota_close,
+    is_quota_error,
+    is_turn_complete,
+    model_turn_parts,
+)
+from voice_flow.resample import PolyphaseResampler
+from voice_flow.setup_profiles import get_setup_profile
+from voice_flow.upstream import ReconnectBuffer, UpstreamAudioSender
+from voice_flow.utils import remember_appointment
+from voice_flow.vad import VoiceActivityDetector
 
+logger = logging.getLogger(__name__)
+# Per-category loggers so setup and tool-call chatter can be sampled separately
+setup_logger = logging.getLogger(__name__ + '.setup')
+tool_logger = logging.getLogger(__name__ + '.tools')
+
+# save_patient_field(field_name="...", value="...") calls inside executable code parts
+SAVE_PATIENT_FIELD_RE = re.compile(
+    r"save_patient_field\s*\(\s*field_name\s*=\s*['\"]([^'\"]+)['\"]\s*,\s*value\s*=\s*['\"]([^'\"]+)['\"]\s*\)"
+)
 
 
 class GeminiVoiceConsumer(AsyncWebsocketConsumer):
@@ -16,21 +87,98 @@ class GeminiVoiceConsumer(AsyncWebsocketConsumer):
         self.gemini_task = None
         self.playback_task = None
         self.model = None
+        self.setup_profile = None
         self.is_disconnected = False  # Track connection state
+        # Audio transport negotiated in the setup message ('json' or 'binary')
+        self.audio_transport = 'json'
+        self.audio_frame_header = False
+        self.input_sample_rate = GEMINI_AUDIO_CONFIG["sample_rate"]
+        self.last_audio_sequence = None
+        # Capture at any other rate is resampled to the rate Gemini is configured for
+        self.upstream_sample_rate = getattr(settings, 'GEMINI_AUDIO_CONFIG', GEMINI_AUDIO_CONFIG)["sample_rate"]
+        self.resampler = None
+        self.rejected_sample_rates = set()
+        # Codec of binary capture frames, negotiated in setup
+        self.input_codec = CODEC_PCM16
+        self.decode_input = get_decoder(CODEC_PCM16)
+        # Model audio is relayed as JSON/base64 unless the client asks for binary frames
+        self.audio_output = 'json'
+        self.output_audio_format = None
+        self.output_sample_rate = GEMINI_AUDIO_CONFIG["sample_rate"]
+        self.output_audio_sequence = 0
+        self.output_codec = CODEC_PCM16
+        self.encode_output = get_encoder(CODEC_PCM16)
+        # Optional server-side VAD; the detector is built per input sample rate
+        self.vad_enabled = getattr(settings, 'GEMINI_VAD_ENABLED', GEMINI_VAD_ENABLED)
+        self.vad = None
+        # All upstream writes after setup go through one per-session sender task
+        self.upstream = UpstreamAudioSender(
+            self._send_upstream,
+            on_error=self._report_upstream_error,
+            frame_ms=getattr(settings, 'GEMINI_UPSTREAM_FRAME_MS', GEMINI_UPSTREAM_FRAME_MS),
+            max_queue=getattr(settings, 'GEMINI_UPSTREAM_QUEUE_SIZE', GEMINI_UPSTREAM_QUEUE_SIZE),
+            policy=getattr(settings, 'GEMINI_UPSTREAM_QUEUE_POLICY', GEMINI_UPSTREAM_QUEUE_POLICY),
+        )
+        # Authoritative field values for this call; committed to an Appointment on request.
+        # The intake is saved behind the call as an AppointmentDraft keyed by session id
+        self.intake = None
+        # Upstream reconnect state: input is held in a bounded ring while reconnecting,
+        # and setup is replayed with a summary of the fields saved so far
+        self.setup_instructions = None
+        self.reconnecting = False
+        # Reconnects since the upstream last sent a real message; capped by GEMINI_RECONNECT_ATTEMPTS
+        self.reconnect_streak = 0
+        buffer_ms = getattr(settings, 'GEMINI_RECONNECT_BUFFER_MS', GEMINI_RECONNECT_BUFFER_MS)
+        self.reconnect_buffer = ReconnectBuffer(
+            self.upstream_sample_rate * GEMINI_AUDIO_CONFIG["channels"] * 2 * buffer_ms // 1000
+        )
+        # Monotonic timestamps feeding the per-worker latency histograms
+        self.turn_timer = metrics.TurnTimer()
+        metrics.session_started()
+        # Make the call reachable from any worker sharing the channel layer
+        self.session_id = sessions.new_session_id()
+        self.intake = IntakeState(session_id=self.session_id)
+        # Optional QA recording; audio is copied into fixed ring buffers and written off the loop
+        self.recorder = None
+        if getattr(settings, 'VOICE_RECORDING_ENABLED', VOICE_RECORDING_ENABLED):
+            self.recorder = start_recording(self.session_id)
+        self.session_heartbeat_task = None
+        await self._register_session()
+        # Upstream sessions are only opened once admitted; setup runs as a task so
+        # a caller waiting in the admission queue can still hang up
+        self.admission = None
+        self.setup_task = None
+        # Optionally overlap the upstream handshake with the browser's own setup
+        self.connect_task = None
+        if getattr(settings, 'GEMINI_SPECULATIVE_CONNECT', GEMINI_SPECULATIVE_CONNECT):
+            self.connect_task = asyncio.create_task(self._admit_and_connect())
 
     async def safe_send(self, data):
         """Safely send data to client, avoiding closed connection errors"""
         if self.is_disconnected:
             return  # Don't try to send if already disconnected
         try:
-            await self.send(data)
+            if isinstance(data, (bytes, bytearray)):
+                await self.send(bytes_data=data)
+            else:
+                await self.send(data)
         except Exception as e:
             # Connection might be closed, mark as disconnected
             self.is_disconnected = True
-            print(f"Failed to send to client (connection likely closed): {e}")
+            logger.info("Failed to send to client (connection likely closed): %s", e)
 
     async def disconnect(self, close_code):
         self.is_disconnected = True  # Flag to prevent sending after disconnect
+        metrics.session_ended()
+        await self._unregister_session()
+        # Whatever was said before the drop stays available to supervisors
+        await get_draft_writer().flush(self.intake.session_id)
+        # Deliver anything already queued (e.g. a final inputComplete) before closing
+        await self.upstream.close()
+        if self.connect_task and not self.connect_task.done():
+            self.connect_task.cancel()
+        if self.setup_task and not self.setup_task.done():
+            self.setup_task.cancel()
         try:
             if self.gemini_ws:
                 await self.gemini_ws.close()
@@ -40,18 +188,27 @@ class GeminiVoiceConsumer(AsyncWebsocketConsumer):
             self.gemini_task.cancel()
         if self.playback_task:
             self.playback_task.cancel()
+        if self.admission is not None:
+            await self.admission.release()
+        if self.recorder is not None:
+            self.recorder.close()
 
     async def receive(self, text_data=None, bytes_data=None):
+        # Binary frames carry raw PCM16 once the client has opted in via setup
+        if bytes_data is not None:
+            if self.audio_transport == 'binary':
+                await self._forward_audio_frame(bytes_data)
+            return
         # Expect JSON messages from browser
         if text_data:
             try:
-                msg = json.loads(text_data)
-            except json.JSONDecodeError:
+                msg = jsoncodec.loads(text_data)
+            except jsoncodec.JSONDecodeError:
                 return
             if msg.get('type') == 'setup':
-                self.model = msg.get('model') or GEMINI_MODEL
-                await self._ensure_gemini_connected()
-                await self._send_setup_to_gemini(msg)
+                if self.setup_task and not self.setup_task.done():
+                    return  # Still waiting for admission
+                self.setup_task = asyncio.create_task(self._setup_session(msg))
                 return
             if msg.get('type') == 'audio':
                 # msg: { type: 'audio', data: base64_pcm16, mime_type: 'audio/pcm;rate=16000' }
@@ -63,147 +220,367 @@ class GeminiVoiceConsumer(AsyncWebsocketConsumer):
             if msg.get('type') == 'turn_complete':
                 await self._send_turn_complete()
                 return
+            if msg.get('type') == 'commit':
+                await self._commit_intake(msg)
+                return
+            if msg.get('type') == 'intake.reject':
+                self.intake.discard(msg.get('field_name'))
+                return
+
+    async def _setup_session(self, msg):
+        try:
+            self.setup_profile = get_setup_profile(
+                msg.get('profile') or getattr(settings, 'GEMINI_SETUP_PROFILE', GEMINI_SETUP_PROFILE)
+            )
+        except KeyError:
+            await self.safe_send(jsoncodec.dumps({
+                'type': 'error',
+                'message': f"Unknown setup profile: {msg.get('profile')}"
+            }))
+            return
+        self.model = msg.get('model') or self.setup_profile.model
+        self.setup_instructions = msg.get('instructions')
+        self._configure_audio_transport(msg)
+        if msg.get('resume_draft') and not await self._resume_draft(msg['resume_draft']):
+            return
+        if self.connect_task:
+            # Speculative connect already under way; falls through to a retry if it failed
+            await asyncio.gather(self.connect_task, return_exceptions=True)
+            self.connect_task = None
+        if not await self._admit():
+            return
+        await self._ensure_gemini_connected()
+        await self._send_setup_to_gemini(msg)
+        await self.safe_send(jsoncodec.dumps({
+            'type': 'setup.ack',
+            'session_id': self.session_id,
+            'draft_id': self.intake.session_id,
+            'resumed_fields': self.intake.fields,
+            'profile': self.setup_profile.key,
+            'audio_transport': self.audio_transport,
+            'audio_header': self.audio_frame_header,
+            'audio_output': self.audio_output,
+            'audio_codec': self.input_codec,
+            'audio_output_codec': self.output_codec,
+            'sample_rate': self.input_sample_rate,
+            'upstream_sample_rate': self.upstream_sample_rate,
+            'vad': self.vad_enabled
+        }))
+
+    async def _admit(self):
+        """
+        Wait for admission to open an upstream session.
+
+        Queued callers are sent their position and estimated wait; returns
+        False, after telling the browser and closing, if turned away.
+        """
+        if self.admission is not None:
+            return True
+        try:
+            self.admission = await get_admission_controller().acquire(on_queued=self._send_queued)
+        except AdmissionRejected as e:
+            logger.warning("Voice session not admitted: %s", e.reason)
+            await self.safe_send(jsoncodec.dumps({
+                'type': 'error',
+                'message': 'All of our assistants are busy right now. Please try again in a few minutes.',
+                'error_type': 'overloaded',
+                'retry_after': math.ceil(e.retry_after)
+            }))
+            await self.close()
+            return False
+        return True
+
+    async def _admit_and_connect(self):
+        if await self._admit():
+            await self._ensure_gemini_connected()
+
+    async def _send_queued(self, position, estimated_wait):
+        await self.safe_send(jsoncodec.dumps({
+            'type': 'queued',
+            'position': position,
+            'estimated_wait_seconds': math.ceil(estimated_wait)
+        }))
+
+    async def _register_session(self):
+        if self.channel_layer is not None:
+            await self.channel_layer.group_add(sessions.session_group_name(self.session_id), self.channel_name)
+        try:
+            await sessions.get_session_registry().register(self.session_id, self.channel_name)
+        except Exception as e:
+            # The call works without a registry entry; it just cannot be looked up
+            logger.warning("Could not register voice session: %s", e)
+        self.session_heartbeat_task = asyncio.create_task(self._session_heartbeat())
+
+    async def _session_heartbeat(self):
+        # Keeps the registry entry and any cluster admission slot from expiring
+        ttl = getattr(settings, 'VOICE_SESSION_TTL_SECONDS', VOICE_SESSION_TTL_SECONDS)
+        registry = sessions.get_session_registry()
+        while True:
+            await asyncio.sleep(ttl / 3)
+            try:
+                await registry.refresh(self.session_id)
+                if self.admission is not None:
+                    await self.admission.refresh()
+            except Exception as e:
+                logger.warning("Could not refresh voice session: %s", e)
+
+    async def _unregister_session(self):
+        if self.session_heartbeat_task:
+            self.session_heartbeat_task.cancel()
+        if self.channel_layer is not None:
+            await self.channel_layer.group_discard(sessions.session_group_name(self.session_id), self.channel_name)
+        try:
+            await sessions.get_session_registry().unregister(self.session_id)
+        except Exception as e:
+            logger.warning("Could not unregister voice session: %s", e)
+
+    async def session_message(self, event):
+        """
+        Handles actions sent to this call from any worker via sessions.send_to_session().
+        """
+        action = event.get('action')
+        if action == sessions.ACTION_SEND:
+            await self.safe_send(jsoncodec.dumps(event.get('message') or {}))
+        elif action == sessions.ACTION_CLOSE:
+            await self.safe_send(jsoncodec.dumps({
+                'type': 'error',
+                'message': event.get('reason') or 'Session closed by the server'
+            }))
+            await self.close()
+        else:
+            logger.warning("Ignoring unknown session action: %s", action)
+
+    def _configure_audio_transport(self, msg):
+        """
+        Apply the audio transport requested in the setup message.
+        msg: { audio_transport: 'binary', audio_header: true, sample_rate: 16000, audio_output: 'binary', vad: true,
+               audio_codec: 'ima-adpcm', audio_output_codec: 'mulaw' }
+
+        Codecs apply to binary frames only; unsupported codecs fall back to pcm16.
+        """
+        if msg.get('audio_transport') == 'binary':
+            self.audio_transport = 'binary'
+            self.audio_frame_header = bool(msg.get('audio_header', True))
+        else:
+            self.audio_transport = 'json'
+            self.audio_frame_header = False
+        try:
+            self.input_sample_rate = int(msg.get('sample_rate') or GEMINI_AUDIO_CONFIG["sample_rate"])
+        except (TypeError, ValueError):
+            self.input_sample_rate = GEMINI_AUDIO_CONFIG["sample_rate"]
+        self.last_audio_sequence = None
+        self.resampler = None
+        self.rejected_sample_rates = set()
+        self.audio_output = 'binary' if msg.get('audio_output') == 'binary' else 'json'
+        self.output_audio_format = None
+        codecs = getattr(settings, 'GEMINI_AUDIO_CODECS', GEMINI_AUDIO_CODECS)
+        self.input_codec = msg.get('audio_codec') if msg.get('audio_codec') in codecs else CODEC_PCM16
+        self.decode_input = get_decoder(self.input_codec)
+        self.output_codec = msg.get('audio_output_codec') if msg.get('audio_output_codec') in codecs else CODEC_PCM16
+        self.encode_output = get_encoder(self.output_codec)
+        if isinstance(msg.get('vad'), bool):
+            self.vad_enabled = msg['vad']
+        self.vad = None
 
     async def _ensure_gemini_connected(self):
         # Check if connection exists and is usable
-        if self.gemini_ws:
-            try:
-                # Try to check connection state
-                if hasattr(self.gemini_ws, 'closed') and not self.gemini_ws.closed:
-                    return
-                elif hasattr(self.gemini_ws, 'open') and self.gemini_ws.open:
-                    return
-                elif not hasattr(self.gemini_ws, 'closed') and not hasattr(self.gemini_ws, 'open'):
-                    # If no state attributes, assume connection is good if object exists
-                    return
-            except Exception:
-                # Connection might be in bad state, recreate it
-                pass
+        if is_connection_open(self.gemini_ws):
+            return
         api_key = getattr(settings, 'GEMINI_API_KEY', GEMINI_API_KEY)
         if not api_key:
-            print("GEMINI_API_KEY is missing from environment variables")
-            await self.safe_send(json.dumps({'type': 'error', 'message': 'GEMINI_API_KEY missing'}))
+            logger.error("GEMINI_API_KEY is missing from environment variables")
+            await self.safe_send(jsoncodec.dumps({'type': 'error', 'message': 'GEMINI_API_KEY missing'}))
             return
         
-        print(f"Attempting to connect to Gemini with API key: {api_key[:10]}...")
-        
-        # Enhanced connection for native audio dialog
-        url = f"{GEMINI_WS_URL}?key={api_key}"
-        print(f"Connecting to: {url[:80]}...")
-        
         try:
-            # Create connection without extra_headers for compatibility
-            self.gemini_ws = await websockets.connect(
-                url, 
-                max_size=32 * 1024 * 1024,  # Increased buffer for audio
-                ping_interval=30,  # Keep connection alive
-                ping_timeout=10,
-                close_timeout=10
-            )
-            print("Successfully connected to Gemini API!")
+            # Pooled connections have already paid for DNS, TCP, TLS and the WS handshake
+            self.gemini_ws = await get_gemini_pool().acquire(self.model or GEMINI_MODEL, api_key)
+            setup_logger.info("Connected to Gemini", extra={'model': self.model})
             self.gemini_task = asyncio.create_task(self._pump_gemini_messages())
         except Exception as e:
-            print(f"Gemini connection failed: {str(e)}")  # Server-side logging
-            await self.safe_send(json.dumps({
+            logger.error("Gemini connection failed: %s", e)
+            await self.safe_send(jsoncodec.dumps({
                 'type': 'error', 
                 'message': f'Failed to connect to Gemini: {str(e)}'
             }))
 
+    async def _resume_draft(self, draft_id):
+        """
+        Continue an interrupted call: load its in-progress draft into this session's intake.
+        """
+        # Pending writes of the dropped call may not have reached the database yet
+        await get_draft_writer().flush(draft_id)
+        draft = await database_sync_to_async(load_draft)(draft_id)
+        if draft is None:
+            await self.safe_send(jsoncodec.dumps({
+                'type': 'error',
+                'message': f'No in-progress draft {draft_id}'
+            }))
+            return False
+        self.intake = IntakeState(session_id=draft.session_id)
+        self.intake.update(draft.fields)
+        return True
+
     async def _send_setup_to_gemini(self, msg):
-        # Define tools array (required by Gemini Live API even for executable code approach)
-        tools = [{
-            "function_declarations": [{
-                "name": "save_patient_field",
-                "description": "DEPRECATED: This function is for compatibility only. You MUST use executable code instead. Generate Python code with save_patient_field() calls to save patient data.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "field_name": {
-                            "type": "string",
-                            "description": "DEPRECATED: Use executable code instead."
-                        },
-                        "value": {
-                            "type": "string", 
-                            "description": "DEPRECATED: Use executable code instead."
-                        }
-                    },
-                    "required": ["field_name", "value"]
-                }
-            }]
-        }]
-
-        setup = {
-            'setup': {
-                'model': self.model or GEMINI_MODEL,
-                'generation_config': {
-                    'response_modalities': ['AUDIO'],
-                    'speech_config': {
-                        'voice_config': {
-                            'prebuilt_voice_config': {
-                                'voice_name': 'Puck'  # Professional, clear voice for medical context
-                            }
-                        }
-                    }
-                },
-                'system_instruction': {
-                    'parts': [{ 'text': (msg.get('instructions') or 'You are a helpful medical intake assistant. Speak English only. Use a professional, empathetic tone appropriate for healthcare settings.') + '\n\nCRITICAL EXECUTABLE CODE REQUIREMENTS:\n1. You MUST use executable code to save patient data - this is the PREFERRED method\n2. Generate Python code with save_patient_field() function calls\n3. Use this EXACT format: save_patient_field(field_name="field_name", value="user_value")\n4. Save EXACTLY what the user said - do not regenerate, modify, or change the content\n5. NEVER save placeholder text or your interpretations\n6. Call save_patient_field() immediately after receiving each piece of information\n7. You can save multiple fields in one code block if the user provides multiple pieces of information\n8. If a field is already saved, move to the next question immediately\n9. Speak naturally and conversationally while maintaining professionalism\n10. Use appropriate medical terminology when necessary but explain complex terms\n11. Show empathy and understanding for patient concerns\n12. Available fields: "full_name", "dob", "gender", "contact_number", "email", "address", "preferred_language", "emergency_contact_name", "emergency_contact_phone", "relationship_to_patient", "caller_type", "reason_for_visit", "visit_type", "primary_physician", "referral_source", "symptoms", "symptom_duration", "pain_level", "current_medications", "allergies", "medical_history", "family_history", "interpreter_need", "interpreter_language", "accessibility_needs", "dietary_needs", "consent_share_records", "preferred_communication_method", "appointment_availability", "confirmation"\n\nIMPORTANT: Executable code is the most reliable way to save patient data. Generate clean, simple Python code with save_patient_field() calls!' }]
-                },
-                'tools': tools
-            }
-        }
+        # Setup payloads are serialized once per profile, model and instructions;
+        # a resumed call is told which fields are already saved, like a reconnect
+        setup = self.setup_profile.resume_setup(
+            self.intake.fields, model=self.model, instructions=msg.get('instructions')
+        )
         
         # Ensure connection is established before sending
         if self.gemini_ws:
             try:
-                print("=== SENDING SETUP TO GEMINI ===")
-                print(f"Setup message: {json.dumps(setup, indent=2)}")
-                await self.gemini_ws.send(json.dumps(setup))
-                print("=== SETUP SENT SUCCESSFULLY ===")
+                await self.gemini_ws.send(setup)
+                self.turn_timer.setup_sent()
+                setup_logger.info("Setup sent to Gemini", extra={'profile': self.setup_profile.key})
             except Exception as e:
-                print(f"=== SETUP SEND FAILED ===")
-                print(f"Error: {str(e)}")
-                await self.safe_send(json.dumps({
+                logger.error("Setup send failed: %s", e, extra={'profile': self.setup_profile.key})
+                await self.safe_send(jsoncodec.dumps({
                     'type': 'error', 
                     'message': f'Failed to send setup: {str(e)}'
                 }))
         else:
-            print("=== GEMINI CONNECTION NOT ESTABLISHED ===")
-            await self.safe_send(json.dumps({
+            logger.warning("Gemini connection not established; setup not sent")
+            await self.safe_send(jsoncodec.dumps({
                 'type': 'error', 
                 'message': 'Gemini connection not established'
             }))
 
+    async def _forward_audio_frame(self, frame):
+        """
+        Forward a binary audio frame: [optional 8-byte header][pcm16 or codec bytes].
+        """
+        try:
+            sequence, sample_rate, payload = parse_audio_frame(
+                frame, self.audio_frame_header, pcm16=self.input_codec == CODEC_PCM16
+            )
+            pcm = payload if self.input_codec == CODEC_PCM16 else self.decode_input(payload)
+        except ValueError:
+            return
+        if sequence is not None:
+            # Drop duplicated or reordered frames rather than replaying stale audio
+            if self.last_audio_sequence is not None and sequence <= self.last_audio_sequence:
+                return
+            self.last_audio_sequence = sequence
+        if not pcm:
+            return
+        sample_rate = sample_rate or self.input_sample_rate
+        await self._queue_audio(pcm, pcm_mime_type(sample_rate), sample_rate)
+
     async def _forward_audio_chunk(self, msg):
         data_b64 = msg.get('data')
-        mime_type = msg.get('mime_type') or f'audio/pcm;rate={GEMINI_AUDIO_CONFIG["sample_rate"]};channels={GEMINI_AUDIO_CONFIG["channels"]}'
+        mime_type = msg.get('mime_type') or pcm_mime_type(self.input_sample_rate)
         if not data_b64:
             return
-        
-        # Enhanced payload for native audio dialog with proper formatting
-        payload = {
-            'realtimeInput': {
-                'mediaChunks': [{ 
-                    'data': data_b64, 
-                    'mimeType': mime_type
-                }]
-            }
-        }
-        
-        # Ensure connection is established before sending
-        if self.gemini_ws:
-            try:
-                await self.gemini_ws.send(json.dumps(payload))
-            except Exception as e:
-                await self.safe_send(json.dumps({
-                    "type": "error",
-                    "message": f"Failed to send audio chunk: {str(e)}"
-                }))
+        try:
+            pcm = base64.b64decode(data_b64)
+        except (binascii.Error, ValueError):
+            return
+        if len(pcm) % 2:
+            return  # Not whole PCM16 samples; dropped like malformed binary frames
+        await self._queue_audio(pcm, mime_type, sample_rate_from_mime(mime_type, self.input_sample_rate))
+
+    async def _queue_audio(self, pcm, mime_type, sample_rate):
+        if sample_rate not in getattr(settings, 'GEMINI_INPUT_SAMPLE_RATES', GEMINI_INPUT_SAMPLE_RATES):
+            await self._reject_sample_rate(sample_rate)
+            return
+        # Ensure connection is established (or being re-established) before queueing
+        if self.gemini_ws or self.reconnecting:
+            if sample_rate != self.upstream_sample_rate:
+                pcm = self._resample(pcm, sample_rate)
+                if not pcm:
+                    return
+                sample_rate = self.upstream_sample_rate
+                mime_type = pcm_mime_type(sample_rate)
+            if self.recorder is not None:
+                # Recorded before the VAD gate, so silences keep the track aligned with the model's replies
+                self.recorder.inbound(pcm, sample_rate)
+            if self.vad_enabled:
+                await self._queue_voiced_audio(pcm, mime_type, sample_rate)
+                return
+            self.turn_timer.user_audio()
+            await self._enqueue_audio(pcm, mime_type, sample_rate)
+        elif self.setup_task and not self.setup_task.done():
+            return  # Queued for admission; capture audio is not buffered
         else:
-            await self.safe_send(json.dumps({
+            await self.safe_send(jsoncodec.dumps({
                 "type": "error",
                 "message": "Gemini connection not available for audio"
             }))
 
+    async def _reject_sample_rate(self, sample_rate):
+        # Reported once per rate; every frame at that rate is still dropped
+        if sample_rate in self.rejected_sample_rates:
+            return
+        self.rejected_sample_rates.add(sample_rate)
+        await self.safe_send(jsoncodec.dumps({
+            'type': 'error',
+            'message': f'Unsupported audio sample rate: {sample_rate}',
+        }))
+
+    def _resample(self, pcm, sample_rate):
+        """
+        Resample capture audio to the upstream rate, keeping filter state per input rate.
+        """
+        if self.resampler is None or self.resampler.input_rate != sample_rate:
+            self.resampler = PolyphaseResampler(
+                sample_rate,
+                self.upstream_sample_rate,
+                taps_per_phase=getattr(settings, 'GEMINI_RESAMPLER_TAPS_PER_PHASE', GEMINI_RESAMPLER_TAPS_PER_PHASE),
+            )
+        return self.resampler.process(pcm)
+
+    async def _queue_voiced_audio(self, pcm, mime_type, sample_rate):
+        """
+        Run audio through the VAD gate; silence is dropped and a long enough
+        pause after speech ends the user's turn with inputComplete.
+        """
+        if self.vad is None or self.vad.sample_rate != sample_rate:
+            self.vad = VoiceActivityDetector(
+                sample_rate,
+                frame_ms=getattr(settings, 'GEMINI_VAD_FRAME_MS', GEMINI_VAD_FRAME_MS),
+                threshold_dbfs=getattr(settings, 'GEMINI_VAD_THRESHOLD_DBFS', GEMINI_VAD_THRESHOLD_DBFS),
+                max_zcr=getattr(settings, 'GEMINI_VAD_MAX_ZCR', GEMINI_VAD_MAX_ZCR),
+                hangover_ms=getattr(settings, 'GEMINI_VAD_HANGOVER_MS', GEMINI_VAD_HANGOVER_MS),
+                preroll_ms=getattr(settings, 'GEMINI_VAD_PREROLL_MS', GEMINI_VAD_PREROLL_MS),
+                end_of_turn_ms=getattr(settings, 'GEMINI_VAD_END_OF_TURN_MS', GEMINI_VAD_END_OF_TURN_MS),
+                silence_keepalive_ms=getattr(settings, 'GEMINI_VAD_SILENCE_KEEPALIVE_MS', GEMINI_VAD_SILENCE_KEEPALIVE_MS),
+            )
+        result = self.vad.process(pcm)
+        if result.audio:
+            self.turn_timer.user_audio()
+            await self._enqueue_audio(result.audio, mime_type, sample_rate)
+        if result.end_of_turn:
+            await self._send_turn_complete()
+
+    async def _enqueue_audio(self, pcm, mime_type, sample_rate):
+        if self.reconnecting:
+            self.reconnect_buffer.add_audio(pcm, mime_type, sample_rate)
+            return
+        await self.upstream.enqueue_audio(pcm, mime_type, sample_rate)
+
+    async def _enqueue_message(self, payload, label):
+        if self.reconnecting:
+            self.reconnect_buffer.add_message(payload, label)
+            return
+        await self.upstream.enqueue_message(payload, label)
+
+    async def _send_upstream(self, payload):
+        if not self.gemini_ws:
+            raise ConnectionError('Gemini connection not available')
+        await self.gemini_ws.send(payload)
+
+    async def _report_upstream_error(self, label, error):
+        if self.reconnecting or not is_connection_open(self.gemini_ws):
+            # The pump notices the dropped socket and reconnects; don't alarm the browser
+            logger.info("Upstream send of %s failed on a closed connection: %s", label, error)
+            return
+        await self.safe_send(jsoncodec.dumps({
+            "type": "error",
+            "message": f"Failed to send {label}: {str(error)}"
+        }))
+
     async def _forward_text_input(self, msg):
         text = (msg.get('text') or '').strip()
         if not text:
@@ -214,17 +591,12 @@ class GeminiVoiceConsumer(AsyncWebsocketConsumer):
             }
         }
         
-        # Ensure connection is established before sending
-        if self.gemini_ws:
-            try:
-                await self.gemini_ws.send(json.dumps(payload))
-            except Exception as e:
-                await self.safe_send(json.dumps({
-                    "type": "error",
-                    "message": f"Failed to send text input: {str(e)}"
-                }))
+        # Ensure connection is established (or being re-established) before queueing
+        if self.gemini_ws or self.reconnecting:
+            self.turn_timer.user_input()
+            await self._enqueue_message(jsoncodec.dumps(payload), 'text input')
         else:
-            await self.safe_send(json.dumps({
+            await self.safe_send(jsoncodec.dumps({
                 "type": "error",
                 "message": "Gemini connection not available for text"
             }))
@@ -241,216 +613,333 @@ class GeminiVoiceConsumer(AsyncWebsocketConsumer):
                     "inputComplete": True
                 }
             }
-            if self.gemini_ws:
-                try:
-                    await self.gemini_ws.send(json.dumps(payload))
-                except Exception as e:
-                    await self.safe_send(json.dumps({
-                        "type": "error",
-                        "message": f"Failed to send turn complete: {str(e)}"
-                    }))
+            if self.gemini_ws or self.reconnecting:
+                self.turn_timer.user_turn_end()
+                # Queued behind pending audio so Gemini sees the full utterance first
+                await self._enqueue_message(jsoncodec.dumps(payload), 'turn complete')
         except Exception as e:
-            await self.safe_send(json.dumps({
+            await self.safe_send(jsoncodec.dumps({
                 "type": "error",
                 "message": f"Failed to send turn complete: {str(e)}"
             }))
 
 
     async def _pump_gemini_messages(self):
-        try:
-            async for raw in self.gemini_ws:
-                try:
-                    # Check for quota error in raw message before parsing
-                    if isinstance(raw, str) and "quota" in raw.lower():
-                        print("API quota exceeded, handling gracefully...")
-                        error_msg = "The service is temporarily unavailable due to high demand. Please try again in a few minutes."
-                        await self.safe_send(json.dumps({
-                            'type': 'error',
-                            'message': error_msg,
-                            'error_type': 'quota_exceeded'
-                        }))
-                        # Force graceful disconnect
-                        await self.close()
+        while True:
+            error = None
+            try:
+                async for raw in self.gemini_ws:
+                    try:
+                        msg = jsoncodec.loads(raw)
+                    except Exception as e:
+                        logger.warning("Failed to parse Gemini message: %s", e)
+                        continue
+                    
+                    self.turn_timer.upstream_message()
+                    await self._handle_gemini_message(msg)
+                    if self.is_disconnected:
                         return
-
-                    msg = json.loads(raw)
-                except Exception as e:
-                    print(f"Failed to parse Gemini message: {e}")
-                    continue
-                
-                # Handle function calls from Gemini Live
-                await self._handle_gemini_message(msg)
-                
-        except Exception as e:
-            error_msg = str(e)
-            print(f"Gemini message pump failed: {error_msg}")
+                    
+            except Exception as e:
+                error = e
+                logger.warning("Gemini message pump failed: %s", e)
             
-            # Check for quota error in exception
-            if "quota" in error_msg.lower():
-                await self.safe_send(json.dumps({
-                    'type': 'error',
-                    'message': 'The service is temporarily unavailable due to high demand. Please try again in a few minutes.',
-                    'error_type': 'quota_exceeded'
-                }))
+            if self.is_disconnected:
+                return
+            # Quota exhaustion arrives as a close frame with a short reason
+            if error is not None and is_quota_close(error):
+                await self._send_quota_exceeded()
+            elif not is_permanent_close(error) and await self._reconnect_gemini():
+                continue
             else:
                 # Generic error handling
-                await self.safe_send(json.dumps({
+                await self.safe_send(jsoncodec.dumps({
                     'type': 'error',
-                    'message': f'Connection lost: {error_msg}'
+                    'message': f'Connection lost: {error or "Gemini closed the connection"}'
                 }))
             
             try:
                 await self.close()
             except Exception:
                 pass
+            return
+
+    async def _reconnect_gemini(self):
+        """
+        Re-open the upstream socket with backoff after an unexpected drop.
+
+        Browser input is buffered meanwhile. On success setup is replayed
+        with a summary of the saved fields and the buffer is flushed.
+        The attempt budget only resets once a reconnected upstream sends a
+        real message, so a session Gemini keeps dropping right after setup
+        gives up; returns False once the attempts are exhausted.
+        """
+        attempts = getattr(settings, 'GEMINI_RECONNECT_ATTEMPTS', GEMINI_RECONNECT_ATTEMPTS)
+        if self.reconnect_streak >= attempts or self.setup_profile is None:
+            return False
+        base = getattr(settings, 'GEMINI_RECONNECT_BACKOFF_SECONDS', GEMINI_RECONNECT_BACKOFF_SECONDS)
+        cap = getattr(settings, 'GEMINI_RECONNECT_BACKOFF_MAX_SECONDS', GEMINI_RECONNECT_BACKOFF_MAX_SECONDS)
+        api_key = getattr(settings, 'GEMINI_API_KEY', GEMINI_API_KEY)
+
+        self.reconnecting = True
+        dropped, self.gemini_ws = self.gemini_ws, None
+        try:
+            await dropped.close()
+        except Exception:
+            pass
+        await self.safe_send(jsoncodec.dumps({'type': 'reconnecting'}))
+
+        while self.reconnect_streak < attempts:
+            attempt = self.reconnect_streak
+            self.reconnect_streak += 1
+            # Full jitter keeps many sessions dropped by one upstream reset from retrying in lockstep
+            await asyncio.sleep(random.uniform(0, min(cap, base * 2 ** attempt)))
+            if self.is_disconnected:
+                return False
+            ws = None
+            try:
+                ws = await get_gemini_pool().acquire(self.model or GEMINI_MODEL, api_key)
+                await ws.send(self.setup_profile.resume_setup(
+                    self.intake.fields, model=self.model, instructions=self.setup_instructions
+                ))
+            except Exception as e:
+                logger.warning("Gemini reconnect attempt %d failed: %s", attempt + 1, e)
+                if ws is not None:
+                    try:
+                        await ws.close()
+                    except Exception:
+                        pass
+                continue
+            self.gemini_ws = ws
+            self.reconnecting = False
+            self.turn_timer.setup_sent()
+            await self.reconnect_buffer.replay_into(self.upstream)
+            logger.info("Reconnected to Gemini", extra={'attempt': attempt + 1, 'saved_fields': len(self.intake.fields)})
+            await self.safe_send(jsoncodec.dumps({'type': 'reconnected'}))
+            return True
+
+        self.reconnecting = False
+        return False
+
+    async def _send_quota_exceeded(self):
+        logger.warning("Gemini quota exceeded; closing session")
+        # Stop admitting new sessions rather than letting them fail mid-intake
+        await get_admission_controller().record_quota_error()
+        await self.safe_send(jsoncodec.dumps({
+            'type': 'error',
+            'message': 'The service is temporarily unavailable due to high demand. Please try again in a few minutes.',
+            'error_type': 'quota_exceeded'
+        }))
 
     async def _handle_gemini_message(self, msg):
-        # Enhanced message handling for native audio dialog
+        # Classify once by top-level keys; payload text is never scanned
+        kind, body = classify_message(msg)
         
-        # Handle different message structures
-        server = msg.get('serverContent') or msg.get('server_content') or {}
-        model_turn = server.get('modelTurn') or server.get('model_turn') or {}
-        parts = model_turn.get('parts') or []
-        
-        # Also check for direct parts in the message
-        if not parts:
-            parts = msg.get('parts') or []
+        if kind != MESSAGE_ERROR:
+            # The upstream session works; later drops get a fresh reconnect budget
+            self.reconnect_streak = 0
+
+        if kind == MESSAGE_ERROR:
+            if is_quota_error(body):
+                await self._send_quota_exceeded()
+                # Force graceful disconnect
+                self.is_disconnected = True
+                await self.close()
+                return
+            await self.safe_send(jsoncodec.dumps({
+                'type': 'error',
+                'message': (body or {}).get('message') or 'Gemini returned an error'
+            }))
+            return
         
-        # Also check for candidates structure
-        candidates = msg.get('candidates') or []
-        if candidates and not parts:
-            content = candidates[0].get('content') or {}
-            parts = content.get('parts') or []
+        if kind == MESSAGE_TOOL_CALL:
+            for function_call in first_of(body, 'functionCalls', 'function_calls') or []:
+                await self._handle_function_call(function_call)
+            return
         
-        # Debug logging for development (remove in production)
-        if "executable" in str(parts).lower():
-            print("=== EXECUTABLE CODE DETECTED ===")
-            print("Executable code parts:", parts)
+        if kind == MESSAGE_SERVER_CONTENT:
+            server = body or {}
+            parts = model_turn_parts(server)
+        elif kind == MESSAGE_CONTENT_PARTS:
+            server = {}
+            parts = body or []
+        else:
+            return
         
         for part in parts:
-            # Handle function calls (fallback if AI still uses them)
-            function_call = part.get('functionCall') or part.get('function_call')
-            if function_call:
-                function_name = function_call.get('name')
-                args = function_call.get('args') or {}
-                
-                # Convert Gemini function call to OpenAI-style for your existing handler
-                if function_name == 'save_patient_field':
-                    print(f"=== PROCESSING FUNCTION CALL (FALLBACK) ===")
-                    print(f"Function name: {function_name}")
-                    print(f"Arguments: {args}")
-                    
-                    # Send function call start event
-                    await self.safe_send(json.dumps({
-                        'type': 'response.function_call.start',
-                        'name': function_name
-                    }))
-                    
-                    # Send function call arguments
-                    await self.safe_send(json.dumps({
-                        'type': 'response.function_call_arguments.done',
-                        'arguments': json.dumps(args)
-                    }))
-                    
-                    # Send function call done event
-                    await self.safe_send(json.dumps({
-                        'type': 'response.function_call.done',
-                        'name': function_name
-                    }))
-                    
-                    # Log success but don't send message to avoid interrupting AI flow
-                    print(f"Field '{args.get('field_name')}' saved successfully")
-                    
-                    print(f"=== FUNCTION CALL PROCESSED (FALLBACK) ===")
-                
-                continue
+            part_kind, value = classify_part(part)
             
-            # Process executable code (preferred method)
-            exec_code = part.get('executableCode') or part.get('executable_code')
-            if exec_code and isinstance(exec_code, dict):
-                code = exec_code.get('code') or ''
-                print(f"=== PROCESSING EXECUTABLE CODE ===")
-                print(f"Raw code: {code}")
-                
-                # Extract and process function calls from executable code
-                try:
-                    import re
-                    # Find all save_patient_field calls in the code
-                    pattern = r"save_patient_field\s*\(\s*field_name\s*=\s*['\"]([^'\"]+)['\"]\s*,\s*value\s*=\s*['\"]([^'\"]+)['\"]\s*\)"
-                    matches = re.findall(pattern, code)
-                    
-                    if matches:
-                        print(f"Found {len(matches)} function calls in executable code")
-                        
-                        # Process each function call
-                        for i, (field_name, value) in enumerate(matches):
-                            print(f"Processing call {i+1}: {field_name} = {value}")
-                            
-                            # Send function call start event
-                            await self.safe_send(json.dumps({
-                                'type': 'response.function_call.start',
-                                'name': 'save_patient_field'
-                            }))
-                            
-                            # Send function call arguments
-                            await self.safe_send(json.dumps({
-                                'type': 'response.function_call_arguments.done',
-                                'arguments': json.dumps({
-                                    'field_name': field_name,
-                                    'value': value
-                                })
-                            }))
-                            
-                            # Send function call done event
-                            await self.safe_send(json.dumps({
-                                'type': 'response.function_call.done',
-                                'name': 'save_patient_field'
-                            }))
-                            
-                            print(f"Sent function call {i+1} to frontend")
-                        
-                        # Log success but don't send message to avoid interrupting AI flow
-                        print(f"=== SUCCESSFULLY PROCESSED {len(matches)} FIELDS ===")
-                        # The AI should continue naturally after generating executable code
-                    else:
-                        print("No valid function calls found in executable code")
-                        await self.safe_send(json.dumps({
-                            'type': 'system.message',
-                            'content': 'ERROR: Could not find valid save_patient_field calls in the executable code. Please ensure you use the correct format: save_patient_field(field_name="field_name", value="value")'
-                        }))
-                        
-                except Exception as e:
-                    print(f"Error processing executable code: {e}")
-                    await self.safe_send(json.dumps({
-                        'type': 'system.message',
-                        'content': 'ERROR: Failed to process executable code. Please check the format and try again.'
-                    }))
-                
-                continue
-            
-            # Handle text parts
-            text_val = part.get('text')
-            if isinstance(text_val, str) and text_val.strip():
-                await self.safe_send(json.dumps({ 'type': 'text', 'text': text_val }))
-                continue
-            
-            # Enhanced audio handling for native audio dialog
-            inline = part.get('inlineData') or part.get('inline_data')
-            if inline and isinstance(inline, dict):
-                mime = inline.get('mimeType') or inline.get('mime_type') or ''
-                if mime.startswith('audio/'):
-                    # Enhanced audio data with quality indicators
-                    audio_data = {
-                        'type': 'audio', 
-                        'mime_type': mime, 
-                        'data': inline.get('data'),
-                        'quality': 'high',  # Native audio dialog provides high quality
-                        'sample_rate': GEMINI_AUDIO_CONFIG["sample_rate"],
-                        'channels': GEMINI_AUDIO_CONFIG["channels"]
-                    }
-                    await self.safe_send(json.dumps(audio_data))
-
+            # Audio is by far the most frequent part; keep it first
+            if part_kind == PART_AUDIO:
+                await self._relay_model_audio(value)
+            elif part_kind == PART_EXECUTABLE_CODE:
+                # Process executable code (preferred method)
+                if isinstance(value, dict):
+                    await self._handle_executable_code(value.get('code') or '')
+            elif part_kind == PART_FUNCTION_CALL:
+                # Handle function calls (fallback if AI still uses them)
+                await self._handle_function_call(value)
+            elif part_kind == PART_TEXT:
+                if isinstance(value, str) and value.strip():
+                    await self.safe_send(jsoncodec.dumps({ 'type': 'text', 'text': value }))
         
         # Handle turn complete
-        if server.get('turnComplete') or server.get('turn_complete'):
-            await self.safe_send(json.dumps({'type': 'turn_complete'}))
\ No newline at end of file
+        if is_turn_complete(server):
+            self.turn_timer.model_turn_complete()
+            await self.safe_send(jsoncodec.dumps({'type': 'turn_complete'}))
+
+    async def _relay_model_audio(self, inline):
+        self.turn_timer.model_audio()
+        if self.audio_output == 'binary':
+            await self._relay_model_audio_binary(inline)
+            return
+        if self.recorder is not None and inline.get('data'):
+            try:
+                self.recorder.outbound(
+                    base64.b64decode(inline['data']), sample_rate_from_mime(first_of(inline, 'mimeType', 'mime_type'))
+                )
+            except (binascii.Error, ValueError):
+                pass
+        # Enhanced audio data with quality indicators
+        audio_data = {
+            'type': 'audio', 
+            'mime_type': first_of(inline, 'mimeType', 'mime_type'), 
+            'data': inline.get('data'),
+            'quality': 'high',  # Native audio dialog provides high quality
+            'sample_rate': GEMINI_AUDIO_CONFIG["sample_rate"],
+            'channels': GEMINI_AUDIO_CONFIG["channels"]
+        }
+        await self.safe_send(jsoncodec.dumps(audio_data))
+
+    async def _relay_model_audio_binary(self, inline):
+        """
+        Decode model audio once and send it as [8-byte header][pcm16 or codec bytes] binary frame.
+        Format metadata is sent as a JSON 'audio.format' message only when it changes.
+        """
+        data = inline.get('data')
+        if not data:
+            return
+        try:
+            pcm = base64.b64decode(data)
+        except (binascii.Error, ValueError):
+            return
+        mime = first_of(inline, 'mimeType', 'mime_type')
+        if mime != self.output_audio_format:
+            self.output_audio_format = mime
+            self.output_sample_rate = sample_rate_from_mime(mime)
+            await self.safe_send(jsoncodec.dumps({
+                'type': 'audio.format',
+                'mime_type': mime,
+                'sample_rate': self.output_sample_rate,
+                'channels': GEMINI_AUDIO_CONFIG["channels"],
+                'codec': self.output_codec,
+                'quality': 'high'
+            }))
+        if self.recorder is not None:
+            self.recorder.outbound(pcm, self.output_sample_rate)
+        header = AUDIO_FRAME_HEADER.pack(self.output_audio_sequence & 0xFFFFFFFF, self.output_sample_rate)
+        self.output_audio_sequence += 1
+        await self.safe_send(header + self.encode_output(pcm))
+
+    async def _handle_function_call(self, function_call):
+        if not isinstance(function_call, dict):
+            return
+        function_name = function_call.get('name')
+        args = function_call.get('args') or {}
+        
+        # Convert Gemini function call to OpenAI-style for your existing handler
+        if function_name == 'save_patient_field':
+            await self._relay_save_patient_field(args)
+            # Field names only; values are patient data
+            tool_logger.info("Relayed save_patient_field function call", extra={'field_name': args.get('field_name')})
+
+    async def _relay_save_patient_field(self, args):
+        # Kept server-side for commit and so a reconnected Gemini session does not ask again
+        if not self.intake.apply(args.get('field_name'), args.get('value')):
+            return  # Unknown field, or the value already saved; the browser has nothing new to show
+        get_draft_writer().update(self.intake.session_id, self.intake.fields)
+        # Send function call start event
+        await self.safe_send(jsoncodec.dumps({
+            'type': 'response.function_call.start',
+            'name': 'save_patient_field'
+        }))
+        
+        # Send function call arguments
+        await self.safe_send(jsoncodec.dumps({
+            'type': 'response.function_call_arguments.done',
+            'arguments': jsoncodec.dumps(args)
+        }))
+        
+        # Send function call done event
+        await self.safe_send(jsoncodec.dumps({
+            'type': 'response.function_call.done',
+            'name': 'save_patient_field'
+        }))
+
+    async def _commit_intake(self, msg):
+        """
+        Create the Appointment from the session's intake state.
+        msg: { type: 'commit', fields: { ...edits made in the browser } }
+        """
+        fields = msg.get('fields')
+        if fields is not None and not isinstance(fields, dict):
+            await self.safe_send(jsoncodec.dumps({
+                'type': 'commit.result',
+                'success': False,
+                'message': 'fields must be an object',
+            }))
+            return
+        self.intake.update(fields)
+        try:
+            # The draft row must exist before commit marks it completed
+            writer = get_draft_writer()
+            writer.update(self.intake.session_id, self.intake.fields)
+            await writer.flush(self.intake.session_id)
+            result = await self.intake.commit()
+            if result.get('success'):
+                await self._remember_appointment(self.intake.appointment_id)
+        except Exception:
+            logger.exception("Error committing intake")
+            result = {'success': False, 'message': 'Internal server error'}
+        await self.safe_send(jsoncodec.dumps({'type': 'commit.result', **result}))
+
+    async def _remember_appointment(self, appointment_id):
+        # Lets the page's HTTP session attach its transcript to this appointment
+        session = self.scope.get('session')
+        if session is None:
+            return
+        remember_appointment(session, appointment_id)
+        await database_sync_to_async(session.save)()
+
+    async def _handle_executable_code(self, code):
+        # Extract and process function calls from executable code
+        try:
+            # Find all save_patient_field calls in the code
+            matches = SAVE_PATIENT_FIELD_RE.findall(code)
+            
+            if matches:
+                # Process each function call
+                for field_name, value in matches:
+                    await self._relay_save_patient_field({
+                        'field_name': field_name,
+                        'value': value
+                    })
+                
+                # Log success but don't send message to avoid interrupting AI flow
+                tool_logger.info("Relayed fields from executable code",
+                                 extra={'field_names': [field_name for field_name, _ in matches]})
+                # The AI should continue naturally after generating executable code
+            else:
+                tool_logger.warning("No valid save_patient_field calls found in executable code",
+                                    extra={'code_length': len(code)})
+                await self.safe_send(jsoncodec.dumps({
+                    'type': 'system.message',
+                    'content': 'ERROR: Could not find valid save_patient_field calls in the executable code. Please ensure you use the correct format: save_patient_field(field_name="field_name", value="value")'
+                }))
+                
+        except Exception as e:
+            tool_logger.exception("Error processing executable code")
+            await self.safe_send(jsoncodec.dumps({
+                'type': 'system.message',
+                'content': 'ERROR: Failed to process executable code. Please check the format and try again.'
+            }))